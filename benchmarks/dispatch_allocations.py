@@ -0,0 +1,109 @@
+"""Benchmark of the time and memory of dispatching high-rate messages.
+
+For each kind of message, this prints the time per message, the peak memory
+allocated while handling one message and the number of garbage collections per
+10,000 messages.
+
+Run it from the root of the repository:
+
+.. code-block:: shell
+
+    python3 benchmarks/dispatch_allocations.py
+"""
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+from typing import Awaitable, Callable, List, Tuple
+
+from rhasspyhermes.wake import HotwordDetected
+
+from rhasspyhermes_app import HermesApp, TopicData
+from rhasspyhermes_app.decoding import message_decoder
+
+MESSAGES = 10000
+
+HOTWORD_TOPIC = "hermes/hotword/porcupine/detected"
+HOTWORD_PAYLOAD = HotwordDetected("porcupine", site_id="kitchen").to_json().encode()
+FRAME_TOPIC = "hermes/audioServer/kitchen/audioFrame"
+FRAME_PAYLOAD = bytes(1024)
+
+
+def create_app() -> HermesApp:
+    """Create an app with handlers for hotwords and audio frames."""
+    sys.argv = sys.argv[:1]
+    app = HermesApp("Benchmark")
+
+    @app.on_hotword
+    async def hotword(_hotword: HotwordDetected):
+        pass
+
+    @app.on_topic(FRAME_TOPIC)
+    async def frame(_data: TopicData, _payload: bytes):
+        pass
+
+    @app.on_topic("hermes/audioServer/{site_id}/audioFrame")
+    async def site_frame(_data: TopicData, _payload: bytes):
+        pass
+
+    app._subscribe_callbacks()  # pylint: disable=protected-access
+
+    return app
+
+
+async def measure(handle: Callable[[], Awaitable[None]]) -> Tuple[float, int, float]:
+    """Measure the time, peak memory and garbage collections of handling messages."""
+    collections = [0]
+
+    def count_collections(phase, _info):
+        if phase == "start":
+            collections[0] += 1
+
+    gc.callbacks.append(count_collections)
+    start_time = time.perf_counter()
+    for _ in range(MESSAGES):
+        await handle()
+    duration = time.perf_counter() - start_time
+    gc.callbacks.remove(count_collections)
+
+    tracemalloc.start()
+    await handle()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return duration / MESSAGES * 1e6, peak, collections[0] * 10000 / MESSAGES
+
+
+async def main() -> None:
+    """Run the benchmark."""
+    app = create_app()
+    decode = message_decoder(HotwordDetected)
+
+    async def decode_with_from_json():
+        HotwordDetected.from_json(HOTWORD_PAYLOAD)
+
+    async def decode_fast():
+        decode(HOTWORD_PAYLOAD)
+
+    async def dispatch_hotword():
+        await app.on_raw_message(HOTWORD_TOPIC, HOTWORD_PAYLOAD)
+
+    async def dispatch_frame():
+        await app.on_raw_message(FRAME_TOPIC, FRAME_PAYLOAD)
+
+    benchmarks: List[Tuple[str, Callable[[], Awaitable[None]]]] = [
+        ("HotwordDetected.from_json", decode_with_from_json),
+        ("message_decoder(HotwordDetected)", decode_fast),
+        ("on_raw_message hotword", dispatch_hotword),
+        ("on_raw_message audio frame", dispatch_frame),
+    ]
+
+    print(f"{'':34} {'us/message':>10} {'peak bytes':>10} {'GCs/10k':>8}")
+    for name, handle in benchmarks:
+        microseconds, peak, collections = await measure(handle)
+        print(f"{name:34} {microseconds:10.1f} {peak:10} {collections:8.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Benchmark of the message throughput of an app in different event loops.
+
+For the default event loop of :mod:`asyncio` and, if it's installed, uvloop, this
+prints the number of messages per second that pass through the message loop of
+an app to a handler.
+
+Run it from the root of the repository:
+
+.. code-block:: shell
+
+    python3 benchmarks/event_loops.py
+"""
+import asyncio
+import sys
+import time
+from typing import Callable, List, Tuple
+
+import paho.mqtt.client as mqtt
+from rhasspyhermes.wake import HotwordDetected
+
+from rhasspyhermes_app import HermesApp
+
+MESSAGES = 20000
+
+TOPIC = "hermes/hotword/porcupine/detected"
+PAYLOAD = HotwordDetected("porcupine", site_id="kitchen").to_json().encode()
+
+
+async def throughput() -> float:
+    """Measure the number of messages per second that the app handles."""
+    sys.argv = sys.argv[:1]
+    app = HermesApp("Benchmark")
+    handled = asyncio.Event()
+    count = [0]
+
+    @app.on_hotword
+    async def hotword(_hotword: HotwordDetected):
+        count[0] += 1
+        if count[0] == MESSAGES:
+            handled.set()
+
+    app._subscribe_callbacks()  # pylint: disable=protected-access
+    main_loop = asyncio.ensure_future(app.handle_messages_async())
+    await asyncio.sleep(0)
+
+    message = mqtt.MQTTMessage(topic=TOPIC.encode())
+    message.payload = PAYLOAD
+
+    start_time = time.perf_counter()
+    for _ in range(MESSAGES):
+        # Like the network thread of the MQTT client
+        app.mqtt_on_message(app.mqtt_client, None, message)
+    await handled.wait()
+    duration = time.perf_counter() - start_time
+
+    await app.drain()
+    await main_loop
+
+    return MESSAGES / duration
+
+
+def main() -> None:
+    """Run the benchmark."""
+    loop_factories: List[Tuple[str, Callable[[], asyncio.AbstractEventLoop]]] = [
+        ("asyncio", asyncio.new_event_loop)
+    ]
+    try:
+        import uvloop  # type: ignore # pylint: disable=import-outside-toplevel,import-error
+
+        loop_factories.append(("uvloop", uvloop.new_event_loop))
+    except ImportError:
+        print("uvloop isn't installed")
+
+    for name, loop_factory in loop_factories:
+        loop = loop_factory()
+        try:
+            messages_per_second = loop.run_until_complete(throughput())
+        finally:
+            loop.close()
+
+        print(f"{name:10} {messages_per_second:10.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,10 @@
 """Example app to react to an intent to tell you the time."""
 import json
-import logging
 
-import aiohttp  # pylint: disable=import-error
 from rhasspyhermes.nlu import NluIntent
 
 from rhasspyhermes_app import EndSession, HermesApp
 
-_LOGGER = logging.getLogger("AdviceApp")
-
 app = HermesApp("AdviceApp")
 
 """
@@ -19,22 +15,26 @@ in any way whatsoever, can be responsible for your use of the api endpoint.
 URL = "https://api.adviceslip.com/advice"
 
 
-@app.on_intent("GetAdvice")
+# Answer right away while the API is down instead of waiting for a timeout
+app.circuit_breaker("adviceslip", timeout=5.0, reset_timeout=60.0)
+
+
+@app.on_intent(
+    "GetAdvice",
+    circuit="adviceslip",
+    fallback=EndSession(
+        "Sadly i cannot connect to my spring my whisdom. Maybe try later again."
+    ),
+)
 async def get_advice(intent: NluIntent):
     """Giving life advice."""
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(URL) as response:
-                data = await response.read()
-                message = json.loads(data)
-                return EndSession(str(message["slip"]["advice"]))
-    except aiohttp.ClientConnectionError:
-        _LOGGER.exception("No Connection could be established.")
-    except:  # noqa: E722 pylint: disable=bare-except
-        _LOGGER.exception("An Exception occured")
-    return EndSession(
-        "Sadly i cannot connect to my spring my whisdom. Maybe try later again."
-    )
+    # The app's shared session reuses connections between intents. Pylint infers the
+    # result of ClientSession.get() from aiohttp's typing stubs, which have no body.
+    # pylint: disable=not-async-context-manager
+    async with app.http_session().get(URL) as response:
+        data = await response.read()
+        message = json.loads(data)
+        return EndSession(str(message["slip"]["advice"]))
 
 
 app.run()
@@ -1,27 +1,189 @@
 """Helper library to create voice apps for Rhasspy using the Hermes protocol."""
 import argparse
 import asyncio
+import inspect
+import json
 import logging
 import re
+import signal
+import time
+import uuid
+from collections import deque
 from copy import deepcopy
-from dataclasses import dataclass
-from typing import Awaitable, Callable, Dict, List, Optional, Union
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+    Union,
+)
 
 import paho.mqtt.client as mqtt
 import rhasspyhermes.cli as hermes_cli
+from rhasspyhermes.asr import AsrTextCaptured, AsrTrain
+from rhasspyhermes.audioserver import AudioFrame, AudioSessionFrame, AudioSummary
+from rhasspyhermes.base import Message
 from rhasspyhermes.client import HermesClient
 from rhasspyhermes.dialogue import (
     DialogueContinueSession,
     DialogueEndSession,
     DialogueIntentNotRecognized,
     DialogueNotification,
+    DialogueSessionEnded,
+    DialogueSessionStarted,
     DialogueStartSession,
 )
-from rhasspyhermes.nlu import NluIntent, NluIntentNotRecognized
+from rhasspyhermes.intent import Intent
+from rhasspyhermes.nlu import NluIntent, NluIntentNotRecognized, NluTrain
+from rhasspyhermes.tts import TtsSay, TtsSayFinished
 from rhasspyhermes.wake import HotwordDetected
 
+from . import tracing
+from .batching import TopicBatch
+from .brokers import BrokerConnection, BrokerRouter
+from .circuit import CircuitBreaker, CircuitOpenError
+from .coalesce import NotificationCoalescer
+from .decoding import message_decoder, payload_session_id, payload_site_id
+from .dedup import DEDUPLICATED_TOPICS, DuplicateFilter
+from .journal import OutboundJournal
+from .lanes import Lane
+from .matcher import PhraseMatcher
+from .memo import MemoStore
+from .profiling import Profiler
+from .ratelimit import DELAY, REPLY, RateLimit, RateLimiter
+from .scheduler import ScheduledJob, Scheduler
+from .slots import SlotError, SlotExtractor
+from .templates import Response, ResponseTemplate, TtsCacheHook
+from .tracing import (  # noqa: F401
+    FileSpanExporter,
+    InMemorySpanExporter,
+    SpanExporter,
+    Tracer,
+)
+
+if TYPE_CHECKING:
+    import aiohttp  # pylint: disable=import-error
+
+    from .flow import DialogueFlow
+
 _LOGGER = logging.getLogger("HermesApp")
 
+# The placeholder of the site ID in topics of on_topic, which is subscribed to for
+# each site of the app
+_SITE_PLACEHOLDER = "{site_id}"
+
+# Dialogue topics that are subscribed to for tracing sessions
+_TRACE_TOPICS = {
+    DialogueSessionStarted.topic(),
+    AsrTextCaptured.topic(),
+    DialogueSessionEnded.topic(),
+}
+
+# Topics of Hermes messages with the site ID only in the payload, which are filtered by
+# site before they're decoded
+_SITE_PAYLOAD_TOPICS = {
+    NluIntentNotRecognized.topic(),
+    DialogueIntentNotRecognized.topic(),
+    DialogueSessionStarted.topic(),
+    AsrTextCaptured.topic(),
+    DialogueSessionEnded.topic(),
+}
+
+# Topic filters of the dialogue messages that lanes without topic filters don't take
+_PRIORITY_TOPICS = (
+    "hermes/intent/#",
+    NluIntentNotRecognized.topic(),
+    "hermes/hotword/+/detected",
+    "hermes/dialogueManager/#",
+    "hermes/tts/sayFinished",
+)
+
+# Decoders of the Hermes messages that are handled most often
+_decode_hotword_detected = message_decoder(HotwordDetected)
+_decode_nlu_intent_not_recognized = message_decoder(NluIntentNotRecognized)
+_decode_dialogue_intent_not_recognized = message_decoder(DialogueIntentNotRecognized)
+
+# Attributes holding the handlers registered with the decorators
+_HANDLER_TABLES = (
+    "_callbacks_hotword",
+    "_callbacks_intent",
+    "_callbacks_intent_not_recognized",
+    "_callbacks_dialogue_intent_not_recognized",
+    "_callbacks_topic",
+    "_callbacks_topic_regex",
+    "_additional_topic",
+    "_callbacks_prefetch",
+)
+
+
+def _topic_covers(topic_filter: str, other_filter: str) -> bool:
+    """Check whether an MQTT topic filter matches all topics of another filter."""
+    levels = topic_filter.split("/")
+    other_levels = other_filter.split("/")
+
+    for i, level in enumerate(levels):
+        if level == "#":
+            return True
+
+        if i >= len(other_levels):
+            return False
+
+        other_level = other_levels[i]
+        if level == "+":
+            if other_level == "#":
+                return False
+        elif level != other_level:
+            return False
+
+    return len(levels) == len(other_levels)
+
+
+def _minimize_topics(topics: Iterable[str]) -> Set[str]:
+    """Remove duplicate MQTT topic filters and filters covered by a wildcard filter.
+
+    Overlapping subscriptions can make the MQTT broker deliver a message once for
+    each matching subscription.
+    """
+    unique_topics = set(topics)
+    wildcard_topics = [topic for topic in unique_topics if "+" in topic or "#" in topic]
+
+    return {
+        topic
+        for topic in unique_topics
+        if not any(
+            wildcard_topic != topic and _topic_covers(wildcard_topic, topic)
+            for wildcard_topic in wildcard_topics
+        )
+    }
+
+
+def _close_loop(loop: asyncio.AbstractEventLoop) -> None:
+    """Cancel the remaining tasks of an event loop and close it, like :func:`asyncio.run`."""
+    try:
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        if hasattr(loop, "shutdown_default_executor"):
+            # Python 3.9+: wait for the threads of run_in_executor
+            loop.run_until_complete(loop.shutdown_default_executor())
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
 
 @dataclass
 class ContinueSession:
@@ -57,6 +219,51 @@ class EndSession:
     custom_data: Optional[str] = None
 
 
+# The default response of an intent handler whose circuit is open
+_SERVICE_UNAVAILABLE = EndSession("Sorry, this service is unavailable right now.")
+
+
+def _memo_key(name: str, intent: NluIntent, per_site: bool) -> str:
+    """Get the memo key of a handler's result for an intent and its slots."""
+    slots = []
+    for slot in intent.slots or []:
+        value = slot.value.get("value")
+        slots.append(
+            (slot.slot_name, value.casefold() if isinstance(value, str) else value)
+        )
+    slots.sort(key=str)
+    site_id = intent.site_id if per_site else None
+
+    return json.dumps(
+        [name, intent.intent.intent_name, site_id, slots], sort_keys=True, default=str
+    )
+
+
+def _encode_result(
+    message: Union[ContinueSession, EndSession, Any]
+) -> Optional[Dict[str, Any]]:
+    """Encode the result of an intent handler to JSON values, if it can be memoized."""
+    if isinstance(message, EndSession):
+        return {"end_session": asdict(message)}
+    if isinstance(message, ContinueSession):
+        return {"continue_session": asdict(message)}
+
+    return None
+
+
+def _decode_result(value: Dict[str, Any]) -> Union[ContinueSession, EndSession]:
+    if "end_session" in value:
+        return EndSession(**value["end_session"])
+
+    return ContinueSession(**value["continue_session"])
+
+
+def _log_prefetch_error(task: "asyncio.Task[Any]") -> None:
+    """Log the exception of a prefetch task, which may never be awaited."""
+    if not task.cancelled() and task.exception() is not None:
+        _LOGGER.error("Prefetch failed", exc_info=task.exception())
+
+
 @dataclass
 class TopicData:
     """Helper class for topic subscription.
@@ -66,6 +273,8 @@ class TopicData:
         data: A dictionary holding extracted data for the given placeholder.
     """
 
+    __slots__ = ("topic", "data")
+
     topic: str
     data: Dict[str, str]
 
@@ -75,6 +284,15 @@ class HermesApp(HermesClient):
 
     Attributes:
         args: Command-line arguments for the Hermes app.
+        intent_wildcard_threshold: If the app handles at least this number of intents,
+            it subscribes to all intents with ``hermes/intent/#`` instead of subscribing
+            to each intent separately. By default, intents are always subscribed to
+            separately.
+        tts_cache_hook: A function that is called with the hash and the text of responses
+            that are likely to be said, to prepare them in a TTS cache. See
+            :meth:`response_template`.
+        say_timeout: The longest time in seconds to wait for the TTS system to finish
+            saying a chunk of a streamed response. See :meth:`on_intent`.
 
     Example:
 
@@ -86,7 +304,7 @@ class HermesApp(HermesClient):
         name: str,
         parser: Optional[argparse.ArgumentParser] = None,
         mqtt_client: Optional[mqtt.Client] = None,
-        **kwargs
+        **kwargs,
     ):
         """Initialize the Rhasspy Hermes app.
 
@@ -108,6 +326,10 @@ class HermesApp(HermesClient):
             parser = argparse.ArgumentParser(prog=name)
         # Add default arguments
         hermes_cli.add_hermes_args(parser)
+        parser.add_argument(
+            "--profiling-dir",
+            help="Profile the app and write the profiling files to this directory",
+        )
 
         # overwrite argument defaults inside parser with argparse.SUPPRESS
         # so arguments that are not provided get ignored
@@ -159,27 +381,1109 @@ class HermesApp(HermesClient):
 
         self._additional_topic: List[str] = []
 
+        self._callbacks_prefetch: List[Callable[[str], Awaitable[Any]]] = []
+
+        self.prefetch_ttl = 30.0
+        """The time in seconds after which prefetched results are evicted."""
+
+        # Prefetch tasks by site and session ID and prefetch function, and the timers
+        # that evict them. Tasks started before the session is known have no session ID.
+        self._prefetch_tasks: Dict[
+            Tuple[str, Optional[str]],
+            Dict[Callable[[str], Awaitable[Any]], "asyncio.Task[Any]"],
+        ] = {}
+        self._prefetch_timers: Dict[Tuple[str, Optional[str]], asyncio.TimerHandle] = {}
+
+        self._callbacks_startup: List[Callable[[], Awaitable[None]]] = []
+        self._callbacks_shutdown: List[Callable[[], Awaitable[None]]] = []
+
+        # Factories and close functions of managed resources by name
+        self._resource_factories: Dict[
+            str,
+            Tuple[
+                Callable[[], Awaitable[Any]], Optional[Callable[[Any], Awaitable[None]]]
+            ],
+        ] = {}
+
+        self.resources: Dict[str, Any] = {}
+        """Resources added with :meth:`add_resource`, available while the app runs."""
+
+        self._http_options: Dict[str, Any] = {
+            "limit": 100,
+            "limit_per_host": 10,
+            "keepalive_timeout": 30.0,
+        }
+        self._http_session: Optional["aiohttp.ClientSession"] = None
+
+        self.intent_wildcard_threshold: Optional[int] = None
+
+        self.tracer: Optional[Tracer] = None
+
+        self.duplicate_filter: Optional[DuplicateFilter] = None
+
+        self.rate_limiter: Optional[RateLimiter] = None
+
+        self.broker_router: Optional[BrokerRouter] = None
+
+        self.circuit_breakers: Dict[str, CircuitBreaker] = {}
+        """Circuit breakers added with :meth:`circuit_breaker` by name."""
+
+        self.tts_cache_hook: Optional[TtsCacheHook] = None
+
+        self.say_timeout = 30.0
+        # Futures of streamed chunks that the TTS system is saying, by ID
+        self._say_waiters: Dict[str, "asyncio.Future[None]"] = {}
+
+        self.scheduler: Optional[Scheduler] = None
+        self._started = False
+
+        self.notification_coalescer: Optional[NotificationCoalescer] = None
+
+        self.memo_store: Optional[MemoStore] = None
+
+        self.journal: Optional[OutboundJournal] = None
+        self.journal_session_ttl = 30.0
+        self.journal_ttl = 3600.0
+
+        self.fallback_matcher: Optional[PhraseMatcher] = None
+        self.fallback_min_score = 0.6
+
+        self.profiler: Optional[Profiler] = None
+        if self.args.profiling_dir:
+            self.enable_profiling(self.args.profiling_dir)
+
+        self.lanes: Dict[str, Lane] = {}
+        """Lanes added with :meth:`add_lane` by name."""
+
+        self.priority_topics: List[str] = list(_PRIORITY_TOPICS)
+        """Topic filters of the messages that lanes without topic filters don't take."""
+
+        # The lane of each topic received so far, or None for no lane
+        self._topic_lanes: Dict[str, Optional[Lane]] = {}
+
+        # Whether changes to the handlers update the subscriptions immediately
+        self._live_subscriptions = False
+
+        # Topics subscribed for the app's handlers, without the topics subscribed with
+        # HermesClient.subscribe()
+        self._handler_topics: Set[str] = set()
+
+        # Tasks handling received messages that haven't finished yet
+        self._inflight: Set["asyncio.Future[Any]"] = set()
+        self._loop_stopped: Optional[asyncio.Event] = None
+
+        # Published messages that may not have been sent to the broker yet
+        self._pending_publishes: Deque[mqtt.MQTTMessageInfo] = deque()
+
+        self.http_metrics: Dict[str, int] = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "connections_queued": 0,
+        }
+        """Usage counters of the connection pool of :meth:`http_session`."""
+
     def _subscribe_callbacks(self) -> None:
-        # Remove duplicate intent names
-        intent_names: List[str] = list(set(self._callbacks_intent.keys()))
-        topics: List[str] = [
-            NluIntent.topic(intent_name=intent_name) for intent_name in intent_names
-        ]
+        self._handler_topics = self._topics()
+        self.subscribe_topics(*self._handler_topics)
+        self._live_subscriptions = True
+
+    def _handlers_changed(self) -> None:
+        """Update the subscriptions after a handler has been added or removed at runtime."""
+        if self._live_subscriptions:
+            self._update_subscriptions()
+
+    def _topics(self) -> Set[str]:
+        """Get a minimal set of MQTT topics for the registered handlers."""
+        topics: List[str] = []
+
+        if (
+            self.intent_wildcard_threshold is not None
+            and len(self._callbacks_intent) >= self.intent_wildcard_threshold
+        ):
+            # Intents without handlers are ignored in on_raw_message
+            topics.append(NluIntent.topic())
+        else:
+            topics.extend(
+                NluIntent.topic(intent_name=intent_name)
+                for intent_name in self._callbacks_intent
+            )
 
         if self._callbacks_hotword:
             topics.append(HotwordDetected.topic())
 
-        if self._callbacks_intent_not_recognized:
+        if self._callbacks_intent_not_recognized or (
+            self.fallback_matcher is not None and self._callbacks_intent
+        ):
             topics.append(NluIntentNotRecognized.topic())
 
         if self._callbacks_dialogue_intent_not_recognized:
             topics.append(DialogueIntentNotRecognized.topic())
 
-        topic_names: List[str] = list(set(self._callbacks_topic.keys()))
-        topics.extend(topic_names)
-        topics.extend(self._additional_topic)
+        if self._callbacks_prefetch:
+            topics.extend(
+                [
+                    HotwordDetected.topic(),
+                    AsrTextCaptured.topic(),
+                    DialogueSessionEnded.topic(),
+                ]
+            )
+
+        if self.tracer is not None:
+            topics.extend(_TRACE_TOPICS)
+
+        topics.extend(self._callbacks_topic.keys())
+        for topic in self._additional_topic:
+            if _SITE_PLACEHOLDER not in topic:
+                topics.append(topic)
+            elif self.site_ids:
+                # Let the broker filter the sites
+                topics.extend(
+                    topic.replace(_SITE_PLACEHOLDER, site_id)
+                    for site_id in self.site_ids
+                )
+            else:
+                topics.append(topic.replace(_SITE_PLACEHOLDER, "+"))
+
+        return _minimize_topics(topics)
+
+    def set_site_ids(self, *site_ids: str):
+        """Change the sites that the app handles messages of.
+
+        By default, the app handles the sites of the ``--site-id`` command-line
+        arguments, or all sites if there are none. Topics of :meth:`on_topic` with a
+        ``{site_id}`` placeholder are subscribed to for each site, so the MQTT broker
+        doesn't send the messages of other sites. Intents, hotwords and other Hermes
+        messages with the site ID in the payload are dropped before they're decoded if
+        they're from another site.
+
+        If the app is running, it changes its subscriptions immediately.
+
+        Arguments:
+            site_ids: The IDs of the sites. Without IDs, the app handles all sites.
+
+        Example:
+
+        .. code-block:: python
+
+            app.set_site_ids("kitchen", "bedroom")
+        """
+        self.site_ids = set(site_ids)
+        self._handlers_changed()
+
+    def _is_other_site(self, topic: str, payload: bytes) -> bool:
+        """Check whether a message is from a site that the app doesn't handle."""
+        if not (
+            topic in _SITE_PAYLOAD_TOPICS
+            or NluIntent.is_topic(topic)
+            or HotwordDetected.is_topic(topic)
+        ):
+            return False
+
+        site_id = payload_site_id(payload)
+        return site_id is not None and site_id not in self.site_ids
+
+    def _update_subscriptions(self) -> None:
+        """Subscribe to new topics and unsubscribe from topics without handlers."""
+        topics = self._topics()
+        current = self._handler_topics
+        self._handler_topics = topics
+
+        self.unsubscribe_topics(*(current - topics))
+        self.subscribe_topics(*(topics - current))
+
+    def subscribe_topics(self, *topics: str):
+        """Subscribe to one or more MQTT topics.
+
+        All topics that the app isn't subscribed to yet are sent to the MQTT broker
+        in a single packet.
+        """
+        with self.subscribe_lock:
+            self.pending_mqtt_topics.update(topics)
+
+            if self.is_connected:
+                self.all_mqtt_topics.update(self.pending_mqtt_topics)
+
+                # Don't re-subscribe
+                new_topics = sorted(self.pending_mqtt_topics - self.subscribed_topics)
+                if new_topics:
+                    self.mqtt_client.subscribe([(topic, 0) for topic in new_topics])
+                    self.subscribed_topics.update(new_topics)
+                    _LOGGER.debug("Subscribed to %s", new_topics)
+
+                self.pending_mqtt_topics.clear()
+
+        if self.broker_router is not None:
+            for broker in self.broker_router.brokers.values():
+                broker.subscribe(topics)
+
+    def unsubscribe_topics(self, *topics: str):
+        """Unsubscribe from one or more MQTT topics."""
+        with self.subscribe_lock:
+            self.pending_mqtt_topics.difference_update(topics)
+            self.all_mqtt_topics.difference_update(topics)
+
+            subscribed = [topic for topic in topics if topic in self.subscribed_topics]
+            if subscribed and self.is_connected:
+                self.mqtt_client.unsubscribe(subscribed)
+                _LOGGER.debug("Unsubscribed from %s", subscribed)
+
+            self.subscribed_topics.difference_update(subscribed)
+
+        if self.broker_router is not None:
+            for broker in self.broker_router.brokers.values():
+                broker.unsubscribe(topics)
+
+    def reload(self, register: Callable[["HermesApp"], None]):
+        """Replace all handlers of the app without reconnecting.
+
+        The handlers registered with the decorators are removed, after which ``register``
+        is called with the app as its argument to register the new handlers. The app
+        then only subscribes to the topics that have been added and unsubscribes from
+        the topics without handlers. Messages that are already being handled finish
+        with the old handlers.
+
+        If ``register`` raises an exception, the old handlers are kept.
+
+        Arguments:
+            register: A function that registers handlers on the app.
+
+        Example:
+
+        .. code-block:: python
+
+            def register(app: HermesApp):
+                @app.on_intent("GetTime")
+                async def get_time(intent: NluIntent):
+                    return EndSession("It's too late.")
+
+            app.reload(register)
+        """
+        old_tables = {name: getattr(self, name) for name in _HANDLER_TABLES}
+        for name, table in old_tables.items():
+            setattr(self, name, type(table)())
+
+        # Only update the subscriptions when all new handlers have been registered
+        live_subscriptions = self._live_subscriptions
+        self._live_subscriptions = False
+        try:
+            register(self)
+        except Exception:
+            for name, table in old_tables.items():
+                setattr(self, name, table)
+            raise
+        finally:
+            self._live_subscriptions = live_subscriptions
+
+        self._handlers_changed()
+
+    def add_intent_handler(
+        self,
+        function: Callable[
+            ..., Awaitable[Union[ContinueSession, EndSession, Response, None]]
+        ],
+        *intent_names: str,
+        **kwargs: Any,
+    ) -> Callable[[NluIntent], Awaitable[None]]:
+        """Add a function that acts on received intents.
+
+        This is the same as applying the :meth:`on_intent` decorator to the function.
+        Like all handlers, it can be added while the app is running, in which case
+        the app immediately subscribes to the intents' topics.
+
+        Arguments:
+            function: The function to call with the received intent.
+            intent_names: Names of the intents you want the function to act on.
+            kwargs: The ``slots`` and ``slot_error`` arguments of :meth:`on_intent`.
+
+        Returns:
+            The handler to pass to :meth:`remove_handler`.
+        """
+        return self.on_intent(*intent_names, **kwargs)(function)
+
+    def remove_handler(self, function: Callable[..., Awaitable[Any]]):
+        """Remove a handler from the app.
+
+        If the app is running, it unsubscribes from the topics that no other handler
+        acts on.
+
+        Arguments:
+            function: The function returned by one of the decorators of the app, such as
+                :meth:`on_intent`, or by :meth:`add_intent_handler`.
+        """
+        # Replace the lists instead of changing them, so handlers that are
+        # being called for a message aren't skipped.
+        for name in (
+            "_callbacks_hotword",
+            "_callbacks_intent_not_recognized",
+            "_callbacks_dialogue_intent_not_recognized",
+            "_callbacks_topic_regex",
+            "_callbacks_prefetch",
+        ):
+            callbacks = getattr(self, name)
+            if function in callbacks:
+                setattr(self, name, [f for f in callbacks if f is not function])
+
+        tables: List[Dict[str, List[Any]]] = [
+            self._callbacks_intent,
+            self._callbacks_topic,
+        ]
+        for table in tables:
+            for key, callbacks in list(table.items()):
+                if function in callbacks:
+                    remaining = [f for f in callbacks if f is not function]
+                    if remaining:
+                        table[key] = remaining
+                    else:
+                        del table[key]
+
+        additional_topics = list(self._additional_topic)
+        for topic_name in getattr(function, "topic_names", []):
+            additional_topics.remove(topic_name)
+        self._additional_topic = additional_topics
+
+        if getattr(function, "streaming", False) and not any(
+            getattr(callback, "streaming", False)
+            for callbacks in self._callbacks_intent.values()
+            for callback in callbacks
+        ):
+            topic = TtsSayFinished.topic()
+            remaining = [
+                callback
+                for callback in self._callbacks_topic.get(topic, [])
+                # Bound methods are equal, but not identical, to each other
+                # pylint: disable-next=comparison-with-callable
+                if callback != self._handle_say_finished
+            ]
+            if remaining:
+                self._callbacks_topic[topic] = remaining
+            else:
+                self._callbacks_topic.pop(topic, None)
+
+        self._handlers_changed()
+
+    async def handle_messages_async(
+        self, loop: Optional[asyncio.AbstractEventLoop] = None
+    ):
+        """Handle MQTT messages in the event loop until the app is drained."""
+        self.loop = loop or self.loop or asyncio.get_running_loop()
+        self.in_queue = asyncio.Queue()
+        self._loop_stopped = asyncio.Event()
+
+        # Pull in messages from pre-queue
+        while self.pre_queue.qsize() > 0:
+            self.in_queue.put_nowait(self.pre_queue.get_nowait())
+
+        try:
+            while True:
+                mqtt_message = await self.in_queue.get()
+                if mqtt_message is None:
+                    break
+
+                try:
+                    if (
+                        self.duplicate_filter is not None
+                        and self.duplicate_filter.is_duplicate(
+                            mqtt_message.topic, mqtt_message.payload
+                        )
+                    ):
+                        _LOGGER.debug(
+                            "Dropped duplicate message on %s", mqtt_message.topic
+                        )
+                        continue
+
+                    if self.site_ids and self._is_other_site(
+                        mqtt_message.topic, mqtt_message.payload
+                    ):
+                        continue
+
+                    if self.rate_limiter is not None and not self._admit(
+                        self.rate_limiter, mqtt_message
+                    ):
+                        continue
+
+                    await self._dispatch(mqtt_message)
+                except Exception:
+                    _LOGGER.exception("handle_messages_async")
+        finally:
+            self._loop_stopped.set()
+
+    async def _dispatch(self, mqtt_message: mqtt.MQTTMessage) -> None:
+        """Hand an admitted message to its lane or a new task, and to the Hermes client."""
+        lane = self._lane(mqtt_message.topic) if self.lanes else None
+        if lane is not None:
+            lane.start(self._handling)
+            lane.put(mqtt_message)
+        else:
+            self._track(self._handling(mqtt_message))
+
+        if self.subscribed_types:
+            await self._handle_hermes_message(mqtt_message)
+
+    def _handling(self, mqtt_message: mqtt.MQTTMessage) -> Awaitable[None]:
+        """Get the coroutine that handles a message with the app's handlers."""
+        if self.tracer is not None:
+            handling = self._handle_traced_message(self.tracer, mqtt_message)
+        else:
+            handling = self.on_raw_message(mqtt_message.topic, mqtt_message.payload)
+
+        if self.profiler is not None:
+            handling = self.profiler.profile_message(mqtt_message.topic, handling)
+
+        return handling
+
+    def _lane(self, topic: str) -> Optional[Lane]:
+        """Get the lane of a topic, or ``None`` if its messages aren't in a lane."""
+        try:
+            return self._topic_lanes[topic]
+        except KeyError:
+            pass
+
+        lane = next((lane for lane in self.lanes.values() if lane.matches(topic)), None)
+        if lane is None and not any(
+            mqtt.topic_matches_sub(topic_filter, topic)
+            for topic_filter in self.priority_topics
+        ):
+            lane = next(
+                (lane for lane in self.lanes.values() if not lane.topic_filters), None
+            )
+
+        if len(self._topic_lanes) >= 10000:
+            self._topic_lanes.clear()
+        self._topic_lanes[topic] = lane
+
+        return lane
+
+    def _is_site_limited(self, topic: str) -> bool:
+        """Check whether the site rate limits apply to a topic.
+
+        They apply to intents and to the topics of :meth:`on_topic` handlers, but not
+        to the dialogue messages that the app handles itself.
+        """
+        if NluIntent.is_topic(topic):
+            return True
+
+        # The app's own handlers are its bound methods
+        if any(
+            getattr(handler, "__self__", None) is not self
+            for handler in self._callbacks_topic.get(topic, [])
+        ):
+            return True
+
+        return any(
+            topic_pattern.match(topic)
+            for handler in self._callbacks_topic_regex
+            for topic_pattern, _named_positions in getattr(handler, "topic_extras", ())
+        )
+
+    def _admit(self, rate_limiter: RateLimiter, mqtt_message: mqtt.MQTTMessage) -> bool:
+        """Check whether a message is within the rate limits.
+
+        Messages that are delayed are handled later in their own task. If the limits
+        can't be checked, the message is handled.
+        """
+        try:
+            throttle = rate_limiter.check(mqtt_message.topic, mqtt_message.payload)
+        except Exception:
+            _LOGGER.exception(
+                "Checking the rate limits of a message on %s", mqtt_message.topic
+            )
+            return True
+
+        if throttle is None:
+            return True
+
+        _LOGGER.debug(
+            "Rate limit: %s message on %s", throttle.action, mqtt_message.topic
+        )
+        if throttle.action == DELAY:
+            self._track(self._handle_delayed_message(mqtt_message, throttle.wait))
+        elif throttle.action == REPLY and NluIntent.is_topic(mqtt_message.topic):
+            session_id = payload_session_id(mqtt_message.payload)
+            if session_id is not None:
+                self.publish(
+                    DialogueEndSession(session_id=session_id, text=throttle.limit.reply)
+                )
+
+        return False
+
+    async def _handle_delayed_message(
+        self, mqtt_message: mqtt.MQTTMessage, delay: float
+    ) -> None:
+        await asyncio.sleep(delay)
+        try:
+            await self._dispatch(mqtt_message)
+        except Exception:
+            _LOGGER.exception("Delayed message on %s", mqtt_message.topic)
+
+    def _track(self, coroutine: Awaitable[Any]) -> None:
+        """Run a coroutine in a task that :meth:`drain` waits for."""
+        task = asyncio.ensure_future(coroutine)
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _handle_traced_message(
+        self, tracer: Tracer, mqtt_message: mqtt.MQTTMessage
+    ) -> None:
+        topic = mqtt_message.topic
+        received_time = time.time_ns()
+        if isinstance(mqtt_message.timestamp, float):
+            # The MQTT client sets a monotonic timestamp when it receives a message
+            received_time -= int((time.monotonic() - mqtt_message.timestamp) * 1e9)
+
+        trace = tracer.start_message(topic, received_time)
+        try:
+            await self.on_raw_message(topic, mqtt_message.payload)
+        finally:
+            if topic in _TRACE_TOPICS:
+                try:
+                    message = json.loads(mqtt_message.payload)
+                    trace.set_session(message.get("sessionId"), message.get("siteId"))
+                except ValueError:
+                    pass
+
+            tracer.finish_message(trace)
+            if trace.session_id and DialogueSessionEnded.is_topic(topic):
+                tracer.end_session(trace.session_id)
+
+    def enable_tracing(self, exporter: SpanExporter, max_sessions: int = 100):
+        """Trace where the time goes while handling the messages of a session.
+
+        For each received message, the app records when it was received, how long it
+        waited in the queue and how long decoding, the handlers and publishing took.
+        The app also subscribes to the dialogue manager's messages when a session starts
+        and ends and to the text captured by the ASR, so the trace of a session shows
+        the whole voice pipeline. When the session ends, its trace is passed to the
+        exporter.
+
+        Arguments:
+            exporter: The exporter of the traces, such as :class:`FileSpanExporter`
+                for a file in OpenTelemetry's JSON format or :class:`InMemorySpanExporter`.
+            max_sessions: The maximum number of sessions to keep traces for until they end.
+
+        Example:
+
+        .. code-block:: python
+
+            app.enable_tracing(FileSpanExporter("traces.json"))
+        """
+        self.tracer = Tracer(exporter, self.client_name, max_sessions=max_sessions)
+        self._handlers_changed()
+
+    def enable_profiling(
+        self,
+        directory: str = "profiling",
+        interval: float = 0.01,
+        lag_threshold: float = 0.1,
+        slow_message_time: Optional[float] = None,
+    ):
+        """Profile the app while it runs.
+
+        A sampling profiler takes the stacks of the event loop and the worker threads
+        every ``interval`` seconds, and a warning is logged when a handler blocks the
+        event loop for longer than ``lag_threshold`` seconds. The stack samples are
+        written to ``directory`` in the folded format of FlameGraph when the app
+        receives ``SIGUSR1``, when it stops and when :meth:`rhasspyhermes_app.profiling.Profiler.dump`
+        of :attr:`profiler` is called. With ``slow_message_time``, the handling of each
+        message is profiled with :mod:`cProfile` and the profiles of slow messages are
+        written to the directory.
+
+        Profiling can also be enabled with the ``--profiling-dir`` command-line argument.
+
+        Arguments:
+            directory: The directory of the profiling files.
+            interval: The time in seconds between stack samples.
+            lag_threshold: The event loop lag in seconds above which a warning is logged.
+            slow_message_time: The time in seconds above which the profile of the
+                handling of a message is kept. By default, messages aren't profiled.
+
+        Example:
+
+        .. code-block:: python
+
+            app.enable_profiling("/tmp/profiling", slow_message_time=0.5)
+        """
+        self.profiler = Profiler(directory, interval, lag_threshold, slow_message_time)
+        if self._started:
+            self.profiler.start()
+
+    def add_lane(
+        self,
+        name: str,
+        *topic_filters: str,
+        concurrency: int = 1,
+        max_queue: int = 1000,
+    ) -> Lane:
+        """Handle the messages on some topics in a lane of their own.
+
+        Each received message is normally handled in its own task right away, so a burst
+        of messages on a busy topic, such as audio frames or sensor readings, makes all
+        other messages wait for the event loop. The messages in a lane are queued
+        instead, and at most ``concurrency`` of them are handled at the same time. The
+        other messages, such as intents, still get a task right away, so their latency
+        stays bounded whatever the traffic in the lanes. When a lane's queue is full,
+        its oldest message is dropped.
+
+        A message goes to the first lane with a topic filter matching its topic. A lane
+        without topic filters takes all other messages except the dialogue messages
+        matching :attr:`priority_topics`, such as intents and detected hotwords.
+
+        Arguments:
+            name: The name of the lane.
+            topic_filters: The MQTT topic filters of the messages in the lane, which can
+                contain wildcards.
+            concurrency: The number of messages in the lane that are handled at the
+                same time.
+            max_queue: The maximum number of messages waiting in the lane.
+
+        Returns:
+            The lane, with the numbers of handled and dropped messages.
+
+        Example:
+
+        .. code-block:: python
+
+            app.add_lane("audio", "hermes/audioServer/+/audioFrame", max_queue=100)
+            app.add_lane("bulk", concurrency=4)
+        """
+        lane = Lane(name, topic_filters, concurrency, max_queue)
+        self.lanes[name] = lane
+        self._topic_lanes.clear()
+
+        return lane
+
+    async def _handle_hermes_message(self, mqtt_message: mqtt.MQTTMessage) -> None:
+        """Pass a message to the ``on_message`` methods of :class:`HermesClient`."""
+        for message, site_id, session_id in HermesClient.parse_mqtt_message(
+            mqtt_message.topic,
+            mqtt_message.payload,
+            self.subscribed_types,
+            logger=self.logger,
+        ):
+            if not self.valid_site_id(site_id):
+                continue
+
+            if message.is_binary_payload():
+                if not isinstance(message, (AudioFrame, AudioSessionFrame)):
+                    _LOGGER.debug(
+                        "<- %s(%s byte(s))",
+                        message.__class__.__name__,
+                        len(mqtt_message.payload),
+                    )
+            elif isinstance(message, (AsrTrain, NluTrain)):
+                _LOGGER.debug("<- %s", message.__class__.__name__)
+            elif not isinstance(message, AudioSummary):
+                _LOGGER.debug("<- %s", message)
+
+            await self.publish_all(
+                self.on_message_blocking(
+                    message,
+                    site_id=site_id,
+                    session_id=session_id,
+                    topic=mqtt_message.topic,
+                )
+            )
+            self._track(
+                self.publish_all(
+                    self.on_message(
+                        message,
+                        site_id=site_id,
+                        session_id=session_id,
+                        topic=mqtt_message.topic,
+                    )
+                )
+            )
+
+    def publish(self, message: Message, **topic_args):
+        """Publish a Hermes message to MQTT.
+
+        Arguments:
+            message: The Hermes message to publish.
+            **topic_args: Arguments for the message's topic.
+        """
+        try:
+            topic = message.topic(**topic_args)
+            payload = message.payload()
+
+            if message.is_binary_payload():
+                _LOGGER.debug(
+                    "-> %s(%s byte(s))", message.__class__.__name__, len(payload)
+                )
+            else:
+                _LOGGER.debug("-> %s", message)
+
+            self._publish_payload(topic, payload, self._journal_ttl(message))
+        except Exception:
+            _LOGGER.exception(
+                "publish (message=%s, topic_args=%s)",
+                message.__class__.__name__,
+                topic_args,
+            )
+
+    def _publish_payload(
+        self, topic: str, payload: Union[str, bytes], ttl: Optional[float] = None
+    ) -> None:
+        # The journal is replayed to the app's own broker, so messages for other
+        # brokers are never journaled.
+        if self.broker_router is not None:
+            broker = self.broker_router.route(payload)
+            if broker is not None:
+                _LOGGER.debug("Publishing to %s on broker %s", topic, broker.name)
+                broker.publish(topic, payload)
+                return
+
+        journal = self.journal
+        if journal is not None:
+            if ttl is None:
+                ttl = self.journal_ttl
+
+            # Keep messages in order while the journal hasn't been replayed
+            if not self.is_connected:
+                journal.append(topic, payload, ttl)
+                return
+
+            if journal.append_if_pending(topic, payload, ttl):
+                return
+
+        _LOGGER.debug("Publishing %s bytes(s) to %s", len(payload), topic)
+        with tracing.span("publish"):
+            info = self.mqtt_client.publish(topic, payload)
+
+        if journal is not None and info.rc == mqtt.MQTT_ERR_NO_CONN:
+            assert ttl is not None
+            journal.append(topic, payload, ttl)
+            return
+
+        # Forget messages that have been sent, oldest first
+        pending = self._pending_publishes
+        while pending and pending[0].is_published():
+            pending.popleft()
+        pending.append(info)
+
+    def enable_deduplication(
+        self,
+        window: float = 2.0,
+        capacity: int = 1024,
+        topics: Iterable[str] = DEDUPLICATED_TOPICS,
+    ):
+        """Drop messages that the app receives more than once.
+
+        With QoS 1, the MQTT broker delivers a message again if it didn't get an
+        acknowledgement, for instance after a reconnect. Without deduplication, the app
+        would then handle the same intent twice. With deduplication, a message with
+        the same topic and payload as a message received less than ``window``
+        seconds ago is dropped before it's decoded. The numbers of dropped and handled
+        messages are counted in :attr:`duplicate_filter`.
+
+        Only the messages on ``topics`` whose payload has a session or request ID are
+        deduplicated. By default, these are the intents and other dialogue messages
+        in :data:`rhasspyhermes_app.dedup.DEDUPLICATED_TOPICS`. Messages without such
+        an ID, such as sensor readings of :meth:`on_topic` handlers or hotwords
+        detected outside a session, can be legitimately identical, so they're never
+        dropped.
+
+        Arguments:
+            window: The time in seconds in which a message is a duplicate of an earlier one.
+            capacity: The maximum number of recent messages to remember.
+            topics: The MQTT topic filters of the messages to deduplicate.
+
+        Example:
+
+        .. code-block:: python
+
+            app.enable_deduplication(topics=["hermes/intent/#"])
+        """
+        self.duplicate_filter = DuplicateFilter(window, capacity, topics)
+
+    def add_broker(
+        self,
+        name: str,
+        host: str,
+        port: int = 1883,
+        site_ids: Iterable[str] = (),
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        min_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        client: Optional[mqtt.Client] = None,
+    ) -> BrokerConnection:
+        """Connect to an additional MQTT broker.
+
+        The app subscribes to the same topics on all brokers and handles their messages
+        like the messages of its own broker. A published message goes to the broker of
+        its session or site, as described in :class:`rhasspyhermes_app.brokers.BrokerRouter`,
+        so the replies to a satellite go back to the broker it's connected to. Messages
+        of other sites go to the app's own broker. Only messages for the app's own broker
+        are stored in the outbound journal.
+
+        Each broker reconnects on its own with an exponential backoff. Call this before
+        :meth:`run`.
+
+        Arguments:
+            name: The name of the broker.
+            host: The host name of the broker.
+            port: The port of the broker.
+            site_ids: The IDs of the sites connected to the broker.
+            username: The user name for the broker.
+            password: The password for the broker.
+            min_backoff: The shortest time in seconds between reconnects.
+            max_backoff: The longest time in seconds between reconnects.
+            client: The MQTT client for the broker. By default, a client is created.
+
+        Returns:
+            The connection, which has the health of the broker, such as the number of
+            times it was disconnected.
+
+        Example:
 
-        self.subscribe_topics(*topics)
+        .. code-block:: python
+
+            app.add_broker("floor2", "mqtt-floor2.local", site_ids=["office", "lab"])
+        """
+        if client is None:
+            client = mqtt.Client()
+        if username:
+            client.username_pw_set(username, password)
+
+        if self.broker_router is None:
+            self.broker_router = BrokerRouter()
+
+        broker = BrokerConnection(
+            name, client, host, port, min_backoff=min_backoff, max_backoff=max_backoff
+        )
+        broker.on_message = self._on_broker_message
+        broker.subscribe(self.all_mqtt_topics | self.pending_mqtt_topics)
+
+        self.broker_router.brokers[name] = broker
+        for site_id in site_ids:
+            self.broker_router.site_brokers[site_id] = name
+
+        return broker
+
+    def _on_broker_message(
+        self, broker: BrokerConnection, mqtt_message: mqtt.MQTTMessage
+    ) -> None:
+        assert self.broker_router is not None
+        self.broker_router.learn(broker, mqtt_message.payload)
+        self.mqtt_on_message(broker.client, None, mqtt_message)
+
+    def rate_limit(
+        self,
+        rate: Optional[float],
+        burst: float = 1.0,
+        site_id: Optional[str] = None,
+        intent: Optional[str] = None,
+        topic: Optional[str] = None,
+        policy: str = "drop",
+        max_delay: float = 5.0,
+        reply: Optional[str] = None,
+    ):
+        """Limit the rate of messages from a site, of an intent or on topics.
+
+        A misbehaving satellite or automation can flood the app with intents. Rate limits
+        protect the app and the services its handlers call. Each limit is a token bucket
+        that allows ``burst`` messages at once and ``rate`` messages per second on average.
+        The limits are checked before a message is decoded, and the numbers of throttled
+        messages are counted in :attr:`rate_limiter`.
+
+        Limits can be set, changed and removed while the app is running.
+
+        Arguments:
+            rate: The number of messages per second, or ``None`` to remove the limit.
+            burst: The number of messages that can be received at once after an idle time.
+            site_id: The ID of the site to limit. ``"*"`` limits each site separately.
+                Site limits apply to intents and to the topics of :meth:`on_topic`
+                handlers with a site ID in their payload.
+            intent: The name of the intent to limit. ``"*"`` limits each intent separately.
+            topic: An MQTT topic filter, which can contain wildcards. All topics
+                matching the filter share the limit.
+            policy: What to do with a message over the limit: ``"drop"`` it, ``"delay"``
+                it until it's within the limit, or ``"reply"`` to an intent by ending its
+                session with the ``reply`` text.
+            max_delay: The longest time in seconds to delay a message. Messages that
+                would be delayed longer are dropped.
+            reply: The text to say when the policy is ``"reply"``.
+
+        Example:
+
+        .. code-block:: python
+
+            app.rate_limit(0.5, burst=3, site_id="*", policy="reply", reply="Slow down.")
+        """
+        keys = [
+            (kind, key)
+            for kind, key in (("site", site_id), ("intent", intent), ("topic", topic))
+            if key is not None
+        ]
+        if len(keys) != 1:
+            raise ValueError("Specify one of site_id, intent or topic")
+
+        if self.rate_limiter is None:
+            self.rate_limiter = RateLimiter(site_topics=self._is_site_limited)
+
+        kind, key = keys[0]
+        self.rate_limiter.set_limit(
+            kind,
+            key,
+            RateLimit(rate, burst, policy, max_delay, reply)
+            if rate is not None
+            else None,
+        )
+
+    def circuit_breaker(self, name: str, **options: Any) -> CircuitBreaker:
+        """Get the circuit breaker of a backend, and add it if it doesn't exist.
+
+        Handlers that depend on the same backend share its circuit breaker by passing its
+        name as the ``circuit`` argument of :meth:`on_intent`, so the circuit opens for all
+        of them when the backend fails. The breakers are kept in :attr:`circuit_breakers`.
+
+        Arguments:
+            name: The name of the backend.
+            options: The options of a new :class:`rhasspyhermes_app.circuit.CircuitBreaker`,
+                such as ``timeout`` and ``reset_timeout``.
+
+        Raises:
+            ValueError: The circuit breaker exists and options are specified.
+
+        Example:
+
+        .. code-block:: python
+
+            weather = app.circuit_breaker("weather", timeout=3.0, failure_rate=0.5)
+        """
+        breaker = self.circuit_breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, **options)
+            self.circuit_breakers[name] = breaker
+        elif options:
+            raise ValueError(f"Circuit breaker {name} already exists")
+
+        return breaker
+
+    def enable_journal(
+        self,
+        directory: str,
+        session_ttl: float = 30.0,
+        ttl: float = 3600.0,
+        max_size: int = 64 * 1024 * 1024,
+    ):
+        """Store the messages that the app publishes while it's disconnected.
+
+        Without a journal, messages published while the connection to the MQTT broker
+        is down are lost. With a journal, they're appended to an
+        :class:`rhasspyhermes_app.journal.OutboundJournal` on disk and published in order
+        when the app reconnects, even if the app has been restarted in the meantime.
+
+        Replies to a session expire sooner than other messages, because the dialogue
+        manager ends a session after a timeout. Expired messages aren't published.
+        Messages that are routed to a broker added with :meth:`add_broker` aren't
+        journaled.
+
+        Arguments:
+            directory: The directory to store the journal in.
+            session_ttl: The time in seconds after which a message that continues or
+                ends a session expires.
+            ttl: The time in seconds after which other messages expire.
+            max_size: The maximum size in bytes of the journal. If the journal grows
+                larger, its oldest messages are dropped.
+        """
+        self.journal = OutboundJournal(directory, max_size=max_size)
+        self.journal_session_ttl = session_ttl
+        self.journal_ttl = ttl
+
+    def _journal_ttl(self, message: Message) -> float:
+        if isinstance(message, (DialogueContinueSession, DialogueEndSession)):
+            return self.journal_session_ttl
+
+        return self.journal_ttl
+
+    def mqtt_on_connect(self, client, userdata, flags, rc):
+        """Connected to MQTT broker."""
+        super().mqtt_on_connect(client, userdata, flags, rc)
+
+        if self.journal is not None and rc == mqtt.CONNACK_ACCEPTED:
+            try:
+                self.journal.replay(self._publish_journaled)
+            except Exception:
+                _LOGGER.exception("Replaying outbound journal")
+
+    def _publish_journaled(self, topic: str, payload: bytes) -> bool:
+        info = self.mqtt_client.publish(topic, payload)
+        self._pending_publishes.append(info)
+
+        return info.rc == mqtt.MQTT_ERR_SUCCESS
+
+    async def drain(self, timeout: float = 10.0) -> bool:
+        """Stop the app gracefully.
+
+        The app unsubscribes from all topics and stops taking new messages. It then waits
+        for the messages that it already received to be handled and for the published
+        messages to be sent to the MQTT broker, after which :meth:`run` returns.
+
+        Arguments:
+            timeout: The maximum time in seconds to wait.
+
+        Returns:
+            Whether all messages have been handled and sent before the timeout.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        # Stop taking new messages
+        self._live_subscriptions = False
+        with self.subscribe_lock:
+            topics = list(self.all_mqtt_topics | self.pending_mqtt_topics)
+        self.unsubscribe_topics(*topics)
+
+        if self.in_queue is not None and self._loop_stopped is not None:
+            # Handle the messages received before draining, including the ones
+            # that the MQTT client thread has scheduled to put in the queue
+            loop.call_soon(self.in_queue.put_nowait, None)
+            try:
+                await asyncio.wait_for(
+                    self._loop_stopped.wait(), max(deadline - loop.time(), 0)
+                )
+            except asyncio.TimeoutError:
+                _LOGGER.warning("Timeout while draining received messages")
+
+        # Delayed messages can be put in a lane after the lanes have been emptied
+        while True:
+            for lane in self.lanes.values():
+                try:
+                    await asyncio.wait_for(lane.join(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    _LOGGER.warning(
+                        "%s message(s) still in lane %s after drain",
+                        len(lane),
+                        lane.name,
+                    )
+                    return False
+
+            if not self._inflight:
+                break
+
+            _done, pending = await asyncio.wait(
+                set(self._inflight), timeout=max(deadline - loop.time(), 0)
+            )
+            if pending:
+                _LOGGER.warning("%s handler(s) still running after drain", len(pending))
+                return False
+
+        # Flush published messages
+        while self._pending_publishes and loop.time() < deadline:
+            if self._pending_publishes[0].is_published():
+                self._pending_publishes.popleft()
+            else:
+                await asyncio.sleep(0.01)
+
+        if self._pending_publishes:
+            _LOGGER.warning(
+                "%s published message(s) not sent after drain",
+                len(self._pending_publishes),
+            )
+            return False
+
+        return True
 
     async def on_raw_message(self, topic: str, payload: bytes):
         """This method handles messages from the MQTT broker.
@@ -192,12 +1496,21 @@ class HermesApp(HermesClient):
         .. warning:: Don't override this method in your app. This is where all the magic happens in Rhasspy Hermes App.
         """
         try:
+            internal_topic = self.tracer is not None and topic in _TRACE_TOPICS
+            if self._callbacks_prefetch and self._handle_prefetch(topic, payload):
+                internal_topic = True
+
             if HotwordDetected.is_topic(topic):
                 # hermes/hotword/<wakeword_id>/detected
                 try:
-                    hotword_detected = HotwordDetected.from_json(payload)
-                    for function_h in self._callbacks_hotword:
-                        await function_h(hotword_detected)
+                    with tracing.span("decode"):
+                        hotword_detected = _decode_hotword_detected(payload)
+                    tracing.set_session(
+                        hotword_detected.session_id, hotword_detected.site_id
+                    )
+                    with tracing.span("handler"):
+                        for function_h in self._callbacks_hotword:
+                            await function_h(hotword_detected)
                 except KeyError as key:
                     _LOGGER.error(
                         "Missing key %s in JSON payload for %s: %s", key, topic, payload
@@ -205,11 +1518,14 @@ class HermesApp(HermesClient):
             elif NluIntent.is_topic(topic):
                 # hermes/intent/<intent_name>
                 try:
-                    nlu_intent = NluIntent.from_json(payload)
+                    with tracing.span("decode"):
+                        nlu_intent = NluIntent.from_json(payload)
+                    tracing.set_session(nlu_intent.session_id, nlu_intent.site_id)
                     intent_name = nlu_intent.intent.intent_name
                     if intent_name in self._callbacks_intent:
-                        for function_i in self._callbacks_intent[intent_name]:
-                            await function_i(nlu_intent)
+                        with tracing.span("handler"):
+                            for function_i in self._callbacks_intent[intent_name]:
+                                await function_i(nlu_intent)
                 except KeyError as key:
                     _LOGGER.error(
                         "Missing key %s in JSON payload for %s: %s", key, topic, payload
@@ -217,11 +1533,24 @@ class HermesApp(HermesClient):
             elif NluIntentNotRecognized.is_topic(topic):
                 # hermes/nlu/intentNotRecognized
                 try:
-                    nlu_intent_not_recognized = NluIntentNotRecognized.from_json(
-                        payload
+                    with tracing.span("decode"):
+                        nlu_intent_not_recognized = _decode_nlu_intent_not_recognized(
+                            payload
+                        )
+                    tracing.set_session(
+                        nlu_intent_not_recognized.session_id,
+                        nlu_intent_not_recognized.site_id,
                     )
-                    for function_inr in self._callbacks_intent_not_recognized:
-                        await function_inr(nlu_intent_not_recognized)
+                    fallback_intent = self._match_fallback(nlu_intent_not_recognized)
+                    with tracing.span("handler"):
+                        if fallback_intent is not None:
+                            for function_i in self._callbacks_intent[
+                                fallback_intent.intent.intent_name
+                            ]:
+                                await function_i(fallback_intent)
+                        else:
+                            for function_inr in self._callbacks_intent_not_recognized:
+                                await function_inr(nlu_intent_not_recognized)
                 except KeyError as key:
                     _LOGGER.error(
                         "Missing key %s in JSON payload for %s: %s", key, topic, payload
@@ -229,41 +1558,267 @@ class HermesApp(HermesClient):
             elif DialogueIntentNotRecognized.is_topic(topic):
                 # hermes/dialogueManager/intentNotRecognized
                 try:
-                    dialogue_intent_not_recognized = (
-                        DialogueIntentNotRecognized.from_json(payload)
+                    with tracing.span("decode"):
+                        dialogue_intent_not_recognized = (
+                            _decode_dialogue_intent_not_recognized(payload)
+                        )
+                    tracing.set_session(
+                        dialogue_intent_not_recognized.session_id,
+                        dialogue_intent_not_recognized.site_id,
                     )
-                    for function_dinr in self._callbacks_dialogue_intent_not_recognized:
-                        await function_dinr(dialogue_intent_not_recognized)
+                    callbacks_dinr = self._callbacks_dialogue_intent_not_recognized
+                    with tracing.span("handler"):
+                        for function_dinr in callbacks_dinr:
+                            await function_dinr(dialogue_intent_not_recognized)
                 except KeyError as key:
                     _LOGGER.error(
                         "Missing key %s in JSON payload for %s: %s", key, topic, payload
                     )
             else:
-                unexpected_topic = True
-                if topic in self._callbacks_topic:
-                    for function_1 in self._callbacks_topic[topic]:
-                        await function_1(TopicData(topic, {}), payload)
-                        unexpected_topic = False
-                else:
-                    for function_2 in self._callbacks_topic_regex:
-                        if hasattr(function_2, "topic_extras"):
-                            topic_extras = getattr(function_2, "topic_extras")
-                            for pattern, named_positions in topic_extras:
-                                if re.match(pattern, topic) is not None:
-                                    data = TopicData(topic, {})
-                                    parts = topic.split(sep="/")
-                                    if named_positions is not None:
-                                        for name, position in named_positions.items():
-                                            data.data[name] = parts[position]
-
-                                    await function_2(data, payload)
-                                    unexpected_topic = False
+                unexpected_topic = not internal_topic
+
+                # Call each handler once, even if several of its topics match.
+                # Each handler gets its own topic data, because handlers may change
+                # it, and the topic is only split for placeholders.
+                called = set()
+                for function_1 in self._callbacks_topic.get(topic, ()):
+                    if function_1 not in called:
+                        called.add(function_1)
+                        await function_1(TopicData(topic, {}), payload)
+                        unexpected_topic = False
+
+                parts: Optional[List[str]] = None
+                for function_2 in self._callbacks_topic_regex:
+                    topic_extras = getattr(function_2, "topic_extras", None)
+                    if topic_extras is None or function_2 in called:
+                        continue
+
+                    for pattern, named_positions in topic_extras:
+                        if pattern.match(topic) is not None:
+                            if named_positions is None:
+                                data = TopicData(topic, {})
+                            else:
+                                if parts is None:
+                                    parts = topic.split("/")
+                                site_position = named_positions.get("site_id")
+                                if (
+                                    site_position is not None
+                                    and self.site_ids
+                                    and parts[site_position] not in self.site_ids
+                                ):
+                                    # Subscribed to by another handler
+                                    continue
+
+                                data = TopicData(
+                                    topic,
+                                    {
+                                        name: parts[position]
+                                        for name, position in named_positions.items()
+                                    },
+                                )
+
+                            called.add(function_2)
+                            await function_2(data, payload)
+                            unexpected_topic = False
+                            break
+
+                if unexpected_topic:
+                    _LOGGER.warning("Unexpected topic: %s", topic)
+
+        except Exception:
+            _LOGGER.exception("on_raw_message")
+
+    def set_fallback_phrases(
+        self, phrases: Mapping[str, Iterable[str]], min_score: float = 0.6
+    ):
+        """Match text that the NLU system didn't recognize against example phrases.
+
+        When the app receives a :class:`rhasspyhermes.nlu.NluIntentNotRecognized` message,
+        its input is matched against the phrases with a :class:`rhasspyhermes_app.matcher.PhraseMatcher`.
+        If the most similar phrase has at least the minimum score and belongs to an intent
+        that the app handles, the app calls the intent's handlers with a
+        :class:`rhasspyhermes.nlu.NluIntent` object for the matched intent, with the score as its confidence.
+        Otherwise the handlers decorated with :meth:`on_intent_not_recognized` are called.
+
+        The phrases are compiled into an index once, so matching stays fast for tens of
+        thousands of phrases.
+
+        Arguments:
+            phrases: Example phrases by intent name.
+            min_score: The minimum similarity between 0 and 1 of a matching phrase.
+
+        Example:
+
+        .. code-block:: python
+
+            app.set_fallback_phrases({"GetTime": ["what time is it", "tell me the time"]})
+        """
+        self.fallback_matcher = PhraseMatcher(phrases)
+        self.fallback_min_score = min_score
+        self._handlers_changed()
+
+    def _match_fallback(
+        self, intent_not_recognized: NluIntentNotRecognized
+    ) -> Optional[NluIntent]:
+        """Turn a not recognized input into an intent with the fallback matcher."""
+        if self.fallback_matcher is None or not intent_not_recognized.input:
+            return None
+
+        with tracing.span("fallback"):
+            match = self.fallback_matcher.match(intent_not_recognized.input)
+
+        if match is None:
+            return None
+
+        intent_name, score = match
+        if score < self.fallback_min_score or intent_name not in self._callbacks_intent:
+            return None
+
+        _LOGGER.debug(
+            "Matched %s to %s (score=%s)",
+            intent_not_recognized.input,
+            intent_name,
+            score,
+        )
+
+        return NluIntent(
+            input=intent_not_recognized.input,
+            intent=Intent(intent_name=intent_name, confidence_score=score),
+            site_id=intent_not_recognized.site_id,
+            id=intent_not_recognized.id,
+            session_id=intent_not_recognized.session_id,
+            custom_data=intent_not_recognized.custom_data,
+        )
+
+    def _handle_prefetch(self, topic: str, payload: bytes) -> bool:
+        """Start or evict prefetch tasks for a dialogue message.
+
+        Returns whether the topic is one of the topics used for prefetching.
+        """
+        try:
+            if HotwordDetected.is_topic(topic):
+                hotword_detected = _decode_hotword_detected(payload)
+                self._start_prefetch(
+                    hotword_detected.site_id, hotword_detected.session_id
+                )
+            elif AsrTextCaptured.is_topic(topic):
+                text_captured = AsrTextCaptured.from_json(payload)
+                self._start_prefetch(text_captured.site_id, text_captured.session_id)
+            elif DialogueSessionEnded.is_topic(topic):
+                session_ended = DialogueSessionEnded.from_json(payload)
+                self._evict_prefetch((session_ended.site_id, session_ended.session_id))
+                self._evict_prefetch((session_ended.site_id, None))
+            else:
+                return False
+        except Exception:
+            _LOGGER.exception("Prefetching for a message on %s", topic)
 
-                if unexpected_topic:
-                    _LOGGER.warning("Unexpected topic: %s", topic)
+        return True
 
-        except Exception:
-            _LOGGER.exception("on_raw_message")
+    def _start_prefetch(self, site_id: str, session_id: Optional[str]) -> None:
+        for function in self._callbacks_prefetch:
+            # A hotword and the captured text of the same utterance share one task
+            self._prefetch_task(function, site_id, session_id)
+
+    def _prefetch_task(
+        self,
+        function: Callable[[str], Awaitable[Any]],
+        site_id: str,
+        session_id: Optional[str],
+    ) -> "asyncio.Task[Any]":
+        """Get the task of a prefetch function for a site and session, starting it if
+        it isn't running.
+
+        A task that was started for the site before its session was known, such as
+        when the hotword was detected, is moved to the session.
+        """
+        tasks = self._prefetch_tasks.get((site_id, session_id))
+        if tasks is None:
+            tasks = self._prefetch_tasks[(site_id, session_id)] = {}
+            self._prefetch_timers[
+                (site_id, session_id)
+            ] = asyncio.get_running_loop().call_later(
+                self.prefetch_ttl, self._evict_prefetch, (site_id, session_id)
+            )
+
+        task = tasks.get(function)
+        if task is None and session_id is not None:
+            task = self._prefetch_tasks.get((site_id, None), {}).pop(function, None)
+        if task is None:
+            task = asyncio.ensure_future(function(site_id))
+            task.add_done_callback(_log_prefetch_error)
+        tasks[function] = task
+
+        return task
+
+    def _evict_prefetch(self, key: Tuple[str, Optional[str]]) -> None:
+        """Cancel and forget the prefetch tasks of a site and session."""
+        timer = self._prefetch_timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        for task in self._prefetch_tasks.pop(key, {}).values():
+            task.cancel()
+
+    def prefetch(
+        self, function: Callable[[str], Awaitable[Any]]
+    ) -> Callable[[str], Awaitable[Any]]:
+        """Apply this decorator to a function that loads context for a site while
+        the user is still speaking.
+
+        The decorated function has the site ID as an argument and returns the loaded
+        context. It's started as soon as a hotword is detected or the ASR has captured
+        text on a site, and its result is kept for that session until the session ends,
+        or for :attr:`prefetch_ttl` seconds. Retrieve the result in your intent handler
+        with :meth:`prefetched`. If the prefetch function raises an exception, it's
+        logged and raised again by :meth:`prefetched`.
+
+        Example:
+
+        .. code-block:: python
+
+            @app.prefetch
+            async def load_profile(site_id: str):
+                return await database.load_profile(site_id)
+
+            @app.on_intent("GetTime")
+            async def get_time(intent: NluIntent):
+                profile = await app.prefetched(
+                    load_profile, intent.site_id, intent.session_id
+                )
+                return EndSession(f"It's too late, {profile.name}.")
+        """
+
+        self._callbacks_prefetch.append(function)
+        self._handlers_changed()
+
+        return function
+
+    async def prefetched(
+        self,
+        function: Callable[[str], Awaitable[Any]],
+        site_id: str,
+        session_id: Optional[str] = None,
+    ) -> Any:
+        """Get the result of a prefetch function for a site and session.
+
+        Arguments:
+            function: A function decorated with :meth:`prefetch`.
+            site_id: The ID of the site to get the prefetched result for.
+            session_id: The ID of the session to get the prefetched result for. Without
+                it, the latest result for the site is used.
+
+        If the prefetch function is still running, this waits for its result. If it
+        hasn't been started for this site and session, it's started now.
+        """
+        if session_id is None:
+            for (task_site_id, _session_id), tasks in reversed(
+                list(self._prefetch_tasks.items())
+            ):
+                if task_site_id == site_id and function in tasks:
+                    return await tasks[function]
+
+        return await self._prefetch_task(function, site_id, session_id)
 
     def on_hotword(
         self, function: Callable[[HotwordDetected], Awaitable[None]]
@@ -286,15 +1841,36 @@ class HermesApp(HermesClient):
         """
 
         self._callbacks_hotword.append(function)
+        self._handlers_changed()
 
         return function
 
     def on_intent(
-        self, *intent_names: str
+        self,
+        *intent_names: str,
+        slots: Optional[type] = None,
+        slot_error: Union[
+            ContinueSession,
+            EndSession,
+            Callable[[NluIntent, SlotError], Union[ContinueSession, EndSession]],
+            None,
+        ] = None,
+        circuit: Union[str, CircuitBreaker, None] = None,
+        fallback: Union[
+            ContinueSession,
+            EndSession,
+            Response,
+            Callable[[NluIntent], Union[ContinueSession, EndSession, Response]],
+            None,
+        ] = None,
     ) -> Callable[
         [
             Callable[
-                [NluIntent], Union[Awaitable[ContinueSession], Awaitable[EndSession]]
+                ...,
+                Union[
+                    Awaitable[Union[ContinueSession, EndSession, Response, None]],
+                    AsyncIterator[str],
+                ],
             ]
         ],
         Callable[[NluIntent], Awaitable[None]],
@@ -303,6 +1879,21 @@ class HermesApp(HermesClient):
 
         Arguments:
             intent_names: Names of the intents you want the function to act on.
+            slots: A dataclass with a field for each slot of the intents. If it's
+                specified, the slots are converted to this dataclass before the function
+                is called, as described in :class:`rhasspyhermes_app.slots.SlotExtractor`.
+            slot_error: The response if a slot is missing or invalid: a :class:`ContinueSession`
+                or :class:`EndSession` object, or a function that is called with the intent
+                and the :class:`rhasspyhermes_app.slots.SlotError` and returns one.
+                By default, the error is logged and the session is ended without text.
+            circuit: A :class:`rhasspyhermes_app.circuit.CircuitBreaker`, or the name of
+                one added with :meth:`circuit_breaker`, to call the function through.
+                While the circuit is open, the function isn't called.
+            fallback: The response if the circuit is open, or the function fails or
+                times out: a :class:`ContinueSession`, :class:`EndSession` or
+                :class:`rhasspyhermes_app.templates.Response` object, or a function that
+                is called with the intent and returns one. By default, the session is
+                ended with a text that says the service is unavailable.
 
         The decorated function has a :class:`rhasspyhermes.nlu.NluIntent` object as an argument
         and needs to return a :class:`ContinueSession` or :class:`EndSession` object.
@@ -310,6 +1901,12 @@ class HermesApp(HermesClient):
         If the function returns a :class:`ContinueSession` object, the intent's session is continued after
         saying the supplied text. If the function returns a a :class:`EndSession` object, the intent's session
         is ended after saying the supplied text, or immediately when no text is supplied.
+        The function can also return a response rendered from a :meth:`response_template`.
+
+        If the function is an async generator, it yields the text of a long answer in
+        chunks. Each chunk is said as soon as it's ready and the previous chunk has been
+        said, while the function computes the next one. The session is ended after the
+        last chunk.
 
         Example:
 
@@ -321,16 +1918,129 @@ class HermesApp(HermesClient):
 
         If the intent with name GetTime has been detected, the ``get_time`` function is called
         with the ``intent`` argument. This object holds information about the detected intent.
+
+        With the ``slots`` argument, the function is called with the converted slots as
+        second argument:
+
+        .. code-block:: python
+
+            @dataclass
+            class TimerSlots:
+                minutes: int
+
+            @app.on_intent(
+                "SetTimer",
+                slots=TimerSlots,
+                slot_error=ContinueSession(
+                    text="For how many minutes?", intent_filter=["SetTimer"]
+                ),
+            )
+            async def set_timer(intent: NluIntent, slots: TimerSlots):
+                return EndSession(f"Timer set for {slots.minutes} minutes.")
+
+        With the ``circuit`` argument, the app answers right away with the ``fallback``
+        response while the backend of the function is down:
+
+        .. code-block:: python
+
+            app.circuit_breaker("advice", timeout=2.0, reset_timeout=60.0)
+
+            @app.on_intent(
+                "GetAdvice",
+                circuit="advice",
+                fallback=EndSession("The advice service is unavailable."),
+            )
+            async def get_advice(intent: NluIntent):
+                async with app.http_session().get(URL) as response:
+                    return EndSession((await response.json())["slip"]["advice"])
+
+        An async generator streams its answer:
+
+        .. code-block:: python
+
+            @app.on_intent("GetNews")
+            async def get_news(intent: NluIntent):
+                async for article in news.latest():
+                    yield await news.summarize(article)
         """
+        extract: Optional[SlotExtractor] = (
+            SlotExtractor(slots) if slots is not None else None
+        )
+        circuit_breaker = (
+            self.circuit_breaker(circuit) if isinstance(circuit, str) else circuit
+        )
 
         def wrapper(
             function: Callable[
-                [NluIntent], Union[Awaitable[ContinueSession], Awaitable[EndSession]]
+                ...,
+                Union[
+                    Awaitable[Union[ContinueSession, EndSession, Response, None]],
+                    AsyncIterator[str],
+                ],
             ]
         ) -> Callable[[NluIntent], Awaitable[None]]:
+            handler: Callable[
+                ..., Awaitable[Union[ContinueSession, EndSession, Response, None]]
+            ] = (
+                self._streaming_handler(function)
+                if inspect.isasyncgenfunction(function)
+                else function  # type: ignore
+            )
+
+            async def call(
+                intent: NluIntent, *args: Any
+            ) -> Union[ContinueSession, EndSession, Response, None]:
+                if circuit_breaker is None:
+                    return await handler(intent, *args)
+
+                try:
+                    return await circuit_breaker.call(handler, intent, *args)
+                except CircuitOpenError as error:
+                    _LOGGER.debug("%s: %s", intent.intent.intent_name, error)
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception(
+                        "%s failed in circuit %s",
+                        intent.intent.intent_name,
+                        circuit_breaker.name,
+                    )
+
+                if fallback is None:
+                    return _SERVICE_UNAVAILABLE
+                if isinstance(fallback, (ContinueSession, EndSession, Response)):
+                    return fallback
+                return fallback(intent)
+
             async def wrapped(intent: NluIntent) -> None:
-                message = await function(intent)
-                if isinstance(message, EndSession):
+                if extract is None:
+                    message = await call(intent)
+                else:
+                    try:
+                        intent_slots = extract(intent)
+                    except SlotError as error:
+                        if isinstance(slot_error, (ContinueSession, EndSession)):
+                            _LOGGER.debug("%s: %s", intent.intent.intent_name, error)
+                            message = slot_error
+                        elif slot_error is not None:
+                            _LOGGER.debug("%s: %s", intent.intent.intent_name, error)
+                            message = slot_error(intent, error)
+                        else:
+                            # The error message isn't meant to be said
+                            _LOGGER.error("%s: %s", intent.intent.intent_name, error)
+                            message = EndSession()
+                    else:
+                        message = await call(intent, intent_slots)
+
+                if isinstance(message, Response):
+                    if intent.session_id is not None:
+                        _LOGGER.debug("-> %s", message)
+                        self._publish_payload(
+                            message.topic,
+                            message.payload(intent.session_id),
+                            self.journal_session_ttl,
+                        )
+                    else:
+                        _LOGGER.error("Cannot respond to intent without session ID.")
+                elif isinstance(message, EndSession):
                     if intent.session_id is not None:
                         self.publish(
                             DialogueEndSession(
@@ -359,16 +2069,100 @@ class HermesApp(HermesClient):
                             "Cannot continue session of intent without session ID."
                         )
 
+            # Streaming handlers need the sayFinished messages until they're removed
+            wrapped.streaming = inspect.isasyncgenfunction(function)  # type: ignore
+
             for intent_name in intent_names:
                 try:
                     self._callbacks_intent[intent_name].append(wrapped)
                 except KeyError:
                     self._callbacks_intent[intent_name] = [wrapped]
 
+            self._handlers_changed()
+
             return wrapped
 
         return wrapper
 
+    def _streaming_handler(
+        self, function: Callable[..., AsyncIterator[str]]
+    ) -> Callable[..., Awaitable[None]]:
+        """Wrap an async generator that yields the chunks of a response."""
+        topic = TtsSayFinished.topic()
+        say_finished_handlers = self._callbacks_topic.setdefault(topic, [])
+        if self._handle_say_finished not in say_finished_handlers:
+            say_finished_handlers.append(self._handle_say_finished)
+            self._handlers_changed()
+
+        async def stream(intent: NluIntent, *args: Any) -> None:
+            await self._stream_response(intent, function(intent, *args))
+
+        return stream
+
+    async def _stream_response(
+        self, intent: NluIntent, chunks: AsyncIterator[str]
+    ) -> None:
+        """Say the chunks of a response in the intent's session and end it."""
+        session_id = intent.session_id
+        if session_id is None:
+            _LOGGER.error("Cannot stream response to intent without session ID.")
+            return
+
+        # The handler computes the next chunk while the previous one is said
+        queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+        async def produce() -> None:
+            try:
+                async for chunk in chunks:
+                    if chunk:
+                        queue.put_nowait(chunk)
+            finally:
+                queue.put_nowait(None)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+
+                await self._say(chunk, intent, session_id)
+
+            await producer
+        finally:
+            producer.cancel()
+
+            # End the session even if the handler failed, instead of leaving it open
+            # until the dialogue manager's timeout
+            self.publish(DialogueEndSession(session_id=session_id))
+
+    async def _say(self, text: str, intent: NluIntent, session_id: str) -> None:
+        """Say a text in a session and wait until it has been said."""
+        say_id = str(uuid.uuid4())
+        finished = asyncio.get_running_loop().create_future()
+        self._say_waiters[say_id] = finished
+        try:
+            self.publish(
+                TtsSay(
+                    text=text,
+                    site_id=intent.site_id,
+                    lang=intent.lang,
+                    id=say_id,
+                    session_id=session_id,
+                )
+            )
+            await asyncio.wait_for(finished, self.say_timeout)
+        except asyncio.TimeoutError:
+            _LOGGER.warning("TTS didn't finish saying %r in time", text)
+        finally:
+            self._say_waiters.pop(say_id, None)
+
+    async def _handle_say_finished(self, _data: TopicData, payload: bytes) -> None:
+        say_id = json.loads(payload).get("id")
+        finished = self._say_waiters.get(say_id)
+        if finished is not None and not finished.done():
+            finished.set_result(None)
+
     def on_intent_not_recognized(
         self,
         function: Callable[
@@ -431,6 +2225,7 @@ class HermesApp(HermesClient):
                     )
 
         self._callbacks_intent_not_recognized.append(wrapped)
+        self._handlers_changed()
 
         return wrapped
 
@@ -438,7 +2233,7 @@ class HermesApp(HermesClient):
         self,
         function: Callable[
             [DialogueIntentNotRecognized],
-            Union[Awaitable[ContinueSession], Awaitable[EndSession], Awaitable[None]],
+            Awaitable[Union[ContinueSession, EndSession, None]],
         ],
     ) -> Callable[[DialogueIntentNotRecognized], Awaitable[None]]:
         """Apply this decorator to a function that you want to act when the dialogue manager
@@ -497,14 +2292,26 @@ class HermesApp(HermesClient):
                     )
 
         self._callbacks_dialogue_intent_not_recognized.append(wrapped)
+        self._handlers_changed()
 
         return wrapped
 
-    def on_topic(self, *topic_names: str):
+    def on_topic(
+        self,
+        *topic_names: str,
+        batch: bool = False,
+        max_size: int = 100,
+        max_wait: float = 0.01,
+        conflate: bool = False,
+    ):
         """Apply this decorator to a function that you want to act on a received raw MQTT message.
 
         Arguments:
             topic_names: The MQTT topics you want the function to act on.
+            batch: Whether the function is called with batches of messages, see below.
+            max_size: The maximum number of messages in a batch.
+            max_wait: The longest time in seconds that a message waits for its batch.
+            conflate: Whether a batch only keeps the latest message of each topic.
 
         The decorated function has a :class:`TopicData` and a :class:`bytes` object as its arguments.
         The former holds data about the topic and the latter about the payload of the MQTT message.
@@ -520,11 +2327,43 @@ class HermesApp(HermesClient):
         .. note:: The topic names can contain MQTT wildcards (`+` and `#`) or templates (`{foobar}`).
             In the latter case, the value of the named template is available in the decorated function
             as part of the :class:`TopicData` argument.
+
+        A ``{site_id}`` placeholder is subscribed to for each site of :meth:`set_site_ids`,
+        so the MQTT broker only sends the messages of these sites.
+
+        For topics that receive hundreds of messages per second, such as sensor
+        readings, the function can handle the messages in batches. It's then called with
+        a list of :class:`TopicData` and :class:`bytes` pairs when ``max_size`` messages
+        have been received or the first message has waited ``max_wait`` seconds. Each
+        topic name has its own batches, which are counted in a
+        :class:`rhasspyhermes_app.batching.TopicBatch` object in the ``batches``
+        attribute of the decorated function by topic name.
+
+        .. code-block:: python
+
+            @app.on_topic("sensors/{site_id}/temperature", batch=True, conflate=True)
+            async def temperatures(messages: List[Tuple[TopicData, bytes]]):
+                for data, payload in messages:
+                    temperature[data.data["site_id"]] = float(payload)
         """
 
         def wrapper(function):
-            async def wrapped(data: TopicData, payload: bytes):
-                await function(data, payload)
+            if batch:
+                # The batch of each topic name and the pattern matching its topics
+                pattern_batches: List[Tuple[Pattern[str], TopicBatch]] = []
+
+                async def wrapped(data: TopicData, payload: bytes):
+                    for topic_pattern, topic_batch in pattern_batches:
+                        if topic_pattern.match(data.topic):
+                            await topic_batch.add(data, payload)
+                            break
+
+                wrapped.batches = {}  # type: ignore
+
+            else:
+
+                async def wrapped(data: TopicData, payload: bytes):
+                    await function(data, payload)
 
             replaced_topic_names = []
 
@@ -543,6 +2382,10 @@ class HermesApp(HermesClient):
 
                 parts = list(map(placeholder_mapper, enumerate(parts)))
                 replaced_topic_name = "/".join(parts)
+                if "site_id" in named_positions:
+                    site_parts = list(parts)
+                    site_parts[named_positions["site_id"]] = _SITE_PLACEHOLDER
+                    replaced_topic_name = "/".join(site_parts)
 
                 def regex_mapper(part):
                     i, token = tuple(part)
@@ -571,6 +2414,13 @@ class HermesApp(HermesClient):
 
                 pattern = "/".join(map(regex_mapper, enumerate(parts)))
 
+                if batch:
+                    topic_batch = TopicBatch(
+                        function, max_size, max_wait, conflate, self._track
+                    )
+                    pattern_batches.append((re.compile(pattern), topic_batch))
+                    wrapped.batches[topic_name] = topic_batch
+
                 if topic_name == pattern[1:-1]:
                     try:
                         self._callbacks_topic[topic_name].append(wrapped)
@@ -588,19 +2438,100 @@ class HermesApp(HermesClient):
                     )
 
             if hasattr(wrapped, "topic_extras"):
+                wrapped.topic_names = replaced_topic_names
                 self._callbacks_topic_regex.append(wrapped)
                 self._additional_topic.extend(replaced_topic_names)
 
+            self._handlers_changed()
+
             return wrapped
 
         return wrapper
 
-    def run(self):
+    def run(
+        self,
+        loop_factory: Optional[Callable[[], asyncio.AbstractEventLoop]] = None,
+        policy: Optional[asyncio.AbstractEventLoopPolicy] = None,
+        uvloop: bool = False,
+        debug: bool = False,
+        slow_callback_duration: Optional[float] = None,
+    ):
         """Run the app. This method:
 
         - subscribes to all MQTT topics for the functions you decorated;
         - connects to the MQTT broker;
-        - starts the MQTT event loop and reacts to received MQTT messages.
+        - creates the resources you added and runs the functions you decorated with :meth:`on_startup`;
+        - starts the MQTT event loop and reacts to received MQTT messages;
+        - runs the functions you decorated with :meth:`on_shutdown` and closes the resources when it stops.
+
+        On ``SIGTERM``, the app stops gracefully with :meth:`drain`.
+        If profiling is enabled, ``SIGUSR1`` writes the stack samples, see :meth:`enable_profiling`.
+
+        The app runs in a new event loop, which is closed when it stops. To run the app
+        in an event loop that is already running, use :meth:`run_async` instead.
+
+        Arguments:
+            loop_factory: A function that creates the event loop. By default, the loop
+                is created by the event loop policy.
+            policy: An event loop policy to set before the loop is created.
+            uvloop: Whether to run the app in a `uvloop <https://uvloop.readthedocs.io>`_
+                event loop, which handles messages faster than the default event loop.
+                If the ``uvloop`` package isn't installed, the default event loop is used.
+                It can't be combined with ``loop_factory``.
+            debug: Whether to run the event loop in the debug mode of :mod:`asyncio`.
+            slow_callback_duration: The time in seconds above which the debug mode logs
+                a callback as slow.
+
+        Example:
+
+        .. code-block:: python
+
+            app.run(uvloop=True)
+        """
+        if uvloop and loop_factory is not None:
+            raise ValueError("Specify either uvloop or loop_factory")
+
+        if uvloop:
+            try:
+                # pylint: disable=import-outside-toplevel,import-error
+                import uvloop as uvloop_module  # type: ignore
+
+                loop_factory = uvloop_module.new_event_loop
+            except ImportError:
+                _LOGGER.warning("uvloop isn't installed, using the default event loop")
+
+        if policy is not None:
+            asyncio.set_event_loop_policy(policy)
+
+        loop = loop_factory() if loop_factory is not None else asyncio.new_event_loop()
+        loop.set_debug(debug)
+        if slow_callback_duration is not None:
+            loop.slow_callback_duration = slow_callback_duration
+
+        try:
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.run_async(handle_signals=True))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            _close_loop(loop)
+
+    async def run_async(self, handle_signals: bool = False) -> None:
+        """Run the app in the running event loop until it's drained.
+
+        This does the same as :meth:`run`, but lets you embed the app in a larger
+        :mod:`asyncio` application.
+
+        Arguments:
+            handle_signals: Whether to drain the app on ``SIGTERM``. By default, the
+                signal handlers of the application are left alone.
+
+        Example:
+
+        .. code-block:: python
+
+            async def main():
+                await asyncio.gather(app.run_async(), web_server.serve())
         """
         # Subscribe to callbacks
         self._subscribe_callbacks()
@@ -608,17 +2539,523 @@ class HermesApp(HermesClient):
         # Try to connect
         # pylint: disable=no-member
         _LOGGER.debug("Connecting to %s:%s", self.args.host, self.args.port)
-        hermes_cli.connect(self.mqtt_client, self.args)
+        await asyncio.get_running_loop().run_in_executor(
+            None, hermes_cli.connect, self.mqtt_client, self.args
+        )
         self.mqtt_client.loop_start()
 
+        brokers = self.broker_router.brokers if self.broker_router is not None else {}
+        for broker in brokers.values():
+            broker.start()
+
         try:
             # Run main loop
-            asyncio.run(self.handle_messages_async())
-        except KeyboardInterrupt:
-            pass
+            await self._run_async(handle_signals)
         finally:
+            for broker in brokers.values():
+                broker.stop()
             self.mqtt_client.loop_stop()
 
+    async def _run_async(self, handle_signals: bool = True) -> None:
+        if handle_signals:
+            self._add_signal_handlers()
+
+        await self._startup()
+        try:
+            await self.handle_messages_async()
+        finally:
+            await self._shutdown()
+
+    def _add_signal_handlers(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            # Drain gracefully when the service manager stops the app
+            loop.add_signal_handler(
+                signal.SIGTERM, lambda: asyncio.ensure_future(self.drain())
+            )
+            if self.profiler is not None:
+                loop.add_signal_handler(signal.SIGUSR1, self.profiler.dump)
+        except (NotImplementedError, RuntimeError, AttributeError):
+            # Signals aren't supported on this platform or in this thread
+            pass
+
+    async def _startup(self) -> None:
+        for name, (factory, _close) in self._resource_factories.items():
+            self.resources[name] = await factory()
+
+        self._started = True
+        if self.scheduler is not None:
+            self.scheduler.start(self._fire_scheduled)
+        if self.profiler is not None:
+            self.profiler.start()
+
+        for function in self._callbacks_startup:
+            await function()
+
+    async def _shutdown(self) -> None:
+        # Handle the messages that are waiting for their batch
+        topic_handlers = set(self._callbacks_topic_regex)
+        for functions in self._callbacks_topic.values():
+            topic_handlers.update(functions)
+        for topic_handler in topic_handlers:
+            for topic_batch in getattr(topic_handler, "batches", {}).values():
+                await topic_batch.flush()
+
+        for function in self._callbacks_shutdown:
+            try:
+                await function()
+            except Exception:
+                _LOGGER.exception("on_shutdown")
+
+        self._started = False
+        for key in list(self._prefetch_tasks):
+            self._evict_prefetch(key)
+        for lane in self.lanes.values():
+            await lane.stop()
+        if self.scheduler is not None:
+            await self.scheduler.stop()
+        if self.notification_coalescer is not None:
+            self.notification_coalescer.flush(self._publish_notification)
+        if self.memo_store is not None:
+            self.memo_store.close()
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler.dump()
+
+        # Close resources in the reverse order of their creation
+        for name in reversed(list(self.resources)):
+            resource = self.resources.pop(name)
+            close = self._resource_factories[name][1]
+            try:
+                if close is not None:
+                    await close(resource)
+            except Exception:
+                _LOGGER.exception("Closing resource %s", name)
+
+        if self._http_session is not None:
+            await self._http_session.close()
+            self._http_session = None
+
+    def on_startup(
+        self, function: Callable[[], Awaitable[None]]
+    ) -> Callable[[], Awaitable[None]]:
+        """Apply this decorator to a function that you want to run when the app starts.
+
+        The decorated function is called without arguments in the app's event loop
+        after the resources added with :meth:`add_resource` have been created and before
+        the first message is handled.
+        """
+
+        self._callbacks_startup.append(function)
+
+        return function
+
+    def on_shutdown(
+        self, function: Callable[[], Awaitable[None]]
+    ) -> Callable[[], Awaitable[None]]:
+        """Apply this decorator to a function that you want to run when the app stops.
+
+        The decorated function is called without arguments in the app's event loop
+        before the resources added with :meth:`add_resource` are closed.
+        """
+
+        self._callbacks_shutdown.append(function)
+
+        return function
+
+    def add_resource(
+        self,
+        name: str,
+        factory: Callable[[], Awaitable[Any]],
+        close: Optional[Callable[[Any], Awaitable[None]]] = None,
+    ):
+        """Add an async resource that lives as long as the app runs.
+
+        Use this for connections that should be shared by all handlers instead of being
+        set up again for every intent, such as a database connection pool.
+
+        Arguments:
+            name: The name of the resource in :attr:`resources`.
+            factory: An async function that creates the resource when the app starts.
+            close: An async function that closes the resource when the app stops.
+
+        Example:
+
+        .. code-block:: python
+
+            app.add_resource("db", lambda: asyncpg.create_pool(DSN), lambda pool: pool.close())
+
+            @app.on_intent("GetSchedule")
+            async def get_schedule(intent: NluIntent):
+                rows = await app.resources["db"].fetch(QUERY)
+        """
+        self._resource_factories[name] = (factory, close)
+
+    def configure_http(self, **options: Any):
+        """Configure the connection pool of :meth:`http_session`.
+
+        Arguments:
+            **options: Options of ``aiohttp.TCPConnector``, such as ``limit`` (the
+                total number of connections, 100 by default), ``limit_per_host``
+                (10 by default) and ``keepalive_timeout`` (30 seconds by default).
+        """
+        self._http_options.update(options)
+
+    def http_session(self) -> "aiohttp.ClientSession":
+        """Get the app's shared ``aiohttp.ClientSession``.
+
+        The session is created on first use and closed when the app stops. All handlers
+        share its connection pool, so requests to the same host reuse kept-alive
+        connections instead of setting up DNS, TCP and TLS again. Usage of the pool is
+        counted in :attr:`http_metrics`.
+
+        This requires the `aiohttp <https://docs.aiohttp.org>`_ package.
+
+        Example:
+
+        .. code-block:: python
+
+            @app.on_intent("GetAdvice")
+            async def get_advice(intent: NluIntent):
+                async with app.http_session().get(URL) as response:
+                    message = await response.json()
+        """
+        session = self._http_session
+        if session is None:
+            # pylint: disable=import-outside-toplevel,import-error,redefined-outer-name
+            import aiohttp
+
+            trace_config = aiohttp.TraceConfig()
+            for trace_signal, counter in (
+                (trace_config.on_request_start, "requests"),
+                (trace_config.on_connection_create_end, "connections_created"),
+                (trace_config.on_connection_reuseconn, "connections_reused"),
+                (trace_config.on_connection_queued_start, "connections_queued"),
+            ):
+                trace_signal.append(self._http_counter(counter))
+
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**self._http_options),
+                trace_configs=[trace_config],
+            )
+            self._http_session = session
+
+        return session
+
+    def _http_counter(self, counter: str) -> Callable[..., Awaitable[None]]:
+        async def count(*_args: Any) -> None:
+            self.http_metrics[counter] += 1
+
+        return count
+
+    def response_template(
+        self,
+        text: str,
+        continue_session: bool = False,
+        intent_filter: Optional[List[str]] = None,
+        send_intent_not_recognized: bool = False,
+        custom_data: Optional[str] = None,
+    ) -> ResponseTemplate:
+        """Compile a response text with fields.
+
+        Intent handlers return a response rendered from the template instead of an
+        :class:`EndSession` or :class:`ContinueSession` object. The template is encoded
+        to JSON once, so publishing a response only encodes the session ID and the values
+        of the fields.
+
+        If :attr:`tts_cache_hook` is set when the template is created, it's called for a
+        template without fields and for the values passed to
+        :meth:`rhasspyhermes_app.templates.ResponseTemplate.warm`.
+
+        Arguments:
+            text: The text with fields such as ``{room}``, as for :meth:`str.format`.
+            continue_session: Whether the response continues the session instead of
+                ending it.
+            intent_filter: The intents of the answer when the session is continued.
+            send_intent_not_recognized: Whether the dialogue manager sends not recognized
+                intents to the app when the session is continued.
+            custom_data: An update to the session's custom data.
+
+        Example:
+
+        .. code-block:: python
+
+            light_on = app.response_template("The {room} light is on.")
+            light_on.warm({"room": room} for room in ROOMS)
+
+            @app.on_intent("LightOn")
+            async def turn_on(intent: NluIntent):
+                room = intent.slots[0].value["value"]
+                return light_on.render(room=room)
+        """
+        return ResponseTemplate(
+            text,
+            continue_session=continue_session,
+            intent_filter=intent_filter,
+            send_intent_not_recognized=send_intent_not_recognized,
+            custom_data=custom_data,
+            tts_cache_hook=self.tts_cache_hook,
+        )
+
+    def dialogue_flow(self, initial: str, max_sessions: int = 1000) -> "DialogueFlow":
+        """Create a multi-turn dialogue flow.
+
+        See :class:`rhasspyhermes_app.flow.DialogueFlow` for how to add states and
+        transitions.
+
+        Arguments:
+            initial: The name of the state of a session that enters the flow.
+            max_sessions: The maximum number of sessions to keep the state of.
+        """
+        # The flow module builds on this module
+        from .flow import DialogueFlow  # pylint: disable=import-outside-toplevel
+
+        return DialogueFlow(self, initial, max_sessions)
+
+    def enable_scheduler(
+        self, path: Optional[str] = None, catch_up: str = "once", grace: float = 60.0
+    ):
+        """Configure the scheduler of :meth:`schedule`.
+
+        Without a database file, scheduled jobs are lost when the app stops. With it,
+        they are loaded again when the app starts. Jobs that were due while the app
+        wasn't running are handled according to their catch-up policy: ``"once"``
+        runs a missed job once, ``"all"`` runs a periodic job for each missed time and
+        ``"skip"`` only runs a job at its next time.
+
+        Call this before the app runs. Functions registered with :meth:`on_schedule`
+        and jobs scheduled before are kept.
+
+        Arguments:
+            path: The path of the SQLite database file.
+            catch_up: The default catch-up policy of jobs.
+            grace: The time in seconds that a job can be late without applying its
+                catch-up policy.
+
+        Raises:
+            RuntimeError: The app is already running.
+        """
+        if self._started:
+            raise RuntimeError("Enable the scheduler before the app runs")
+
+        scheduler = Scheduler(path, catch_up, grace)
+        if self.scheduler is not None:
+            scheduler.take_over(self.scheduler)
+
+        self.scheduler = scheduler
+
+    def on_schedule(
+        self, function: Callable[[ScheduledJob], Awaitable[None]]
+    ) -> Callable[[ScheduledJob], Awaitable[None]]:
+        """Apply this decorator to a function that you want to call from scheduled jobs.
+
+        The decorated function has a :class:`rhasspyhermes_app.scheduler.ScheduledJob`
+        object as an argument. Scheduled jobs refer to the function by its name, so
+        register it when the app starts to run the jobs stored by an earlier run.
+
+        Example:
+
+        .. code-block:: python
+
+            @app.on_schedule
+            async def water_plants(job: ScheduledJob):
+                app.notify("Time to water the plants.", job.site_id)
+
+            app.schedule(cron="0 9 * * 1", callback=water_plants)
+        """
+        self._get_scheduler().callbacks[function.__name__] = function
+
+        return function
+
+    def _get_scheduler(self) -> Scheduler:
+        if self.scheduler is None:
+            self.scheduler = Scheduler()
+            if self._started:
+                self.scheduler.start(self._fire_scheduled)
+
+        return self.scheduler
+
+    def schedule(
+        self,
+        at: Union[datetime, float, None] = None,
+        every: Union[timedelta, float, None] = None,
+        cron: Optional[str] = None,
+        site_id: str = "default",
+        text: Optional[str] = None,
+        callback: Union[str, Callable[[ScheduledJob], Awaitable[None]], None] = None,
+        data: Any = None,
+        job_id: Optional[str] = None,
+        catch_up: Optional[str] = None,
+    ) -> ScheduledJob:
+        """Schedule a notification or a function call.
+
+        All jobs are run from a single task of the app, which sleeps until the next
+        job is due, so the app can have tens of thousands of timers.
+
+        Arguments:
+            at: The time of the job.
+            every: The time between the runs of a periodic job. Without ``at``, the job
+                runs first after this time.
+            cron: A cron expression for the times of the job, such as ``"30 7 * * 1-5"``
+                for 7:30 on weekdays.
+            site_id: The ID of the site of the job.
+            text: The text to say at the site with :meth:`notify`.
+            callback: A function registered with :meth:`on_schedule`, or its name, to call
+                with the job.
+            data: Data for the callback that can be encoded as JSON.
+            job_id: The ID of the job. A job with the same ID is replaced.
+            catch_up: The catch-up policy of the job, as described in :meth:`enable_scheduler`.
+
+        Returns:
+            The scheduled job. Pass its ID to :meth:`cancel_schedule` to cancel it.
+
+        Example:
+
+        .. code-block:: python
+
+            @app.on_intent("SetTimer")
+            async def set_timer(intent: NluIntent):
+                app.schedule(
+                    at=time.time() + 300, site_id=intent.site_id, text="Time's up!"
+                )
+                return EndSession("Timer set for five minutes.")
+        """
+        scheduler = self._get_scheduler()
+        if callable(callback):
+            scheduler.callbacks[callback.__name__] = callback
+            callback = callback.__name__
+
+        return scheduler.add(
+            at=at.timestamp() if isinstance(at, datetime) else at,
+            every=every.total_seconds() if isinstance(every, timedelta) else every,
+            cron=cron,
+            site_id=site_id,
+            text=text,
+            callback=callback,
+            data=data,
+            job_id=job_id,
+            catch_up=catch_up,
+        )
+
+    def cancel_schedule(self, job_id: str) -> bool:
+        """Cancel a job scheduled with :meth:`schedule`.
+
+        Returns:
+            Whether the job was scheduled.
+        """
+        return self.scheduler is not None and self.scheduler.cancel(job_id)
+
+    def _fire_scheduled(self, job: ScheduledJob) -> None:
+        if job.text is not None:
+            self.notify(job.text, job.site_id)
+
+        if job.callback is not None:
+            assert self.scheduler is not None
+            function = self.scheduler.callbacks.get(job.callback)
+            if function is None:
+                _LOGGER.error(
+                    "No function %s registered for job %s", job.callback, job.id
+                )
+            else:
+                self._track(function(job))
+
+    def enable_memo(self, path: Optional[str] = None, max_entries: int = 1000):
+        """Configure the store of :meth:`memoize`.
+
+        Without a database file, memoized results are lost when the app stops. With it,
+        they are loaded again when the app starts, so the first intents after a restart
+        are answered as fast as later ones.
+
+        Call this before the app runs.
+
+        Arguments:
+            path: The path of the SQLite database file.
+            max_entries: The maximum number of memoized results. When the store is full,
+                the least recently used result is removed.
+        """
+        self.memo_store = MemoStore(path, max_entries)
+
+    def memoize(
+        self, ttl: float, refresh_ahead: float = 0.0, per_site: bool = False
+    ) -> Callable[
+        [Callable[..., Awaitable[Union[ContinueSession, EndSession, None]]]],
+        Callable[..., Awaitable[Union[ContinueSession, EndSession, None]]],
+    ]:
+        """Apply this decorator to an intent handler with expensive and stable results.
+
+        The result of the function is memoized by function, intent name and slots,
+        where slot values that are strings are compared case-insensitively. While the
+        result hasn't expired, the function isn't called for the same intent and slots.
+        With ``refresh_ahead``, a result that is used shortly before it expires is
+        recomputed in the background.
+
+        The results are kept in :attr:`memo_store`, which keeps them across restarts
+        if it has a database file, see :meth:`enable_memo`. Only
+        :class:`EndSession` and :class:`ContinueSession` results are memoized, so
+        streaming handlers that are async generators can't be memoized.
+
+        Arguments:
+            ttl: The time to live of a result in seconds.
+            refresh_ahead: The time in seconds before a result expires in which using
+                it recomputes it in the background.
+            per_site: Whether results are memoized for each site separately.
+
+        Raises:
+            TypeError: The decorated function is an async generator.
+
+        Example:
+
+        .. code-block:: python
+
+            app.enable_memo("memo.db")
+
+            @app.on_intent("GetSchedule")
+            @app.memoize(ttl=3600, refresh_ahead=300)
+            async def get_schedule(intent: NluIntent):
+                return EndSession(await calendar.summary())
+        """
+
+        def wrapper(
+            function: Callable[..., Awaitable[Union[ContinueSession, EndSession, None]]]
+        ) -> Callable[..., Awaitable[Union[ContinueSession, EndSession, None]]]:
+            if inspect.isasyncgenfunction(function):
+                raise TypeError(f"Can't memoize async generator {function.__name__}")
+
+            name = f"{function.__module__}.{function.__qualname__}"
+
+            async def compute(
+                intent: NluIntent, *args: Any
+            ) -> Optional[Dict[str, Any]]:
+                return _encode_result(await function(intent, *args))
+
+            async def memoized(
+                intent: NluIntent, *args: Any
+            ) -> Union[ContinueSession, EndSession, None]:
+                store = self._get_memo_store()
+                key = _memo_key(name, intent, per_site)
+                entry = store.get(key)
+                if entry is None:
+                    message = await function(intent, *args)
+                    value = _encode_result(message)
+                    if value is not None:
+                        store.set(key, value, ttl)
+                    return message
+
+                if entry.expires - time.time() < refresh_ahead:
+                    store.refresh(key, lambda: compute(intent, *args), ttl)
+
+                return _decode_result(entry.value)
+
+            return memoized
+
+        return wrapper
+
+    def _get_memo_store(self) -> MemoStore:
+        if self.memo_store is None:
+            self.memo_store = MemoStore()
+
+        return self.memo_store
+
     def notify(self, text: str, site_id: str = "default"):
         """Send a dialogue notification.
 
@@ -627,6 +3064,44 @@ class HermesApp(HermesClient):
         Arguments:
             text: The text to say.
             site_id: The ID of the site where the text should be said.
+
+        If notifications are coalesced with :meth:`coalesce_notifications`, the same text
+        to the same site is only said once within the time window.
         """
+        if self.notification_coalescer is not None:
+            self.notification_coalescer.add(site_id, text, self._publish_notification)
+        else:
+            self._publish_notification(site_id, text)
+
+    def _publish_notification(self, site_id: str, text: str) -> None:
         notification = DialogueNotification(text)
         self.publish(DialogueStartSession(init=notification, site_id=site_id))
+
+    def coalesce_notifications(
+        self, window: float = 0.5, concatenate: bool = False, separator: str = " "
+    ):
+        """Merge notifications with the same text to the same site.
+
+        When several rules of an automation notify a site of the same event, each
+        :meth:`notify` call would start a session that says the text again. With
+        coalescing, the first notification is sent right away and identical ones within
+        ``window`` seconds are dropped. With ``concatenate``, different texts for a site
+        within the window are said in one session, after the window has ended.
+
+        The numbers of sent, merged and joined notifications are counted in
+        :attr:`notification_coalescer`.
+
+        Arguments:
+            window: The time window in seconds.
+            concatenate: Whether different texts for a site are joined.
+            separator: The text between joined texts.
+
+        Example:
+
+        .. code-block:: python
+
+            app.coalesce_notifications(window=1.0)
+        """
+        self.notification_coalescer = NotificationCoalescer(
+            window, concatenate, separator
+        )
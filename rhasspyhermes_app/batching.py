@@ -0,0 +1,115 @@
+"""Batching of raw MQTT messages for high-rate topics."""
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from . import TopicData
+
+# A message of a batch: its topic data and payload
+BatchItem = Tuple["TopicData", bytes]
+
+BatchHandler = Callable[[List[BatchItem]], Awaitable[None]]
+
+_LOGGER = logging.getLogger("HermesApp")
+
+
+class TopicBatch:
+    """Collects the messages of a topic handler and passes them on in batches.
+
+    A batch is passed to the handler when it has ``max_size`` messages or when its
+    first message has waited ``max_wait`` seconds. With ``conflate``, a batch only
+    keeps the latest message of each topic, in the order in which the topics first
+    appeared in the batch.
+
+    Exceptions of the handler are logged, because a batch that has waited is passed
+    on in a task of its own.
+
+    Attributes:
+        max_size: The maximum number of messages in a batch.
+        max_wait: The longest time in seconds that a message waits for its batch.
+        conflate: Whether a batch only keeps the latest message of each topic.
+        batches: The number of batches passed to the handler.
+        messages: The number of messages added to a batch.
+        conflated: The number of messages replaced by a later message of the same topic.
+    """
+
+    def __init__(
+        self,
+        handler: BatchHandler,
+        max_size: int = 100,
+        max_wait: float = 0.01,
+        conflate: bool = False,
+        track: Optional[Callable[[Awaitable[None]], None]] = None,
+    ):
+        """Initialize an empty batch.
+
+        Arguments:
+            handler: The coroutine function that is called with a list of the messages.
+            max_size: The maximum number of messages in a batch.
+            max_wait: The longest time in seconds that a message waits for its batch.
+            conflate: Whether a batch only keeps the latest message of each topic.
+            track: A function that runs the handler in a task when a batch is passed
+                on after waiting. By default, the task is created with
+                :func:`asyncio.ensure_future`.
+        """
+        if max_size < 1:
+            raise ValueError("A batch needs room for at least one message")
+
+        self.handler = handler
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.conflate = conflate
+
+        self.batches = 0
+        self.messages = 0
+        self.conflated = 0
+
+        self._track = track or asyncio.ensure_future
+        self._items: List[BatchItem] = []
+        self._conflated_items: Dict[str, BatchItem] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self) -> int:
+        return len(self._conflated_items) if self.conflate else len(self._items)
+
+    async def add(self, data: "TopicData", payload: bytes) -> None:
+        """Add a message, and pass the batch to the handler if it's full."""
+        self.messages += 1
+        if self.conflate:
+            if data.topic in self._conflated_items:
+                self.conflated += 1
+            self._conflated_items[data.topic] = (data, payload)
+        else:
+            self._items.append((data, payload))
+
+        if len(self) >= self.max_size:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_wait, self._flush_later
+            )
+
+    def _flush_later(self) -> None:
+        self._timer = None
+        self._track(self.flush())
+
+    async def flush(self) -> None:
+        """Pass the messages collected so far to the handler."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self.conflate:
+            items = list(self._conflated_items.values())
+            self._conflated_items = {}
+        else:
+            items = self._items
+            self._items = []
+
+        if items:
+            self.batches += 1
+            try:
+                await self.handler(items)
+            except Exception:
+                _LOGGER.exception("Handling a batch of %s message(s)", len(items))
@@ -0,0 +1,212 @@
+"""Connections to additional MQTT brokers."""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Set, Union
+
+import paho.mqtt.client as mqtt
+
+from .decoding import payload_session_id, payload_site_id
+
+_LOGGER = logging.getLogger("HermesApp")
+
+
+def _json_bytes(payload: Union[str, bytes]) -> Optional[bytes]:
+    """Get a payload as bytes if it's a JSON object."""
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+
+    return payload if payload[:1] == b"{" else None
+
+
+class BrokerConnection:
+    """A connection to an additional MQTT broker.
+
+    The connection runs in its own network thread of the MQTT client, which
+    reconnects with an exponential backoff between ``min_backoff`` and ``max_backoff``
+    seconds when the broker is unreachable. The MQTT keepalive detects a broker that
+    stops responding.
+
+    Attributes:
+        name: The name of the broker.
+        host: The host name of the broker.
+        port: The port of the broker.
+        is_connected: Whether the connection is up.
+        connects: The number of times the connection has been set up.
+        disconnects: The number of times the connection was lost.
+        last_message: The monotonic time when the last message was received, or ``None``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        client: mqtt.Client,
+        host: str,
+        port: int = 1883,
+        keepalive: int = 60,
+        min_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        """Initialize the connection without connecting.
+
+        Arguments:
+            name: The name of the broker.
+            client: The MQTT client of the connection.
+            host: The host name of the broker.
+            port: The port of the broker.
+            keepalive: The time in seconds between pings to check the connection.
+            min_backoff: The shortest time in seconds between reconnects.
+            max_backoff: The longest time in seconds between reconnects.
+        """
+        self.name = name
+        self.client = client
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+
+        self.is_connected = False
+        self.connects = 0
+        self.disconnects = 0
+        self.last_message: Optional[float] = None
+
+        self.on_message: Optional[
+            Callable[["BrokerConnection", mqtt.MQTTMessage], None]
+        ] = None
+
+        self._topics: Set[str] = set()
+        self._lock = threading.Lock()
+
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        client.reconnect_delay_set(min_backoff, max_backoff)
+
+    def start(self) -> None:
+        """Connect to the broker in the background."""
+        _LOGGER.debug(
+            "Connecting to broker %s at %s:%s", self.name, self.host, self.port
+        )
+        self.client.connect_async(self.host, self.port, self.keepalive)
+        self.client.loop_start()
+
+    def stop(self) -> None:
+        """Disconnect from the broker."""
+        self.client.disconnect()
+        self.client.loop_stop()
+        self.is_connected = False
+
+    def subscribe(self, topics: Iterable[str]) -> None:
+        """Subscribe to topics, now or when the connection is up."""
+        with self._lock:
+            new_topics = sorted(set(topics) - self._topics)
+            self._topics.update(new_topics)
+            if new_topics and self.is_connected:
+                self.client.subscribe([(topic, 0) for topic in new_topics])
+
+    def unsubscribe(self, topics: Iterable[str]) -> None:
+        """Unsubscribe from topics."""
+        with self._lock:
+            old_topics = sorted(self._topics.intersection(topics))
+            self._topics.difference_update(old_topics)
+            if old_topics and self.is_connected:
+                self.client.unsubscribe(old_topics)
+
+    def publish(self, topic: str, payload: Union[str, bytes]) -> mqtt.MQTTMessageInfo:
+        """Publish a message to the broker."""
+        return self.client.publish(topic, payload)
+
+    def _on_connect(self, _client, _userdata, _flags, rc) -> None:
+        if rc != mqtt.CONNACK_ACCEPTED:
+            _LOGGER.warning("Broker %s refused the connection: %s", self.name, rc)
+            return
+
+        with self._lock:
+            self.is_connected = True
+            self.connects += 1
+            if self._topics:
+                self.client.subscribe([(topic, 0) for topic in sorted(self._topics)])
+
+        _LOGGER.debug("Connected to broker %s", self.name)
+
+    def _on_disconnect(self, _client, _userdata, rc) -> None:
+        self.is_connected = False
+        if rc != mqtt.MQTT_ERR_SUCCESS:
+            # The network thread reconnects with backoff
+            self.disconnects += 1
+            _LOGGER.warning("Disconnected from broker %s, reconnecting", self.name)
+
+    def _on_message(self, _client, _userdata, message: mqtt.MQTTMessage) -> None:
+        self.last_message = time.monotonic()
+        if self.on_message is not None:
+            try:
+                self.on_message(self, message)
+            except Exception:
+                _LOGGER.exception("on_message of broker %s", self.name)
+
+
+class BrokerRouter:
+    """Routes published messages to the broker of their site or session.
+
+    A site is on the broker it was added with or, if it wasn't added, on the broker
+    that the app last received a message of the site from. A session is on the broker
+    that the app received its messages from, so replies with only a session ID go back
+    to the same broker. Messages of other sites and sessions go to the app's own broker.
+    """
+
+    def __init__(self, max_sessions: int = 1000):
+        """Initialize the router.
+
+        Arguments:
+            max_sessions: The maximum number of sessions to remember the broker of.
+        """
+        self.max_sessions = max_sessions
+        self.brokers: Dict[str, BrokerConnection] = {}
+        self.site_brokers: Dict[str, str] = {}
+
+        self._learned_sites: Dict[str, str] = {}
+        self._sessions: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def learn(self, broker: BrokerConnection, payload: Union[str, bytes]) -> None:
+        """Remember the broker of the site and session of a received message."""
+        json_payload = _json_bytes(payload)
+        if json_payload is None:
+            return
+
+        site_id = payload_site_id(json_payload)
+        session_id = payload_session_id(json_payload)
+        with self._lock:
+            if site_id is not None:
+                self._learned_sites[site_id] = broker.name
+
+            if session_id is not None:
+                self._sessions[session_id] = broker.name
+                self._sessions.move_to_end(session_id)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+
+    def route(self, payload: Union[str, bytes]) -> Optional[BrokerConnection]:
+        """Get the broker to publish a message to.
+
+        Returns:
+            The broker, or ``None`` for the app's own broker.
+        """
+        json_payload = _json_bytes(payload)
+        if json_payload is None:
+            return None
+
+        name = None
+        with self._lock:
+            session_id = payload_session_id(json_payload)
+            if session_id is not None:
+                name = self._sessions.get(session_id)
+
+            if name is None:
+                site_id = payload_site_id(json_payload)
+                if site_id is not None:
+                    name = self.site_brokers.get(site_id) or self._learned_sites.get(
+                        site_id
+                    )
+
+        return self.brokers.get(name) if name is not None else None
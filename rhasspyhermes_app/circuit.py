@@ -0,0 +1,215 @@
+"""Circuit breakers for handlers that depend on a backend."""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Optional, TypeVar
+
+_LOGGER = logging.getLogger("HermesApp")
+
+# States of a circuit
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+ResultType = TypeVar("ResultType")
+
+
+class CircuitOpenError(Exception):
+    """A call was rejected because its circuit is open."""
+
+    def __init__(self, circuit: "CircuitBreaker"):
+        super().__init__(f"Circuit {circuit.name} is open")
+        self.circuit = circuit
+
+
+class CircuitBreaker:
+    """A circuit breaker that stops calling a backend that fails or is too slow.
+
+    The breaker keeps the outcome of the last ``window`` calls. A call fails if it
+    raises an exception, takes longer than ``timeout`` seconds, in which case it's
+    cancelled, or takes longer than ``slow_call_time`` seconds. When at least
+    ``min_calls`` outcomes are known and the rate of failed calls reaches
+    ``failure_rate``, the circuit opens and calls are rejected without waiting for the
+    backend.
+
+    After ``reset_timeout`` seconds, the circuit is half-open: one call is let
+    through as a probe while other calls are still rejected. If the probe succeeds,
+    the circuit closes, otherwise it opens again.
+
+    A circuit breaker can be shared by several handlers that depend on the same
+    backend, see :meth:`rhasspyhermes_app.HermesApp.circuit_breaker`.
+
+    Attributes:
+        name: The name of the circuit, used in log messages.
+        calls: The number of calls that were let through.
+        failures: The number of calls that failed.
+        rejected: The number of calls that were rejected while the circuit was open.
+        opened: The number of times the circuit opened.
+    """
+
+    def __init__(
+        self,
+        name: str = "circuit",
+        failure_rate: float = 0.5,
+        window: int = 20,
+        min_calls: int = 5,
+        timeout: Optional[float] = None,
+        slow_call_time: Optional[float] = None,
+        reset_timeout: float = 30.0,
+    ):
+        """Initialize a closed circuit.
+
+        Arguments:
+            name: The name of the circuit.
+            failure_rate: The rate of failed calls between 0 and 1 that opens the circuit.
+            window: The number of recent calls to compute the rate of failed calls of.
+            min_calls: The number of calls that are needed before the circuit can open.
+            timeout: The longest time in seconds that a call may take before it's
+                cancelled. By default, calls aren't cancelled.
+            slow_call_time: The time in seconds after which a call counts as failed,
+                even if it succeeds. By default, only exceptions and timeouts count.
+            reset_timeout: The time in seconds that the circuit stays open before it lets
+                a probe through.
+        """
+        if not 0 < failure_rate <= 1:
+            raise ValueError("The failure rate must be between 0 and 1")
+        if min_calls < 1 or window < min_calls:
+            raise ValueError("The window must hold at least min_calls calls")
+
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.timeout = timeout
+        self.slow_call_time = slow_call_time
+        self.reset_timeout = reset_timeout
+
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+
+        # Whether each recent call failed
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._window_failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    def state(self, now: Optional[float] = None) -> str:
+        """Get the state of the circuit: ``"closed"``, ``"open"`` or ``"half_open"``.
+
+        Arguments:
+            now: The current monotonic time in seconds.
+        """
+        if self._opened_at is None:
+            return CLOSED
+
+        if now is None:
+            now = time.monotonic()
+
+        return HALF_OPEN if now - self._opened_at >= self.reset_timeout else OPEN
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """Check whether a call may go through, and count it.
+
+        In the half-open state, only the first call is allowed until its outcome is
+        recorded with :meth:`record`.
+
+        Arguments:
+            now: The current monotonic time in seconds.
+        """
+        state = self.state(now)
+        if state == OPEN or (state == HALF_OPEN and self._probing):
+            self.rejected += 1
+            return False
+
+        if state == HALF_OPEN:
+            _LOGGER.debug("Circuit %s is half-open, probing", self.name)
+            self._probing = True
+
+        self.calls += 1
+        return True
+
+    def record(
+        self, success: bool, duration: float = 0.0, now: Optional[float] = None
+    ) -> None:
+        """Record the outcome of a call that was allowed.
+
+        Arguments:
+            success: Whether the call succeeded.
+            duration: The time in seconds that the call took.
+            now: The current monotonic time in seconds.
+        """
+        if self.slow_call_time is not None and duration > self.slow_call_time:
+            success = False
+        if not success:
+            self.failures += 1
+
+        if self._probing:
+            self._probing = False
+            if success:
+                _LOGGER.info("Circuit %s is closed again", self.name)
+                self._opened_at = None
+                self._outcomes.clear()
+                self._window_failures = 0
+            else:
+                self._open(now)
+            return
+
+        if self._opened_at is not None:
+            # A call that was let through before the circuit opened
+            return
+
+        outcomes = self._outcomes
+        if len(outcomes) == outcomes.maxlen and outcomes[0]:
+            self._window_failures -= 1
+        outcomes.append(not success)
+        self._window_failures += not success
+
+        if len(
+            outcomes
+        ) >= self.min_calls and self._window_failures >= self.failure_rate * len(
+            outcomes
+        ):
+            self._open(now)
+
+    def _open(self, now: Optional[float]) -> None:
+        self._opened_at = time.monotonic() if now is None else now
+        self.opened += 1
+        _LOGGER.warning(
+            "Circuit %s is open for %s second(s)", self.name, self.reset_timeout
+        )
+
+    async def call(
+        self, function: Callable[..., Awaitable[ResultType]], *args: Any
+    ) -> ResultType:
+        """Call a coroutine function through the circuit.
+
+        Arguments:
+            function: The coroutine function.
+            args: The arguments of the function.
+
+        Raises:
+            CircuitOpenError: The circuit is open.
+            asyncio.TimeoutError: The call took longer than the timeout.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self)
+
+        start_time = time.monotonic()
+        try:
+            if self.timeout is None:
+                result = await function(*args)
+            else:
+                result = await asyncio.wait_for(function(*args), self.timeout)
+        except asyncio.CancelledError:
+            # The app is stopping, which says nothing about the backend
+            self._probing = False
+            raise
+        except Exception:
+            self.record(False, time.monotonic() - start_time)
+            raise
+
+        self.record(True, time.monotonic() - start_time)
+
+        return result
@@ -0,0 +1,126 @@
+"""Coalescing of dialogue notifications."""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Called with the site ID and the text of a notification to start its session
+PublishNotification = Callable[[str, str], None]
+
+
+class NotificationCoalescer:
+    """Merges notifications with the same text to the same site within a time window.
+
+    Automations often notify a site of the same event several times within
+    milliseconds. The first notification is sent right away and the identical ones
+    that follow within ``window`` seconds are dropped, so the user hears it once and
+    the TTS system synthesizes it once.
+
+    With ``concatenate``, different texts for the same site within the window are
+    joined into one notification. The first notification then waits for the window to
+    end before it's sent.
+
+    Attributes:
+        window: The time window in seconds.
+        concatenate: Whether different texts for a site are joined.
+        separator: The text between joined texts.
+        sent: The number of notifications that were sent.
+        merged: The number of identical notifications that were dropped.
+        concatenated: The number of notifications that were joined to an earlier one.
+    """
+
+    def __init__(
+        self, window: float = 0.5, concatenate: bool = False, separator: str = " "
+    ):
+        """Initialize the coalescer.
+
+        Arguments:
+            window: The time window in seconds.
+            concatenate: Whether different texts for a site are joined.
+            separator: The text between joined texts.
+        """
+        self.window = window
+        self.concatenate = concatenate
+        self.separator = separator
+
+        self.sent = 0
+        self.merged = 0
+        self.concatenated = 0
+
+        # Time of the notifications within the window by site ID and text, oldest first
+        self._recent: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+
+        # Texts waiting to be joined and the timer that sends them, by site ID
+        self._pending: Dict[str, List[str]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+
+    def add(
+        self,
+        site_id: str,
+        text: str,
+        publish: PublishNotification,
+        now: Optional[float] = None,
+    ) -> bool:
+        """Add a notification.
+
+        Arguments:
+            site_id: The ID of the site.
+            text: The text of the notification.
+            publish: The function that sends a notification.
+            now: The current monotonic time in seconds.
+
+        Returns:
+            ``False`` if the notification was dropped as a duplicate.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        recent = self._recent
+        while recent and next(iter(recent.values())) <= now - self.window:
+            recent.popitem(last=False)
+
+        key = (site_id, text)
+        if key in recent:
+            self.merged += 1
+            return False
+        recent[key] = now
+
+        if not self.concatenate:
+            self._send(publish, site_id, [text])
+            return True
+
+        texts = self._pending.get(site_id)
+        if texts is not None:
+            texts.append(text)
+            self.concatenated += 1
+            return True
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Without an event loop, the texts can't be sent later
+            self._send(publish, site_id, [text])
+            return True
+
+        self._pending[site_id] = [text]
+        self._timers[site_id] = loop.call_later(
+            self.window, self._flush_site, site_id, publish
+        )
+
+        return True
+
+    def flush(self, publish: PublishNotification) -> None:
+        """Send the texts that are waiting to be joined right away."""
+        for site_id in list(self._pending):
+            self._timers[site_id].cancel()
+            self._flush_site(site_id, publish)
+
+    def _flush_site(self, site_id: str, publish: PublishNotification) -> None:
+        self._timers.pop(site_id, None)
+        texts = self._pending.pop(site_id, None)
+        if texts:
+            self._send(publish, site_id, texts)
+
+    def _send(self, publish: PublishNotification, site_id: str, texts: List[str]):
+        self.sent += 1
+        publish(site_id, self.separator.join(texts))
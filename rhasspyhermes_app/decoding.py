@@ -0,0 +1,116 @@
+"""Fast decoding of flat Hermes messages."""
+import dataclasses
+import json
+import re
+from typing import Any, Callable, List, Optional, Pattern, Tuple, Type, TypeVar, Union
+
+from rhasspyhermes.base import Message
+
+MessageType = TypeVar("MessageType", bound=Message)
+
+# Field types that JSON decodes to without conversion
+_PLAIN_TYPES = (str, int, float, bool, dict, Any)
+
+_NONE_TYPE = type(None)
+
+# The site and session ID of a Hermes message, found without decoding the JSON payload
+_SITE_ID = re.compile(rb'"siteId"\s*:\s*"([^"]*)"')
+_SESSION_ID = re.compile(rb'"sessionId"\s*:\s*"([^"]*)"')
+
+# A session or request ID that isn't empty
+_MESSAGE_ID = re.compile(rb'"(?:sessionId|id)"\s*:\s*"[^"]')
+
+
+def _find_string(pattern: Pattern[bytes], payload: bytes) -> Optional[str]:
+    match = pattern.search(payload)
+    return match.group(1).decode("utf-8", "replace") if match is not None else None
+
+
+def payload_site_id(payload: bytes) -> Optional[str]:
+    """Get the site ID of a JSON payload without decoding the JSON.
+
+    Bytes of the site ID that aren't valid UTF-8 are replaced, so a malformed payload
+    doesn't raise an exception.
+
+    Returns:
+        The site ID, or ``None`` if the payload doesn't have one.
+    """
+    return _find_string(_SITE_ID, payload)
+
+
+def payload_session_id(payload: bytes) -> Optional[str]:
+    """Get the session ID of a JSON payload without decoding the JSON.
+
+    Bytes of the session ID that aren't valid UTF-8 are replaced, so a malformed
+    payload doesn't raise an exception.
+
+    Returns:
+        The session ID, or ``None`` if the payload doesn't have one.
+    """
+    return _find_string(_SESSION_ID, payload)
+
+
+def has_message_id(payload: bytes) -> bool:
+    """Check whether a JSON payload has a session or request ID that isn't empty."""
+    return _MESSAGE_ID.search(payload) is not None
+
+
+def _is_plain(field_type: Any) -> bool:
+    """Check whether a field type needs no conversion from JSON."""
+    origin = getattr(field_type, "__origin__", None)
+    if origin is Union:
+        return all(arg is _NONE_TYPE or _is_plain(arg) for arg in field_type.__args__)
+
+    return field_type in _PLAIN_TYPES or origin is dict
+
+
+def _camel_case(name: str) -> str:
+    first, *rest = name.split("_")
+    return first + "".join(word.title() for word in rest)
+
+
+def message_decoder(
+    message_type: Type[MessageType],
+) -> Callable[[Union[str, bytes]], MessageType]:
+    """Get a fast decoder of JSON payloads for a type of Hermes message.
+
+    The :meth:`from_json` method of Hermes messages converts each field through a
+    schema, which takes a few hundred microseconds and allocates many temporary
+    objects. Messages whose fields are strings, numbers, booleans and dictionaries,
+    such as :class:`rhasspyhermes.wake.HotwordDetected`, don't need conversion, so their
+    decoder passes the decoded JSON values to the constructor. Other messages are
+    decoded with :meth:`from_json`.
+
+    Arguments:
+        message_type: The class of the messages.
+
+    Raises:
+        KeyError: The payload misses a required field.
+    """
+    fields = dataclasses.fields(message_type)
+    if not all(_is_plain(field.type) for field in fields):
+        return message_type.from_json  # type: ignore
+
+    # JSON key, field name and whether the field is required
+    keys: List[Tuple[str, str, bool]] = [
+        (
+            _camel_case(field.name),
+            field.name,
+            field.default is dataclasses.MISSING
+            and field.default_factory is dataclasses.MISSING,  # type: ignore
+        )
+        for field in fields
+        if field.init
+    ]
+
+    def decode(payload: Union[str, bytes]) -> MessageType:
+        values = json.loads(payload)
+        kwargs = {}
+        for key, name, required in keys:
+            value: Optional[Any] = values[key] if required else values.get(key)
+            if value is not None or required:
+                kwargs[name] = value
+
+        return message_type(**kwargs)  # type: ignore
+
+    return decode
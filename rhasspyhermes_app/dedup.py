@@ -0,0 +1,121 @@
+"""Suppression of duplicate MQTT messages."""
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import paho.mqtt.client as mqtt
+
+from .decoding import has_message_id
+
+# Topic filters of the dialogue messages that the app deduplicates by default
+DEDUPLICATED_TOPICS = (
+    "hermes/intent/#",
+    "hermes/nlu/intentNotRecognized",
+    "hermes/dialogueManager/#",
+    "hermes/hotword/+/detected",
+    "hermes/asr/textCaptured",
+    "hermes/tts/sayFinished",
+)
+
+
+class DuplicateFilter:
+    """Remembers recently received messages to detect duplicates.
+
+    A message is a duplicate if a message with the same topic and payload has been
+    received less than ``window`` seconds ago. The payload of a Hermes message
+    contains its session ID or request ID, so different requests don't collide.
+
+    Messages that are legitimately identical, such as sensor readings that didn't
+    change, must not be deduplicated. With ``topic_filters``, only the messages on
+    matching topics whose payload has a session or request ID are checked.
+
+    The filter remembers the hashes of the last ``capacity`` messages in a ring
+    buffer, so its memory is bounded and each check takes constant time.
+
+    Attributes:
+        hits: The number of duplicates detected.
+        misses: The number of messages that weren't duplicates.
+    """
+
+    def __init__(
+        self,
+        window: float = 2.0,
+        capacity: int = 1024,
+        topic_filters: Optional[Iterable[str]] = None,
+    ):
+        """Initialize the filter.
+
+        Arguments:
+            window: The time in seconds in which a message with the same topic and
+                payload is a duplicate.
+            capacity: The maximum number of messages to remember.
+            topic_filters: The MQTT topic filters of the messages to check. By default,
+                all messages are checked.
+        """
+        self.window = window
+        self.capacity = capacity
+        self.topic_filters: Optional[Tuple[str, ...]] = (
+            tuple(topic_filters) if topic_filters is not None else None
+        )
+        self.hits = 0
+        self.misses = 0
+
+        self._keys: List[Optional[int]] = [None] * capacity
+        self._times = array("d", bytes(8 * capacity))
+        self._position = 0
+
+        # Receive time of each remembered message
+        self._seen: Dict[int, float] = {}
+
+        # Whether the messages on each topic received so far are checked
+        self._checked_topics: Dict[str, bool] = {}
+
+    def is_duplicate(self, topic: str, payload: Union[str, bytes]) -> bool:
+        """Check whether a message is a duplicate and remember it.
+
+        Arguments:
+            topic: The topic of the message.
+            payload: The payload of the message.
+        """
+        if self.topic_filters is not None and not self._is_checked(topic, payload):
+            return False
+
+        key = hash((topic, payload))
+        now = time.monotonic()
+
+        seen = self._seen.get(key)
+        if seen is not None and now - seen <= self.window:
+            self.hits += 1
+            return True
+
+        self.misses += 1
+
+        # Forget the oldest message, unless it has been received again since
+        position = self._position
+        oldest = self._keys[position]
+        if oldest is not None and self._seen.get(oldest) == self._times[position]:
+            del self._seen[oldest]
+
+        self._keys[position] = key
+        self._times[position] = now
+        self._seen[key] = now
+        self._position = (position + 1) % self.capacity
+
+        return False
+
+    def _is_checked(self, topic: str, payload: Union[str, bytes]) -> bool:
+        checked = self._checked_topics.get(topic)
+        if checked is None:
+            assert self.topic_filters is not None
+            checked = any(
+                mqtt.topic_matches_sub(topic_filter, topic)
+                for topic_filter in self.topic_filters
+            )
+            if len(self._checked_topics) >= 10000:
+                self._checked_topics.clear()
+            self._checked_topics[topic] = checked
+
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+
+        return checked and has_message_id(payload)
@@ -0,0 +1,295 @@
+"""Multi-turn dialogues as state machines."""
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from rhasspyhermes.dialogue import DialogueIntentNotRecognized, DialogueSessionEnded
+from rhasspyhermes.nlu import NluIntent
+
+from . import ContinueSession, EndSession, HermesApp, TopicData
+
+_LOGGER = logging.getLogger("HermesApp")
+
+FlowHandler = Callable[
+    [NluIntent, "FlowSession"],
+    Awaitable[Union[ContinueSession, EndSession, None]],
+]
+
+
+@dataclass
+class FlowState:
+    """A state of a dialogue flow.
+
+    Attributes:
+        name: The name of the state.
+        prompt: The text to say when a transition to the state doesn't return a response.
+        reprompt: The text to say when the user's answer isn't recognized in the state.
+            If it's set, the dialogue manager sends not recognized intents to the app.
+    """
+
+    name: str
+    prompt: Optional[str] = None
+    reprompt: Optional[str] = None
+
+
+@dataclass
+class FlowSession:
+    """The state of a session in a dialogue flow.
+
+    Attributes:
+        session_id: The ID of the dialogue session.
+        site_id: The ID of the site of the session.
+        state: The name of the current state.
+        data: Data that the handlers keep during the session.
+    """
+
+    session_id: str
+    site_id: str
+    state: str
+    data: Dict[str, Any] = field(default_factory=dict)
+    entered: float = field(default=0.0, repr=False)
+
+
+@dataclass
+class StateTiming:
+    """Timings of a state of a dialogue flow.
+
+    Attributes:
+        count: The number of turns in the state.
+        wait_time: The total time in seconds between entering the state and receiving
+            the user's answer, which includes speaking and recognizing it.
+        max_wait_time: The longest of these times.
+        handler_time: The total time in seconds of the handlers in the state.
+        max_handler_time: The longest time of a handler in the state.
+    """
+
+    count: int = 0
+    wait_time: float = 0.0
+    max_wait_time: float = 0.0
+    handler_time: float = 0.0
+    max_handler_time: float = 0.0
+
+    @property
+    def mean_wait_time(self) -> float:
+        """The mean time in seconds to receive the user's answer."""
+        return self.wait_time / self.count if self.count else 0.0
+
+    @property
+    def mean_handler_time(self) -> float:
+        """The mean time in seconds of the handlers."""
+        return self.handler_time / self.count if self.count else 0.0
+
+
+class DialogueFlow:
+    """A multi-turn dialogue defined by states and transitions.
+
+    Each transition is a handler for an intent in a state, and leads to a next state.
+    The transitions are kept in a table by state and intent name, so each turn of a
+    session is routed with one lookup. When a handler continues the session, the flow
+    restricts the dialogue manager to the intents of the next state, so the state of
+    the session doesn't have to be kept in the handlers or the session's custom data.
+
+    A session enters the flow with an intent of the initial state and leaves it when a
+    handler ends the session or the dialogue manager reports that it ended.
+
+    Example:
+
+    .. code-block:: python
+
+        flow = app.dialogue_flow("start")
+        flow.state("ask_time", prompt="For what time?", reprompt="Please say a time.")
+
+        @flow.on("start", "BookTable", next_state="ask_time")
+        async def book_table(intent: NluIntent, session: FlowSession):
+            session.data["people"] = intent.slots[0].value["value"]
+
+        @flow.on("ask_time", "GiveTime")
+        async def give_time(intent: NluIntent, session: FlowSession):
+            return EndSession(f"Booked a table for {session.data['people']}.")
+    """
+
+    def __init__(self, app: HermesApp, initial: str, max_sessions: int = 1000):
+        """Initialize the flow and register it with the app.
+
+        Arguments:
+            app: The app that receives the intents.
+            initial: The name of the state of a session that enters the flow.
+            max_sessions: The maximum number of sessions to keep the state of. If more
+                sessions are in the flow, the oldest one is forgotten.
+        """
+        self.app = app
+        self.initial = initial
+        self.max_sessions = max_sessions
+        self.states: Dict[str, FlowState] = {initial: FlowState(initial)}
+        self.timings: Dict[str, StateTiming] = {}
+
+        # Handler and next state by state and intent name
+        self._transitions: Dict[Tuple[str, str], Tuple[FlowHandler, str]] = {}
+        # Intent filter of each state, compiled from the transitions
+        self._intent_filters: Dict[str, List[str]] = {}
+        self._intent_names: Set[str] = set()
+        self._sessions: "OrderedDict[str, FlowSession]" = OrderedDict()
+
+        app.on_topic(DialogueSessionEnded.topic())(self._session_ended)
+        app.on_dialogue_intent_not_recognized(self._not_recognized)
+
+    def state(
+        self, name: str, prompt: Optional[str] = None, reprompt: Optional[str] = None
+    ) -> FlowState:
+        """Add a state or change its texts.
+
+        Arguments:
+            name: The name of the state.
+            prompt: The text to say when a transition to the state doesn't return a response.
+            reprompt: The text to say when the user's answer isn't recognized in the state.
+        """
+        flow_state = FlowState(name, prompt, reprompt)
+        self.states[name] = flow_state
+
+        return flow_state
+
+    def on(
+        self, state: str, *intent_names: str, next_state: Optional[str] = None
+    ) -> Callable[[FlowHandler], FlowHandler]:
+        """Apply this decorator to a function that handles intents in a state.
+
+        The decorated function has a :class:`rhasspyhermes.nlu.NluIntent` object and the
+        :class:`FlowSession` as arguments. It can return an :class:`rhasspyhermes_app.EndSession`
+        object to end the session, a :class:`rhasspyhermes_app.ContinueSession` object to
+        say a text or nothing to say the prompt of the next state.
+
+        Arguments:
+            state: The name of the state.
+            intent_names: The names of the intents that the function handles in the state.
+            next_state: The name of the state after the function. By default, the session
+                stays in the same state.
+        """
+
+        def wrapper(function: FlowHandler) -> FlowHandler:
+            for intent_name in intent_names:
+                self._transitions[(state, intent_name)] = (
+                    function,
+                    next_state or state,
+                )
+                if intent_name not in self._intent_names:
+                    self._intent_names.add(intent_name)
+                    self.app.add_intent_handler(self._dispatch, intent_name)
+
+            for name in (state, next_state):
+                if name is not None and name not in self.states:
+                    self.states[name] = FlowState(name)
+
+            self._intent_filters = {}
+
+            return function
+
+        return wrapper
+
+    def intent_filter(self, state: str) -> List[str]:
+        """Get the names of the intents that a state handles."""
+        intent_filter = self._intent_filters.get(state)
+        if intent_filter is None:
+            intent_filter = sorted(
+                intent_name
+                for transition_state, intent_name in self._transitions
+                if transition_state == state
+            )
+            self._intent_filters[state] = intent_filter
+
+        return intent_filter
+
+    def session(self, session_id: str) -> Optional[FlowSession]:
+        """Get the state of a session in the flow."""
+        return self._sessions.get(session_id)
+
+    def _continue(
+        self, session: FlowSession, message: ContinueSession
+    ) -> ContinueSession:
+        """Restrict a response to the intents of the session's state."""
+        flow_state = self.states[session.state]
+        session.entered = time.monotonic()
+
+        return replace(
+            message,
+            intent_filter=message.intent_filter or self.intent_filter(session.state),
+            send_intent_not_recognized=message.send_intent_not_recognized
+            or flow_state.reprompt is not None,
+        )
+
+    async def _dispatch(
+        self, intent: NluIntent
+    ) -> Union[ContinueSession, EndSession, None]:
+        session_id = intent.session_id
+        if session_id is None:
+            return None
+
+        session = self._sessions.get(session_id)
+        state = session.state if session is not None else self.initial
+        transition = self._transitions.get((state, intent.intent.intent_name))
+        if transition is None:
+            if session is None:
+                # Not an intent that starts the flow
+                return None
+
+            _LOGGER.debug(
+                "Intent %s not expected in state %s",
+                intent.intent.intent_name,
+                state,
+            )
+            return self._continue(
+                session, ContinueSession(text=self.states[state].reprompt)
+            )
+
+        start_time = time.monotonic()
+        if session is None:
+            session = FlowSession(session_id, intent.site_id, state, entered=start_time)
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+        function, next_state = transition
+        try:
+            message = await function(intent, session)
+        finally:
+            self._record(state, start_time - session.entered, start_time)
+
+        if isinstance(message, EndSession):
+            self._sessions.pop(session_id, None)
+            return message
+
+        session.state = next_state
+        if message is None:
+            message = ContinueSession(text=self.states[next_state].prompt)
+
+        return self._continue(session, message)
+
+    def _record(self, state: str, wait_time: float, start_time: float) -> None:
+        handler_time = time.monotonic() - start_time
+        timing = self.timings.get(state)
+        if timing is None:
+            timing = self.timings[state] = StateTiming()
+
+        timing.count += 1
+        timing.wait_time += wait_time
+        timing.max_wait_time = max(timing.max_wait_time, wait_time)
+        timing.handler_time += handler_time
+        timing.max_handler_time = max(timing.max_handler_time, handler_time)
+
+    async def _not_recognized(
+        self, intent_not_recognized: DialogueIntentNotRecognized
+    ) -> Optional[ContinueSession]:
+        session = self._sessions.get(intent_not_recognized.session_id or "")
+        if session is None:
+            return None
+
+        return self._continue(
+            session, ContinueSession(text=self.states[session.state].reprompt)
+        )
+
+    async def _session_ended(self, _data: TopicData, payload: bytes) -> None:
+        session_id = json.loads(payload).get("sessionId")
+        if self._sessions.pop(session_id, None) is not None:
+            _LOGGER.debug("Session %s left the flow", session_id)
@@ -0,0 +1,241 @@
+"""Persistent journal of messages to publish when the MQTT broker is unreachable."""
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import deque
+from typing import BinaryIO, Callable, Deque, Generator, Optional, Tuple, Union
+
+_LOGGER = logging.getLogger("HermesApp")
+
+# Expiry time, topic length and payload length of a record
+_HEADER = struct.Struct("<dII")
+
+_SEGMENT_SUFFIX = ".seg"
+
+
+class OutboundJournal:
+    """Append-only journal of MQTT messages, stored in segment files in a directory.
+
+    Messages are appended to the newest segment, which is closed when it reaches
+    ``segment_size`` bytes. Replaying reads the segments in order through a memory
+    map and deletes each segment once its messages have been published, so the
+    journal only takes memory for the segment being written. If the journal grows
+    beyond ``max_size`` bytes, its oldest segment is dropped.
+
+    Every message has an expiry time. Expired messages are dropped when replaying.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_size: int = 1024 * 1024,
+        max_size: int = 64 * 1024 * 1024,
+    ):
+        """Open the journal, keeping the messages from an earlier run.
+
+        Arguments:
+            directory: The directory for the segment files. It's created if it
+                doesn't exist.
+            segment_size: The size in bytes at which a new segment is started.
+            max_size: The maximum total size in bytes of the segments.
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_size = max_size
+        self.lock = threading.RLock()
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Segment numbers and sizes, oldest first
+        self._segments: Deque[Tuple[int, int]] = deque(
+            (int(name[: -len(_SEGMENT_SUFFIX)]), self._size(name))
+            for name in sorted(os.listdir(directory))
+            if name.endswith(_SEGMENT_SUFFIX)
+        )
+        self._writer: Optional[BinaryIO] = None
+
+    def _size(self, name: str) -> int:
+        return os.path.getsize(os.path.join(self.directory, name))
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:010d}{_SEGMENT_SUFFIX}")
+
+    def __bool__(self) -> bool:
+        """Check whether the journal has messages."""
+        with self.lock:
+            return bool(self._segments)
+
+    @property
+    def size(self) -> int:
+        """The total size in bytes of the segments."""
+        with self.lock:
+            return sum(size for _segment, size in self._segments)
+
+    def append(self, topic: str, payload: Union[str, bytes], ttl: float) -> None:
+        """Append a message to the journal.
+
+        Arguments:
+            topic: The MQTT topic of the message.
+            payload: The payload of the message.
+            ttl: The time in seconds after which the message expires.
+        """
+        topic_bytes = topic.encode("utf-8")
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+
+        record = (
+            _HEADER.pack(time.time() + ttl, len(topic_bytes), len(payload))
+            + topic_bytes
+            + payload
+        )
+
+        with self.lock:
+            if (
+                self._writer is None
+                or not self._segments
+                or self._segments[-1][1] >= self.segment_size
+            ):
+                self._start_segment()
+
+            assert self._writer is not None
+            self._writer.write(record)
+            self._writer.flush()
+
+            segment, size = self._segments.pop()
+            self._segments.append((segment, size + len(record)))
+
+            while len(self._segments) > 1 and self.size > self.max_size:
+                dropped, _size = self._segments.popleft()
+                os.remove(self._path(dropped))
+                _LOGGER.warning("Outbound journal is full, dropped %s", dropped)
+
+    def append_if_pending(
+        self, topic: str, payload: Union[str, bytes], ttl: float
+    ) -> bool:
+        """Append a message if the journal has messages that haven't been replayed.
+
+        This keeps the messages in order while the journal is being replayed.
+
+        Returns:
+            Whether the message was appended.
+        """
+        with self.lock:
+            if not self._segments:
+                return False
+
+            self.append(topic, payload, ttl)
+            return True
+
+    def _start_segment(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+        segment = self._segments[-1][0] + 1 if self._segments else 0
+        self._writer = open(  # pylint: disable=consider-using-with
+            self._path(segment), "ab"
+        )
+        self._segments.append((segment, 0))
+
+    def _records(
+        self, segment: int
+    ) -> Generator[Tuple[int, float, str, bytes], None, None]:
+        """Read the end offset, expiry time, topic and payload of each record."""
+        with open(self._path(segment), "rb") as segment_file:
+            if os.fstat(segment_file.fileno()).st_size == 0:
+                return
+
+            with mmap.mmap(
+                segment_file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as segment_map:
+                offset = 0
+                while offset + _HEADER.size <= len(segment_map):
+                    expires, topic_length, payload_length = _HEADER.unpack_from(
+                        segment_map, offset
+                    )
+                    start = offset + _HEADER.size
+                    end = start + topic_length + payload_length
+                    if end > len(segment_map):
+                        # Incomplete record of an interrupted write
+                        break
+
+                    topic = segment_map[start : start + topic_length].decode("utf-8")
+                    yield end, expires, topic, segment_map[start + topic_length : end]
+                    offset = end
+
+    def replay(self, publish: Callable[[str, bytes], bool]) -> int:
+        """Publish the messages in the journal in order and remove them.
+
+        Messages that are appended while replaying are replayed as well.
+
+        Arguments:
+            publish: A function that publishes a message with a topic and a payload
+                and returns whether it succeeded. If it fails, the message and the
+                ones after it are kept.
+
+        Returns:
+            The number of published messages.
+        """
+        published = 0
+        expired = 0
+        while True:
+            with self.lock:
+                if not self._segments:
+                    break
+
+                segment = self._segments[0][0]
+                if self._writer is not None and len(self._segments) == 1:
+                    # Start a new segment for messages appended while replaying
+                    self._writer.close()
+                    self._writer = None
+
+            now = time.time()
+            replayed = 0
+            records = self._records(segment)
+            try:
+                for offset, expires, topic, payload in records:
+                    if expires < now:
+                        expired += 1
+                    elif not publish(topic, payload):
+                        self._compact(segment, replayed)
+                        _LOGGER.debug(
+                            "Replayed %s message(s) before failure", published
+                        )
+                        return published
+                    else:
+                        published += 1
+
+                    replayed = offset
+            finally:
+                records.close()
+
+            with self.lock:
+                # The segment may have been dropped because the journal was full
+                if self._segments and self._segments[0][0] == segment:
+                    self._segments.popleft()
+                    os.remove(self._path(segment))
+
+        if published or expired:
+            _LOGGER.debug(
+                "Replayed %s message(s), dropped %s expired message(s)",
+                published,
+                expired,
+            )
+
+        return published
+
+    def _compact(self, segment: int, offset: int) -> None:
+        """Remove the records before an offset from a segment."""
+        path = self._path(segment)
+        with open(path, "rb") as segment_file:
+            segment_file.seek(offset)
+            remaining = segment_file.read()
+
+        with self.lock:
+            if self._segments and self._segments[0][0] == segment:
+                with open(path + ".tmp", "wb") as compacted_file:
+                    compacted_file.write(remaining)
+                os.replace(path + ".tmp", path)
+                self._segments[0] = (segment, len(remaining))
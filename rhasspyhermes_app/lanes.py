@@ -0,0 +1,122 @@
+"""Dispatch lanes that isolate bulk topics from dialogue messages."""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+import paho.mqtt.client as mqtt
+
+_LOGGER = logging.getLogger("HermesApp")
+
+
+class Lane:
+    """A queue of received messages with a fixed number of workers that handle them.
+
+    Messages in a lane don't compete with the other messages of the app for the event
+    loop: at most ``concurrency`` of them are handled at the same time, in the order in
+    which they were received. When the queue holds ``max_queue`` messages, the oldest
+    one is dropped to make room for a new one, so a burst of messages can't build up
+    an unbounded backlog.
+
+    Attributes:
+        name: The name of the lane.
+        topic_filters: The MQTT topic filters of the messages in the lane. Without topic
+            filters, the lane takes the raw topics that aren't in another lane.
+        concurrency: The number of messages that are handled at the same time.
+        max_queue: The maximum number of messages waiting in the queue.
+        handled: The number of handled messages.
+        dropped: The number of messages dropped because the queue was full.
+        max_wait: The longest time in seconds that a message waited in the queue.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        topic_filters: Tuple[str, ...] = (),
+        concurrency: int = 1,
+        max_queue: int = 1000,
+    ):
+        """Initialize the lane without starting its workers.
+
+        Arguments:
+            name: The name of the lane.
+            topic_filters: The MQTT topic filters of the messages in the lane.
+            concurrency: The number of messages that are handled at the same time.
+            max_queue: The maximum number of messages waiting in the queue.
+        """
+        if concurrency < 1 or max_queue < 1:
+            raise ValueError("A lane needs at least one worker and room in its queue")
+
+        self.name = name
+        self.topic_filters = topic_filters
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+
+        self.handled = 0
+        self.dropped = 0
+        self.max_wait = 0.0
+
+        self._queue: Optional["asyncio.Queue[Tuple[float, mqtt.MQTTMessage]]"] = None
+        self._workers: List["asyncio.Task[None]"] = []
+
+    def __len__(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def matches(self, topic: str) -> bool:
+        """Check whether a topic matches one of the lane's topic filters."""
+        return any(
+            mqtt.topic_matches_sub(topic_filter, topic)
+            for topic_filter in self.topic_filters
+        )
+
+    def start(self, handle: Callable[[mqtt.MQTTMessage], Awaitable[Any]]) -> None:
+        """Start the workers in the running event loop.
+
+        Arguments:
+            handle: The coroutine function that handles a message.
+        """
+        if self._workers:
+            return
+
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.max_queue)
+
+        self._workers = [
+            asyncio.ensure_future(self._work(handle)) for _ in range(self.concurrency)
+        ]
+
+    def put(self, mqtt_message: mqtt.MQTTMessage) -> None:
+        """Add a message to the queue, dropping the oldest message if it's full."""
+        assert self._queue is not None, "The lane hasn't been started"
+        if self._queue.full():
+            self._queue.get_nowait()
+            self._queue.task_done()
+            self.dropped += 1
+            _LOGGER.debug("Lane %s is full, dropped the oldest message", self.name)
+
+        self._queue.put_nowait((time.monotonic(), mqtt_message))
+
+    async def join(self) -> None:
+        """Wait until all messages in the queue have been handled."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        """Stop the workers. Messages that are still queued are kept."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _work(self, handle: Callable[[mqtt.MQTTMessage], Awaitable[Any]]):
+        assert self._queue is not None
+        while True:
+            received_time, mqtt_message = await self._queue.get()
+            self.max_wait = max(self.max_wait, time.monotonic() - received_time)
+            try:
+                await handle(mqtt_message)
+            except Exception:
+                _LOGGER.exception("Lane %s", self.name)
+            finally:
+                self.handled += 1
+                self._queue.task_done()
@@ -0,0 +1,128 @@
+"""Fallback matching of text that the NLU system didn't recognize."""
+import math
+import re
+from array import array
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+_WORD = re.compile(r"\w+")
+
+# Terms in fewer phrases are always indexed
+_MIN_INDEXED_PHRASES = 1000
+
+
+def _terms(text: str) -> Set[str]:
+    """Get the words and word pairs of a text."""
+    words = _WORD.findall(text.lower())
+    terms = set(words)
+    terms.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+
+    return terms
+
+
+class PhraseMatcher:
+    """Matches text against example phrases of intents.
+
+    The phrases are compiled once into an inverted index from each word and word pair
+    to the phrases containing it, weighted by how rare the term is. A match only looks
+    at the phrases sharing a term with the text, so its time depends on the length of
+    the text and the number of phrases per term, not on the size of the corpus.
+
+    Terms that occur in more than a fraction ``max_term_frequency`` of the phrases
+    of a large corpus, such as "the" or "what", hardly distinguish intents and would
+    make matching slow, so they are left out of the index. Terms in less than 1000
+    phrases are always indexed.
+    """
+
+    def __init__(
+        self,
+        phrases: Mapping[str, Iterable[str]],
+        max_term_frequency: float = 0.1,
+    ):
+        """Compile the phrases into an index.
+
+        Arguments:
+            phrases: Example phrases by intent name.
+            max_term_frequency: The maximum fraction of phrases that a term may occur in
+                to be indexed.
+        """
+        self.intent_names: List[str] = []
+        phrase_intents = array("I")
+        phrase_terms: List[Set[str]] = []
+        for intent_index, (intent_name, intent_phrases) in enumerate(phrases.items()):
+            self.intent_names.append(intent_name)
+            for phrase in intent_phrases:
+                phrase_intents.append(intent_index)
+                phrase_terms.append(_terms(phrase))
+
+        num_phrases = len(phrase_terms)
+        postings: Dict[str, array] = {}
+        for phrase_index, terms in enumerate(phrase_terms):
+            for term in terms:
+                postings.setdefault(term, array("I")).append(phrase_index)
+
+        max_phrases = max(_MIN_INDEXED_PHRASES, int(max_term_frequency * num_phrases))
+        # Squared weight and phrases of each term
+        self._postings: Dict[str, Tuple[float, array]] = {}
+        self._frequent_terms: Set[str] = set()
+        squared_norms = array("d", bytes(8 * num_phrases))
+        for term, term_phrases in postings.items():
+            if len(term_phrases) > max_phrases:
+                self._frequent_terms.add(term)
+                continue
+
+            weight = math.log((num_phrases + 1) / len(term_phrases))
+            squared_weight = weight * weight
+            self._postings[term] = (squared_weight, term_phrases)
+            for phrase_index in term_phrases:
+                squared_norms[phrase_index] += squared_weight
+
+        self._phrase_intents = phrase_intents
+        self._phrase_norms = array("d", (math.sqrt(norm) for norm in squared_norms))
+
+        # Squared weight of a word in a text that no phrase contains
+        self._unknown_weight = math.log(num_phrases + 1) ** 2
+
+    def __len__(self) -> int:
+        return len(self._phrase_intents)
+
+    def match(self, text: str) -> Optional[Tuple[str, float]]:
+        """Find the intent of the phrase that is most similar to the text.
+
+        Arguments:
+            text: The text to match.
+
+        Returns:
+            The intent name and the cosine similarity between 0 and 1 of the best
+            matching phrase, or ``None`` if no phrase shares a term with the text.
+        """
+        scores: Dict[int, float] = {}
+        squared_norm = 0.0
+        for term in _terms(text):
+            posting = self._postings.get(term)
+            if posting is None:
+                if term not in self._frequent_terms:
+                    # Words that no phrase contains make the match worse
+                    squared_norm += self._unknown_weight
+                continue
+
+            # Both the text and the phrase have the term's weight, so their
+            # dot product increases with the squared weight.
+            squared_weight, term_phrases = posting
+            squared_norm += squared_weight
+            get_score = scores.get
+            for phrase_index in term_phrases:
+                scores[phrase_index] = get_score(phrase_index, 0.0) + squared_weight
+
+        if not scores:
+            return None
+
+        phrase_norms = self._phrase_norms
+        best_index, best_score = max(
+            ((index, score / phrase_norms[index]) for index, score in scores.items()),
+            key=lambda item: item[1],
+        )
+
+        return (
+            self.intent_names[self._phrase_intents[best_index]],
+            min(1.0, best_score / math.sqrt(squared_norm)),
+        )
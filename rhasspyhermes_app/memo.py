@@ -0,0 +1,193 @@
+"""A persistent memo of handler results."""
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+_LOGGER = logging.getLogger("HermesApp")
+
+
+class MemoEntry(NamedTuple):
+    """A memoized value.
+
+    Attributes:
+        value: The value, which can be encoded to JSON.
+        expires: The time since the epoch in seconds when the value expires.
+    """
+
+    value: Any
+    expires: float
+
+
+class MemoStore:
+    """Values with a time to live, kept in memory and optionally in a database file.
+
+    The store keeps at most ``max_entries`` values. When it's full, the least recently
+    used value is removed. If the store has a database file, its values are written
+    to it and loaded again when the store is created, so they survive a restart.
+    The expiry times are wall-clock times for the same reason.
+
+    Values that will expire soon can be refreshed in the background with
+    :meth:`refresh`, so they're recomputed before anyone has to wait for them.
+
+    Attributes:
+        max_entries: The maximum number of values.
+        hits: The number of values found.
+        misses: The number of values not found or expired.
+        refreshes: The number of values refreshed in the background.
+        evictions: The number of values removed because the store was full.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 1000):
+        """Initialize the store and load its stored values.
+
+        Arguments:
+            path: The path of the SQLite database file to store the values in. If it's
+                not specified, the values are only kept in memory.
+            max_entries: The maximum number of values.
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+        # Values by key, least recently used first
+        self._entries: "OrderedDict[str, MemoEntry]" = OrderedDict()
+        self._refreshing: Dict[str, "asyncio.Future[None]"] = {}
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS memo (key TEXT PRIMARY KEY, value TEXT,"
+                " expires REAL, stored REAL)"
+            )
+            self._load()
+
+    def _load(self) -> None:
+        assert self._db is not None
+        with self._db:
+            self._db.execute("DELETE FROM memo WHERE expires <= ?", (time.time(),))
+
+        for key, value, expires in self._db.execute(
+            "SELECT key, value, expires FROM memo ORDER BY stored"
+        ):
+            self._entries[key] = MemoEntry(json.loads(value), expires)
+
+        self._evict()
+        _LOGGER.debug("Loaded %s memoized value(s)", len(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str, now: Optional[float] = None) -> Optional[MemoEntry]:
+        """Get a value that hasn't expired.
+
+        Arguments:
+            key: The key of the value.
+            now: The current time since the epoch in seconds.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires > (time.time() if now is None else now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+            self.delete(key)
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any, ttl: float, now: Optional[float] = None):
+        """Store a value.
+
+        Arguments:
+            key: The key of the value.
+            value: The value, which can be encoded to JSON.
+            ttl: The time to live of the value in seconds.
+            now: The current time since the epoch in seconds.
+        """
+        if now is None:
+            now = time.time()
+
+        entry = MemoEntry(value, now + ttl)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if self._db is not None:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO memo VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), entry.expires, now),
+                )
+
+        self._evict()
+
+    def delete(self, key: str) -> bool:
+        """Remove a value.
+
+        Returns:
+            Whether the store had the value.
+        """
+        if self._entries.pop(key, None) is None:
+            return False
+
+        if self._db is not None:
+            with self._db:
+                self._db.execute("DELETE FROM memo WHERE key = ?", (key,))
+
+        return True
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            key = next(iter(self._entries))
+            self.delete(key)
+            self.evictions += 1
+
+    def refresh(
+        self, key: str, compute: Callable[[], Awaitable[Any]], ttl: float
+    ) -> None:
+        """Recompute a value in a background task, unless it's already being refreshed.
+
+        If ``compute`` raises an exception, the old value is kept until it expires.
+
+        Arguments:
+            key: The key of the value.
+            compute: A coroutine function that computes the new value. If it returns
+                ``None``, the value isn't stored.
+            ttl: The time to live of the new value in seconds.
+        """
+        if key in self._refreshing:
+            return
+
+        async def run() -> None:
+            try:
+                value = await compute()
+                if value is not None:
+                    self.set(key, value, ttl)
+                    self.refreshes += 1
+            except Exception:
+                _LOGGER.exception("Refreshing memoized value %s", key)
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.ensure_future(run())
+
+    def close(self) -> None:
+        """Cancel the refreshes and close the database file."""
+        for task in self._refreshing.values():
+            task.cancel()
+        self._refreshing.clear()
+
+        if self._db is not None:
+            self._db.close()
+            self._db = None
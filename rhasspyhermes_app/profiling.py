@@ -0,0 +1,274 @@
+"""Profiling of running apps."""
+import asyncio
+import cProfile
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Awaitable, List, Optional, TypeVar
+
+_LOGGER = logging.getLogger("HermesApp")
+
+ResultType = TypeVar("ResultType")
+
+# Characters that aren't allowed in the names of profile files
+_UNSAFE_NAME = re.compile(r"[^\w.-]+")
+
+
+def _folded_stack(frame: Optional[FrameType], max_depth: int) -> str:
+    """Get a stack as the semicolon-separated functions from the outermost frame."""
+    functions: List[str] = []
+    while frame is not None and len(functions) < max_depth:
+        code = frame.f_code
+        functions.append(
+            f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        )
+        frame = frame.f_back
+
+    return ";".join(reversed(functions))
+
+
+class SamplingProfiler:
+    """A profiler that samples the stacks of all threads at a fixed interval.
+
+    The profiler runs in its own thread, so it sees the event loop as well as the
+    network threads of the MQTT clients and other worker threads. Taking a sample
+    only reads the current frame of each thread, so the overhead is low enough to
+    keep the profiler running in production.
+
+    The samples are counted by thread and stack in the folded format of
+    `FlameGraph <https://github.com/brendangregg/FlameGraph>`_, which is also read by
+    tools such as speedscope.
+
+    Attributes:
+        interval: The time in seconds between samples.
+        samples: The number of samples of each stack, such as
+            ``"MainThread;run (runners.py:86);..."``.
+    """
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 64):
+        """Initialize the profiler without starting it.
+
+        Arguments:
+            interval: The time in seconds between samples.
+            max_depth: The maximum number of frames of a stack.
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: "Counter[str]" = Counter()
+
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start sampling in a daemon thread."""
+        if self._thread is not None:
+            return
+
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="SamplingProfiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        if self._thread is None:
+            return
+
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def sample(self) -> None:
+        """Take a sample of the stacks of the other threads."""
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_id = threading.get_ident()
+        # pylint: disable=protected-access
+        stacks = [
+            f"{thread_names.get(thread_id, thread_id)};"
+            + _folded_stack(frame, self.max_depth)
+            for thread_id, frame in sys._current_frames().items()
+            if thread_id != own_id
+        ]
+
+        with self._lock:
+            self.samples.update(stacks)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def write(self, path: str) -> None:
+        """Write the samples in the folded format of FlameGraph.
+
+        Arguments:
+            path: The path of the file.
+        """
+        with self._lock:
+            samples = list(self.samples.items())
+
+        with open(path, "w", encoding="utf-8") as folded_file:
+            for stack, count in samples:
+                folded_file.write(f"{stack} {count}\n")
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop runs a callback.
+
+    A callback that doesn't return to the event loop for a while, such as a handler
+    calling a blocking function, delays all other handlers. The monitor schedules a
+    callback every ``interval`` seconds and measures how late it runs.
+
+    Attributes:
+        interval: The time in seconds between measurements.
+        threshold: The lag in seconds above which a warning is logged.
+        last_lag: The lag of the last measurement.
+        max_lag: The longest lag.
+        slow_count: The number of lags above the threshold.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1):
+        self.interval = interval
+        self.threshold = threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.slow_count = 0
+
+    async def run(self) -> None:
+        """Measure the lag until the task is cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            start_time = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(loop.time() - start_time - self.interval)
+
+    def record(self, lag: float) -> None:
+        """Record the lag of a measurement."""
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        if lag > self.threshold:
+            self.slow_count += 1
+            _LOGGER.warning("Event loop blocked for %.3f second(s)", lag)
+
+
+class Profiler:
+    """Profiling of a running app: stack samples, event loop lag and slow messages.
+
+    Files are written to a directory:
+
+    - ``stacks-<time>.folded``: the samples of the :class:`SamplingProfiler`, written
+      by :meth:`dump`;
+    - ``<time>-<topic>-<milliseconds>ms.prof``: a :mod:`cProfile` profile of the
+      handling of a message that took longer than ``slow_message_time`` seconds, which
+      can be read with :mod:`pstats` or snakeviz.
+
+    Attributes:
+        directory: The directory of the profiling files.
+        sampler: The sampling profiler.
+        lag_monitor: The monitor of the event loop lag.
+        slow_message_time: The time in seconds above which the profile of the handling
+            of a message is kept, or ``None`` to not profile messages.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        interval: float = 0.01,
+        lag_threshold: float = 0.1,
+        slow_message_time: Optional[float] = None,
+    ):
+        """Initialize the profiler without starting it.
+
+        Arguments:
+            directory: The directory of the profiling files.
+            interval: The time in seconds between stack samples.
+            lag_threshold: The event loop lag in seconds above which a warning is logged.
+            slow_message_time: The time in seconds above which the profile of the
+                handling of a message is kept.
+        """
+        self.directory = directory
+        self.sampler = SamplingProfiler(interval)
+        self.lag_monitor = LoopLagMonitor(threshold=lag_threshold)
+        self.slow_message_time = slow_message_time
+
+        self._lag_task: Optional["asyncio.Task[None]"] = None
+        self._profiling_message = False
+
+    def start(self) -> None:
+        """Start sampling and measuring the lag of the running event loop."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.sampler.start()
+        if self._lag_task is None:
+            self._lag_task = asyncio.ensure_future(self.lag_monitor.run())
+
+    def stop(self) -> None:
+        """Stop profiling."""
+        self.sampler.stop()
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+
+    def dump(self) -> str:
+        """Write the stack samples in the folded format of FlameGraph.
+
+        Returns:
+            The path of the file.
+        """
+        path = os.path.join(
+            self.directory, f"stacks-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+        )
+        self.sampler.write(path)
+        _LOGGER.info("Wrote stack samples to %s", path)
+
+        return path
+
+    async def profile_message(
+        self, topic: str, handling: Awaitable[ResultType]
+    ) -> ResultType:
+        """Profile the handling of a message and keep the profile if it's slow.
+
+        Only one message is profiled at a time. The profile includes the other tasks
+        that ran while the message was handled.
+
+        Arguments:
+            topic: The topic of the message.
+            handling: The coroutine handling the message.
+        """
+        if self.slow_message_time is None or self._profiling_message:
+            return await handling
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active, such as the one of a debugger
+            return await handling
+
+        self._profiling_message = True
+        start_time = time.perf_counter()
+        try:
+            return await handling
+        finally:
+            profile.disable()
+            self._profiling_message = False
+
+            duration = time.perf_counter() - start_time
+            if duration > self.slow_message_time:
+                name = _UNSAFE_NAME.sub("_", topic)
+                path = os.path.join(
+                    self.directory,
+                    f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{duration * 1000:.0f}ms.prof",
+                )
+                profile.dump_stats(path)
+                _LOGGER.warning(
+                    "Handling a message on %s took %.3f second(s), see %s",
+                    topic,
+                    duration,
+                    path,
+                )
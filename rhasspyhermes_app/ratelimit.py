@@ -0,0 +1,273 @@
+"""Rate limiting of received messages with token buckets."""
+import re
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, NamedTuple, Optional, Pattern, Tuple
+
+from .decoding import payload_site_id
+
+# Policies for messages over a rate limit
+DROP = "drop"
+DELAY = "delay"
+REPLY = "reply"
+_POLICIES = {DROP, DELAY, REPLY}
+
+# The key of a limit that applies to each site or intent separately
+ANY = "*"
+
+_INTENT_PREFIX = "hermes/intent/"
+
+
+@dataclass
+class RateLimit:
+    """A rate limit for messages.
+
+    Attributes:
+        rate: The number of messages per second.
+        burst: The number of messages that can be received at once after an idle time.
+        policy: What to do with a message over the limit: ``"drop"`` it, ``"delay"``
+            it until it's within the limit, or ``"reply"`` to an intent by ending its
+            session with the ``reply`` text.
+        max_delay: The longest time in seconds to delay a message. Messages that would
+            be delayed longer are dropped.
+        reply: The text to say when the policy is ``"reply"``.
+    """
+
+    rate: float
+    burst: float = 1.0
+    policy: str = DROP
+    max_delay: float = 5.0
+    reply: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        if self.rate <= 0 or self.burst < 1:
+            raise ValueError("The rate must be positive and the burst at least 1")
+        if self.policy not in _POLICIES:
+            raise ValueError(f"Unknown rate limit policy {self.policy!r}")
+
+
+class Throttle(NamedTuple):
+    """The decision for a message over a rate limit.
+
+    Attributes:
+        action: ``"drop"``, ``"delay"`` or ``"reply"``.
+        wait: The time in seconds to delay the message.
+        limit: The rate limit that the message is over.
+    """
+
+    action: str
+    wait: float
+    limit: RateLimit
+
+
+class _Bucket:
+    """The tokens of a key of a rate limit."""
+
+    __slots__ = ("tokens", "updated", "limit")
+
+    def __init__(self, tokens: float, updated: float, limit: RateLimit):
+        self.tokens = tokens
+        self.updated = updated
+        self.limit = limit
+
+    def tokens_at(self, now: float) -> float:
+        """Get the number of tokens after filling up the bucket."""
+        return min(
+            self.limit.burst, self.tokens + (now - self.updated) * self.limit.rate
+        )
+
+
+def _topic_pattern(topic_filter: str) -> Pattern[str]:
+    """Compile an MQTT topic filter with wildcards to a regular expression."""
+    parts = [
+        "[^/]*" if part == "+" else ".*" if part == "#" else re.escape(part)
+        for part in topic_filter.split("/")
+    ]
+    pattern = "/".join(parts)
+    if pattern.endswith("/.*"):
+        # "a/#" also matches "a"
+        pattern = pattern[: -len("/.*")] + "(/.*)?"
+
+    return re.compile(pattern + "$")
+
+
+def _is_intent_topic(topic: str) -> bool:
+    return topic.startswith(_INTENT_PREFIX)
+
+
+class RateLimiter:
+    """Token-bucket rate limits by site ID, intent name and topic filter.
+
+    Each key of a limit has a bucket of tokens that fills up at the limit's rate
+    up to its burst size. A message takes a token from the bucket of each limit that
+    applies to it. If a bucket has no token, the message is throttled.
+
+    A bucket takes constant memory: its number of tokens and the time it was last
+    updated. Buckets that have been idle long enough to be full again are the same
+    as new buckets, so they are removed.
+
+    The limits are checked before the payload is decoded. The intent name is taken
+    from the topic and the site ID is found with a regular expression in the payload.
+    Site limits only apply to messages with a site ID on the topics accepted by
+    ``site_topics``, so dialogue messages such as ``hermes/tts/sayFinished`` don't
+    take the tokens of the intents of their site.
+    """
+
+    def __init__(
+        self,
+        max_keys: int = 10000,
+        site_topics: Optional[Callable[[str], bool]] = None,
+    ):
+        """Initialize the rate limiter without limits.
+
+        Arguments:
+            max_keys: The maximum number of buckets. If there are more buckets, the
+                least recently used one is removed.
+            site_topics: A function that checks whether the site limits apply to the
+                messages on a topic. By default, they apply to intents.
+        """
+        self.max_keys = max_keys
+        self.site_topics = site_topics or _is_intent_topic
+        self.site_limits: Dict[str, RateLimit] = {}
+        self.intent_limits: Dict[str, RateLimit] = {}
+        self.topic_limits: Dict[str, RateLimit] = {}
+
+        # Number of throttled messages by limit, such as "site:kitchen"
+        self.throttled: "Counter[str]" = Counter()
+
+        self._topic_patterns: List[Tuple[str, Pattern[str]]] = []
+
+        # Buckets by limit and key, least recently used first
+        self._buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def set_limit(self, kind: str, key: str, limit: Optional[RateLimit]) -> None:
+        """Set or remove a rate limit.
+
+        Arguments:
+            kind: ``"site"``, ``"intent"`` or ``"topic"``.
+            key: The site ID, intent name or MQTT topic filter. ``"*"`` applies the
+                limit to each site or intent that has no limit of its own.
+            limit: The limit, or ``None`` to remove it.
+        """
+        limits = {
+            "site": self.site_limits,
+            "intent": self.intent_limits,
+            "topic": self.topic_limits,
+        }[kind]
+        if limit is None:
+            limits.pop(key, None)
+        else:
+            limits[key] = limit
+
+        if kind == "topic":
+            self._topic_patterns = [
+                (topic_filter, _topic_pattern(topic_filter))
+                for topic_filter in self.topic_limits
+            ]
+
+        # Start the buckets of the changed limit from scratch
+        prefix = f"{kind}:"
+        for bucket_key in [
+            bucket_key for bucket_key in self._buckets if bucket_key.startswith(prefix)
+        ]:
+            del self._buckets[bucket_key]
+
+    def _limits(self, topic: str, payload: bytes) -> List[Tuple[str, RateLimit]]:
+        """Get the bucket keys and limits that apply to a message."""
+        limits = []
+        if self.site_limits and self.site_topics(topic):
+            site_id = payload_site_id(payload)
+            if site_id is not None:
+                limit = self.site_limits.get(site_id) or self.site_limits.get(ANY)
+                if limit is not None:
+                    limits.append((f"site:{site_id}", limit))
+
+        if self.intent_limits and topic.startswith(_INTENT_PREFIX):
+            intent_name = topic[len(_INTENT_PREFIX) :]
+            limit = self.intent_limits.get(intent_name) or self.intent_limits.get(ANY)
+            if limit is not None:
+                limits.append((f"intent:{intent_name}", limit))
+
+        for topic_filter, pattern in self._topic_patterns:
+            if pattern.match(topic):
+                limits.append(
+                    (f"topic:{topic_filter}", self.topic_limits[topic_filter])
+                )
+
+        return limits
+
+    def check(
+        self, topic: str, payload: bytes, now: Optional[float] = None
+    ) -> Optional[Throttle]:
+        """Take tokens for a message.
+
+        Arguments:
+            topic: The topic of the message.
+            payload: The payload of the message.
+            now: The current monotonic time in seconds.
+
+        Returns:
+            ``None`` if the message is within the limits, otherwise what to do with it.
+            A delayed message has taken its tokens in advance.
+        """
+        limits = self._limits(topic, payload)
+        if not limits:
+            return None
+
+        if now is None:
+            now = time.monotonic()
+
+        buckets = self._buckets
+        bucket_tokens = []
+        throttle: Optional[Throttle] = None
+        throttle_key = ""
+        for bucket_key, limit in limits:
+            bucket = buckets.get(bucket_key)
+            if bucket is None or bucket.limit is not limit:
+                tokens = limit.burst
+            else:
+                tokens = bucket.tokens_at(now)
+            bucket_tokens.append(tokens)
+
+            # The message waits for the emptiest bucket
+            wait = (1 - tokens) / limit.rate
+            if tokens < 1 and (throttle is None or wait > throttle.wait):
+                action = limit.policy
+                if action == DELAY and wait > limit.max_delay:
+                    action = DROP
+                throttle = Throttle(action, wait, limit)
+                throttle_key = bucket_key
+
+        if throttle is not None:
+            self.throttled[throttle_key] += 1
+
+        # Delayed messages take their tokens in advance
+        take = 0 if throttle is not None and throttle.action != DELAY else 1
+        for (bucket_key, limit), tokens in zip(limits, bucket_tokens):
+            bucket = buckets.get(bucket_key)
+            if bucket is None:
+                buckets[bucket_key] = _Bucket(tokens - take, now, limit)
+            else:
+                bucket.tokens, bucket.updated, bucket.limit = tokens - take, now, limit
+                buckets.move_to_end(bucket_key)
+
+        self._evict(now)
+
+        return throttle
+
+    def _evict(self, now: float) -> None:
+        """Remove the least recently used buckets if they are full or too many."""
+        buckets = self._buckets
+        while buckets:
+            bucket_key, bucket = next(iter(buckets.items()))
+            if (
+                len(buckets) <= self.max_keys
+                and bucket.tokens_at(now) < bucket.limit.burst
+            ):
+                break
+
+            del buckets[bucket_key]
@@ -0,0 +1,497 @@
+"""Scheduling of timers, reminders and periodic jobs."""
+import asyncio
+import heapq
+import json
+import logging
+import math
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+_LOGGER = logging.getLogger("HermesApp")
+
+# Catch-up policies for jobs that are due while the app isn't running
+CATCH_UP_ALL = "all"
+CATCH_UP_ONCE = "once"
+CATCH_UP_SKIP = "skip"
+_CATCH_UP_POLICIES = {CATCH_UP_ALL, CATCH_UP_ONCE, CATCH_UP_SKIP}
+
+# Ranges of the minute, hour, day of month, month and day of week fields of cron
+_CRON_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+# The longest time the scheduler sleeps, so it notices changes of the system clock
+_MAX_SLEEP = 60.0
+
+
+class CronSchedule:
+    """A schedule in the format of cron: minute, hour, day of month, month and day of week.
+
+    Each field is ``*``, a number, a range such as ``1-5``, a list such as ``1,15`` or
+    any of these with a step such as ``*/15``. Days of the week are numbered from 0
+    (Sunday) to 6, or 7 for Sunday as well. Times are in the local time zone.
+    """
+
+    def __init__(self, expression: str):
+        """Parse a cron expression.
+
+        Arguments:
+            expression: The five fields of the schedule, separated by spaces.
+
+        Raises:
+            ValueError: The expression is invalid.
+        """
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = [
+            self._parse_field(field, low, high)
+            for field, (low, high) in zip(fields, _CRON_RANGES)
+        ]
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+
+        # Like cron, match either day field if both are restricted
+        self._any_day = fields[2] != "*" and fields[4] != "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> Set[int]:
+        values: Set[int] = set()
+        for part in field.split(","):
+            part_range, _, step_text = part.partition("/")
+            step = int(step_text) if step_text else 1
+            if part_range == "*":
+                start, end = low, high
+            elif "-" in part_range:
+                start_text, end_text = part_range.split("-", 1)
+                start, end = int(start_text), int(end_text)
+            else:
+                start = int(part_range)
+                end = high if step_text else start
+
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError(f"Invalid cron field {field!r}")
+
+            values.update(range(start, end + 1, step))
+
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_matches = moment.day in self.days
+        weekday_matches = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day:
+            return day_matches or weekday_matches
+
+        return day_matches and weekday_matches
+
+    def next_after(self, timestamp: float) -> float:
+        """Get the first time of the schedule after a time.
+
+        Arguments:
+            timestamp: The time in seconds since the epoch.
+
+        Returns:
+            The time in seconds since the epoch.
+        """
+        moment = datetime.fromtimestamp(timestamp).replace(
+            second=0, microsecond=0
+        ) + timedelta(minutes=1)
+        last_year = moment.year + 5
+
+        # Skip whole months, days and hours that don't match
+        while moment.year <= last_year:
+            if moment.month not in self.months:
+                moment = (
+                    moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)
+                ).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment.timestamp()
+
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+
+@dataclass
+class ScheduledJob:
+    """A job that the scheduler runs at a time.
+
+    Attributes:
+        id: The ID of the job.
+        due: The next time of the job in seconds since the epoch.
+        site_id: The ID of the site of the job.
+        text: The text to say at the site, if any.
+        callback: The name of the registered function to call, if any.
+        interval: The time in seconds between the runs of a periodic job.
+        cron: The cron expression of the job's schedule.
+        data: Data of the job for the callback, encoded as JSON.
+        catch_up: What to do if the job is late: ``"all"`` runs it for each missed time,
+            ``"once"`` runs it once and ``"skip"`` doesn't run it.
+    """
+
+    id: str
+    due: float
+    site_id: str = "default"
+    text: Optional[str] = None
+    callback: Optional[str] = None
+    interval: Optional[float] = None
+    cron: Optional[str] = None
+    data: Optional[str] = None
+    catch_up: str = CATCH_UP_ONCE
+
+    @property
+    def periodic(self) -> bool:
+        """Whether the job runs more than once."""
+        return self.interval is not None or self.cron is not None
+
+
+class Scheduler:
+    """Runs jobs at their time from a single task.
+
+    The jobs are kept in a heap ordered by their time, so adding a job takes
+    O(log n) time. Cancelling a job removes it from the table of jobs in O(1) time
+    and leaves its entry in the heap, which is skipped when it comes up.
+
+    If the scheduler has a database file, its jobs are stored in it and loaded again
+    when the scheduler is created, so they survive a restart. A job that is more
+    than ``grace`` seconds late, for instance because the app wasn't running, is
+    handled according to its catch-up policy.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        catch_up: str = CATCH_UP_ONCE,
+        grace: float = 60.0,
+    ):
+        """Initialize the scheduler and load its stored jobs.
+
+        Arguments:
+            path: The path of the SQLite database file to store the jobs in. If it's
+                not specified, the jobs are only kept in memory.
+            catch_up: The default catch-up policy of jobs.
+            grace: The time in seconds that a job can be late without applying its
+                catch-up policy.
+        """
+        if catch_up not in _CATCH_UP_POLICIES:
+            raise ValueError(f"Unknown catch-up policy {catch_up!r}")
+
+        self.catch_up = catch_up
+        self.grace = grace
+        self.callbacks: Dict[str, Callable[[ScheduledJob], Any]] = {}
+
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._crons: Dict[str, CronSchedule] = {}
+
+        # Time, sequence number and ID of each job. Entries of cancelled or
+        # rescheduled jobs stay in the heap and are skipped.
+        self._heap: List[Tuple[float, int, str]] = []
+        self._sequence = 0
+        self._valid_entries: Dict[str, int] = {}
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional["asyncio.Future[None]"] = None
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, due REAL,"
+                " site_id TEXT, text TEXT, callback TEXT, interval REAL, cron TEXT,"
+                " data TEXT, catch_up TEXT)"
+            )
+            self._load()
+
+    def _load(self) -> None:
+        assert self._db is not None
+        for row in self._db.execute(
+            "SELECT id, due, site_id, text, callback, interval, cron, data, catch_up"
+            " FROM jobs"
+        ):
+            job = ScheduledJob(*row)
+            self._jobs[job.id] = job
+            if job.cron is not None:
+                self._crons[job.id] = CronSchedule(job.cron)
+            self._push(job)
+
+        _LOGGER.debug("Loaded %s scheduled job(s)", len(self._jobs))
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._jobs
+
+    def get(self, job_id: str) -> Optional[ScheduledJob]:
+        """Get a scheduled job by its ID."""
+        return self._jobs.get(job_id)
+
+    def add(
+        self,
+        at: Optional[float] = None,
+        every: Optional[float] = None,
+        cron: Optional[str] = None,
+        site_id: str = "default",
+        text: Optional[str] = None,
+        callback: Optional[str] = None,
+        data: Any = None,
+        job_id: Optional[str] = None,
+        catch_up: Optional[str] = None,
+    ) -> ScheduledJob:
+        """Schedule a job.
+
+        Arguments:
+            at: The time of the job in seconds since the epoch.
+            every: The time in seconds between the runs of a periodic job. Without ``at``,
+                the job runs first after this time.
+            cron: A cron expression for the times of the job, as described in
+                :class:`CronSchedule`.
+            site_id: The ID of the site of the job.
+            text: The text to say at the site.
+            callback: The name of the function in :attr:`callbacks` to call with the job.
+            data: Data for the callback that can be encoded as JSON.
+            job_id: The ID of the job. A job with the same ID is replaced. By
+                default, a random ID is generated.
+            catch_up: The catch-up policy of the job. By default, the policy of the
+                scheduler is used.
+
+        Returns:
+            The scheduled job.
+        """
+        if at is None and every is None and cron is None:
+            raise ValueError("Specify at, every or cron")
+        if text is None and callback is None:
+            raise ValueError("Specify text or callback")
+        if every is not None and every <= 0:
+            raise ValueError("The interval must be positive")
+        if catch_up is not None and catch_up not in _CATCH_UP_POLICIES:
+            raise ValueError(f"Unknown catch-up policy {catch_up!r}")
+
+        schedule = CronSchedule(cron) if cron is not None else None
+        now = time.time()
+        if at is not None:
+            due = at
+        elif every is not None:
+            due = now + every
+        else:
+            assert schedule is not None
+            due = schedule.next_after(now)
+
+        job = ScheduledJob(
+            id=job_id or uuid.uuid4().hex,
+            due=due,
+            site_id=site_id,
+            text=text,
+            callback=callback,
+            interval=every,
+            cron=cron,
+            data=json.dumps(data) if data is not None else None,
+            catch_up=catch_up or self.catch_up,
+        )
+
+        self._jobs[job.id] = job
+        if schedule is not None:
+            self._crons[job.id] = schedule
+        else:
+            self._crons.pop(job.id, None)
+        self._push(job)
+        self._store(job)
+
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job.
+
+        Returns:
+            Whether the job was scheduled.
+        """
+        job = self._jobs.pop(job_id, None)
+        if job is None:
+            return False
+
+        self._crons.pop(job_id, None)
+        del self._valid_entries[job_id]
+        self._delete(job_id)
+
+        # Drop the entries of cancelled jobs when they take most of the heap
+        if len(self._heap) > 2 * len(self._jobs) + 64:
+            self._heap = [
+                entry
+                for entry in self._heap
+                if self._valid_entries.get(entry[2]) == entry[1]
+            ]
+            heapq.heapify(self._heap)
+
+        return True
+
+    def take_over(self, other: "Scheduler") -> None:
+        """Take over the functions and jobs of another scheduler that isn't running.
+
+        The jobs are stored in the database of this scheduler, and the database of the
+        other scheduler is closed.
+
+        Arguments:
+            other: The scheduler to take over.
+        """
+        # pylint: disable=protected-access
+        if other._task is not None:
+            raise RuntimeError("Can't take over a running scheduler")
+
+        self.callbacks.update(other.callbacks)
+        for job in other._jobs.values():
+            self._jobs[job.id] = job
+            if job.cron is not None:
+                self._crons[job.id] = CronSchedule(job.cron)
+            else:
+                self._crons.pop(job.id, None)
+            self._push(job)
+            self._store(job)
+
+        if other._db is not None:
+            other._db.close()
+            other._db = None
+
+    def _push(self, job: ScheduledJob) -> None:
+        self._sequence += 1
+        self._valid_entries[job.id] = self._sequence
+        is_first = not self._heap or job.due < self._heap[0][0]
+        heapq.heappush(self._heap, (job.due, self._sequence, job.id))
+
+        if is_first and self._wakeup is not None:
+            # The task sleeps until the previous first job
+            self._wakeup.set()
+
+    def _store(self, job: ScheduledJob) -> None:
+        if self._db is not None:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job.id,
+                        job.due,
+                        job.site_id,
+                        job.text,
+                        job.callback,
+                        job.interval,
+                        job.cron,
+                        job.data,
+                        job.catch_up,
+                    ),
+                )
+
+    def _delete(self, job_id: str) -> None:
+        if self._db is not None:
+            with self._db:
+                self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def _next_due(self, job: ScheduledJob, now: float) -> float:
+        """Get the time of the next run of a periodic job after it ran."""
+        after = job.due if job.catch_up == CATCH_UP_ALL else max(job.due, now)
+        schedule = self._crons.get(job.id)
+        if schedule is not None:
+            return schedule.next_after(after)
+
+        assert job.interval is not None
+        due = job.due + job.interval
+        if due <= after:
+            # Keep the phase of the interval
+            due += math.ceil((after - due) / job.interval + 1e-9) * job.interval
+
+        return due
+
+    def run_pending(
+        self, fire: Callable[[ScheduledJob], None], now: Optional[float] = None
+    ) -> Optional[float]:
+        """Run the jobs that are due.
+
+        Arguments:
+            fire: A function that runs a job.
+            now: The current time in seconds since the epoch.
+
+        Returns:
+            The time in seconds until the next job is due, or ``None`` if there are no jobs.
+        """
+        if now is None:
+            now = time.time()
+
+        heap = self._heap
+        while heap:
+            due, sequence, job_id = heap[0]
+            if self._valid_entries.get(job_id) != sequence:
+                # Cancelled or rescheduled
+                heapq.heappop(heap)
+                continue
+
+            if due > now:
+                break
+
+            heapq.heappop(heap)
+            job = self._jobs[job_id]
+            if now - due <= self.grace or job.catch_up != CATCH_UP_SKIP:
+                try:
+                    fire(job)
+                except Exception:
+                    _LOGGER.exception("Scheduled job %s", job_id)
+            else:
+                _LOGGER.debug("Skipped late job %s", job_id)
+
+            if job.periodic:
+                job.due = self._next_due(job, now)
+                self._push(job)
+                self._store(job)
+            else:
+                del self._jobs[job_id]
+                del self._valid_entries[job_id]
+                self._crons.pop(job_id, None)
+                self._delete(job_id)
+
+        if not heap:
+            return None
+
+        return max(0.0, heap[0][0] - now)
+
+    def start(self, fire: Callable[[ScheduledJob], None]) -> None:
+        """Start running the jobs in the running event loop.
+
+        Arguments:
+            fire: A function that runs a job. It's called in the event loop and
+                shouldn't block.
+        """
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run(fire))
+
+    async def _run(self, fire: Callable[[ScheduledJob], None]) -> None:
+        assert self._wakeup is not None
+        while True:
+            self._wakeup.clear()
+            delay = self.run_pending(fire)
+            timeout = _MAX_SLEEP if delay is None else min(delay, _MAX_SLEEP)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self) -> None:
+        """Stop running the jobs and close the database."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,216 @@
+"""Typed extraction of the slots of an intent."""
+import dataclasses
+from datetime import datetime, timedelta
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    List,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    get_type_hints,
+)
+
+from rhasspyhermes.nlu import NluIntent
+
+T = TypeVar("T")
+
+_NONE_TYPE = type(None)
+
+# Converts the value of a slot to the type of a field
+_Converter = Callable[[Dict[str, Any]], Any]
+
+_TRUE = {"true", "yes", "on", "1"}
+_FALSE = {"false", "no", "off", "0"}
+
+# Units of a duration slot value in seconds
+_DURATION_UNITS = {
+    "weeks": 7 * 24 * 60 * 60,
+    "days": 24 * 60 * 60,
+    "hours": 60 * 60,
+    "minutes": 60,
+    "seconds": 1,
+}
+
+
+class SlotError(ValueError):
+    """A slot of an intent is missing or has a value that can't be converted.
+
+    Attributes:
+        slot_name: The name of the slot.
+    """
+
+    def __init__(self, slot_name: str, message: str):
+        super().__init__(message)
+        self.slot_name = slot_name
+
+
+def _to_bool(value: Dict[str, Any]) -> bool:
+    slot_value = value["value"]
+    if isinstance(slot_value, str):
+        if slot_value.lower() in _TRUE:
+            return True
+        if slot_value.lower() in _FALSE:
+            return False
+        raise ValueError(slot_value)
+
+    return bool(slot_value)
+
+
+def _to_int(value: Dict[str, Any]) -> int:
+    slot_value = value["value"]
+    if isinstance(slot_value, float):
+        if not slot_value.is_integer():
+            raise ValueError(slot_value)
+        return int(slot_value)
+
+    return int(slot_value)
+
+
+def _to_datetime(value: Dict[str, Any]) -> datetime:
+    # Snips-style times have a space before the UTC offset
+    return datetime.fromisoformat(value["value"].replace(" +", "+").replace(" -", "-"))
+
+
+def _to_timedelta(value: Dict[str, Any]) -> timedelta:
+    if value.get("kind") == "Duration":
+        return timedelta(
+            seconds=sum(
+                value.get(unit, 0) * seconds
+                for unit, seconds in _DURATION_UNITS.items()
+            )
+        )
+
+    return timedelta(seconds=float(value["value"]))
+
+
+def _converter(field_type: Any) -> _Converter:
+    """Get the function that converts a slot value to a type."""
+    if field_type is bool:
+        return _to_bool
+    if field_type is int:
+        return _to_int
+    if field_type is datetime:
+        return _to_datetime
+    if field_type is timedelta:
+        return _to_timedelta
+    if field_type is Any:
+        return lambda value: value["value"]
+
+    if not isinstance(field_type, type):
+        raise TypeError(f"Unsupported slot type {field_type!r}")
+
+    # str, float, enumerations and other classes
+    return lambda value: field_type(value["value"])
+
+
+def _optional_type(field_type: Any) -> Tuple[Any, bool]:
+    """Get the type of an ``Optional`` type and whether it was optional."""
+    if getattr(field_type, "__origin__", None) is Union:
+        args = [arg for arg in field_type.__args__ if arg is not _NONE_TYPE]
+        if len(args) == 1:
+            return args[0], True
+
+    return field_type, False
+
+
+class SlotExtractor(Generic[T]):
+    """Converts the slots of an intent to a dataclass.
+
+    Each field of the dataclass holds the value of the slot with the same name, or
+    with the name in the field's ``slot`` metadata. The value is converted to the
+    type of the field. Supported types are ``str``, ``int``, ``float``, ``bool``,
+    :class:`datetime.datetime`, :class:`datetime.timedelta`, enumerations and other
+    classes that take the slot value as their only argument. A field with a default
+    value or an ``Optional`` type may be missing from the intent.
+
+    The converters of the fields are looked up once, when the extractor is created.
+
+    Example:
+
+    .. code-block:: python
+
+        @dataclass
+        class TimerSlots:
+            duration: timedelta
+            name: Optional[str] = None
+
+        extract = SlotExtractor(TimerSlots)
+        slots = extract(intent)
+    """
+
+    def __init__(self, schema: Type[T]):
+        """Compile the extractor.
+
+        Arguments:
+            schema: A dataclass with a field for each slot.
+        """
+        if not dataclasses.is_dataclass(schema):
+            raise TypeError(f"{schema!r} is not a dataclass")
+
+        self.schema = schema
+
+        # Field name, slot name, converter, whether the slot is required and
+        # whether the field is None if the slot is missing
+        self._fields: List[Tuple[str, str, _Converter, bool, bool]] = []
+        hints = _type_hints(schema)
+        for field in dataclasses.fields(schema):
+            if not field.init:
+                continue
+
+            field_type, optional = _optional_type(hints.get(field.name, Any))
+            has_default = (
+                field.default is not dataclasses.MISSING
+                or field.default_factory is not dataclasses.MISSING  # type: ignore
+            )
+            self._fields.append(
+                (
+                    field.name,
+                    field.metadata.get("slot", field.name),
+                    _converter(field_type),
+                    not (has_default or optional),
+                    optional and not has_default,
+                )
+            )
+
+    def __call__(self, intent: NluIntent) -> T:
+        """Extract the slots of an intent.
+
+        Arguments:
+            intent: The intent with the slots.
+
+        Raises:
+            SlotError: A required slot is missing or a slot value can't be converted.
+        """
+        values = {slot.slot_name: slot.value for slot in intent.slots or ()}
+
+        kwargs: Dict[str, Any] = {}
+        for name, slot_name, convert, required, none_default in self._fields:
+            value = values.get(slot_name)
+            if value is None:
+                if required:
+                    raise SlotError(slot_name, f"Missing slot {slot_name}")
+                if none_default:
+                    kwargs[name] = None
+                continue
+
+            try:
+                kwargs[name] = convert(value)
+            except (AttributeError, KeyError, TypeError, ValueError) as error:
+                raise SlotError(
+                    slot_name,
+                    f"Invalid value {value.get('value')!r} of slot {slot_name}",
+                ) from error
+
+        return self.schema(**kwargs)  # type: ignore
+
+
+def _type_hints(schema: type) -> Dict[str, Any]:
+    """Get the types of the fields of a dataclass, resolving string annotations."""
+    try:
+        return get_type_hints(schema)
+    except NameError:
+        return {field.name: field.type for field in dataclasses.fields(schema)}
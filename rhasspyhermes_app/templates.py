@@ -0,0 +1,191 @@
+"""Response templates compiled to JSON fragments."""
+import hashlib
+import json
+import string
+from typing import Any, Callable, Iterable, List, Mapping, Optional, Tuple
+
+from rhasspyhermes.dialogue import DialogueContinueSession, DialogueEndSession
+
+# Called with the hash and the text of a response that is likely to be said
+TtsCacheHook = Callable[[str, str], None]
+
+
+def text_hash(text: str) -> str:
+    """Get the hash of a response text, as passed to a TTS cache hook.
+
+    Arguments:
+        text: The text of the response.
+
+    Returns:
+        The SHA-256 hash of the UTF-8 encoded text in hexadecimal digits.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _json_string(text: str) -> str:
+    """Encode a text as the contents of a JSON string, without the quotes."""
+    return json.dumps(text)[1:-1]
+
+
+class Response:
+    """A response rendered from a template, ready to be published.
+
+    Return it from an intent handler instead of an :class:`rhasspyhermes_app.EndSession`
+    or :class:`rhasspyhermes_app.ContinueSession` object.
+
+    Attributes:
+        template: The template of the response.
+        text: The text of the response.
+    """
+
+    __slots__ = ("template", "text", "_text_json")
+
+    def __init__(self, template: "ResponseTemplate", text: str, text_json: str):
+        self.template = template
+        self.text = text
+        self._text_json = text_json
+
+    @property
+    def topic(self) -> str:
+        """The MQTT topic of the response."""
+        return self.template.topic
+
+    def payload(self, session_id: str) -> str:
+        """Get the JSON payload of the response in a session."""
+        prefix, infix, suffix = self.template.fragments
+        return prefix + _json_string(session_id) + infix + self._text_json + suffix
+
+    def __repr__(self) -> str:
+        return f"Response({self.text!r})"
+
+
+class ResponseTemplate:
+    """A response text with fields, compiled once to JSON fragments.
+
+    The template has the syntax of :meth:`str.format` with named fields. The literal
+    parts of the text and the rest of the :class:`rhasspyhermes.dialogue.DialogueEndSession`
+    or :class:`rhasspyhermes.dialogue.DialogueContinueSession` message are encoded to
+    JSON when the template is created, so rendering a response only encodes the
+    values of the fields.
+
+    Example:
+
+    .. code-block:: python
+
+        its_time = app.response_template("It's {hour} o'clock.")
+
+        @app.on_intent("GetTime")
+        async def get_time(intent: NluIntent):
+            return its_time.render(hour=datetime.now().hour)
+    """
+
+    def __init__(
+        self,
+        text: str,
+        continue_session: bool = False,
+        intent_filter: Optional[List[str]] = None,
+        send_intent_not_recognized: bool = False,
+        custom_data: Optional[str] = None,
+        tts_cache_hook: Optional[TtsCacheHook] = None,
+    ):
+        """Compile the template.
+
+        Arguments:
+            text: The text with fields such as ``{room}``.
+            continue_session: Whether the response continues the session instead of
+                ending it.
+            intent_filter: The intents of the answer when the session is continued.
+            send_intent_not_recognized: Whether the dialogue manager sends not recognized
+                intents to the app when the session is continued.
+            custom_data: An update to the session's custom data.
+            tts_cache_hook: A function that is called with the hash and the text of
+                responses that are likely to be said, to prepare them in a TTS cache.
+                It's called for a template without fields when it's created and for
+                the values passed to :meth:`warm`.
+        """
+        self.text = text
+        self.tts_cache_hook = tts_cache_hook
+
+        # Literal text, also as JSON, and the name, conversion and format of the
+        # next field
+        self._parts: List[Tuple[str, str, Optional[str], Optional[str], str]] = []
+        for literal, name, format_spec, conversion in string.Formatter().parse(text):
+            if name is not None and not name.isidentifier():
+                raise ValueError(f"Template fields need a name: {text!r}")
+            self._parts.append(
+                (literal, _json_string(literal), name, conversion, format_spec or "")
+            )
+
+        if continue_session:
+            message: Any = DialogueContinueSession(
+                session_id="",
+                custom_data=custom_data,
+                text="",
+                intent_filter=intent_filter,
+                send_intent_not_recognized=send_intent_not_recognized,
+            )
+        else:
+            message = DialogueEndSession(
+                session_id="", text="", custom_data=custom_data
+            )
+
+        self.topic = message.topic()
+        payload = message.to_json()
+        session_id_end = payload.index('"sessionId": "') + len('"sessionId": "')
+        text_start = payload.index('"text": "') + len('"text": "')
+
+        # Payload before the session ID, between it and the text, and after the text
+        self.fragments = (
+            payload[:session_id_end],
+            payload[session_id_end:text_start],
+            payload[text_start:],
+        )
+
+        if self.is_static:
+            self.warm([{}])
+
+    @property
+    def is_static(self) -> bool:
+        """Whether the template has no fields."""
+        return all(part[2] is None for part in self._parts)
+
+    def render(self, **values: Any) -> Response:
+        """Render a response with values for the fields.
+
+        Raises:
+            KeyError: A value for a field is missing.
+        """
+        text_parts = []
+        json_parts = []
+        for literal, literal_json, name, conversion, format_spec in self._parts:
+            text_parts.append(literal)
+            json_parts.append(literal_json)
+            if name is None:
+                continue
+
+            value = values[name]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "s":
+                value = str(value)
+            elif conversion == "a":
+                value = ascii(value)
+            value_text = format(value, format_spec)
+
+            text_parts.append(value_text)
+            json_parts.append(_json_string(value_text))
+
+        return Response(self, "".join(text_parts), "".join(json_parts))
+
+    def warm(self, values: Iterable[Mapping[str, Any]]) -> None:
+        """Pass the responses for likely values to the TTS cache hook.
+
+        Arguments:
+            values: The values of the fields of each response.
+        """
+        if self.tts_cache_hook is None:
+            return
+
+        for response_values in values:
+            response = self.render(**response_values)
+            self.tts_cache_hook(text_hash(response.text), response.text)
@@ -0,0 +1,291 @@
+"""Tracing of the voice pipeline per dialogue session."""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, ContextManager, Dict, Iterator, List, Optional
+
+_CURRENT_TRACE: ContextVar[Optional["MessageTrace"]] = ContextVar(
+    "rhasspyhermes_app_trace", default=None
+)
+
+_NO_SPAN: ContextManager[None] = nullcontext()
+
+# OpenTelemetry's SpanKind values
+_SPAN_KIND_INTERNAL = 1
+_SPAN_KIND_CONSUMER = 5
+
+
+def _new_id(length: int) -> str:
+    return os.urandom(length // 2).hex()
+
+
+@dataclass
+class Span:
+    """A timed stage of handling a message.
+
+    Attributes:
+        name: The name of the stage, or the MQTT topic for the span of a whole message.
+        start_time: The start time in nanoseconds since the epoch.
+        end_time: The end time in nanoseconds since the epoch.
+        span_id: The ID of the span as 16 hexadecimal digits.
+        parent_span_id: The ID of the parent span, if any.
+        trace_id: The ID of the trace as 32 hexadecimal digits. All spans of a session
+            have the same trace ID.
+        attributes: Attributes of the span, such as the site ID.
+    """
+
+    name: str
+    start_time: int
+    end_time: int = 0
+    span_id: str = field(default_factory=lambda: _new_id(16))
+    parent_span_id: Optional[str] = None
+    trace_id: str = ""
+    attributes: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        """The duration of the span in seconds."""
+        return (self.end_time - self.start_time) / 1e9
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Convert the span to the OpenTelemetry protocol's JSON encoding."""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id or "",
+            "name": self.name,
+            "kind": _SPAN_KIND_INTERNAL if self.parent_span_id else _SPAN_KIND_CONSUMER,
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": [
+                {"key": key, "value": {"stringValue": value}}
+                for key, value in self.attributes.items()
+            ],
+        }
+
+
+def to_otlp_json(spans: List[Span], service_name: str) -> Dict[str, Any]:
+    """Convert spans to an OpenTelemetry ``ExportTraceServiceRequest`` in JSON.
+
+    Arguments:
+        spans: The spans to convert.
+        service_name: The name of the service that recorded the spans.
+    """
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {
+                            "key": "service.name",
+                            "value": {"stringValue": service_name},
+                        }
+                    ]
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "rhasspyhermes_app"},
+                        "spans": [span.to_otlp() for span in spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class SpanExporter:
+    """Base class for exporters of the spans of a trace."""
+
+    def export(self, spans: List[Span], service_name: str):
+        """Export the spans of a finished trace.
+
+        Arguments:
+            spans: The spans of the trace.
+            service_name: The name of the app that recorded the spans.
+        """
+        raise NotImplementedError
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Exporter that keeps the spans in memory.
+
+    Attributes:
+        spans: The exported spans.
+    """
+
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+
+    def export(self, spans: List[Span], service_name: str):
+        self.spans.extend(spans)
+
+
+class FileSpanExporter(SpanExporter):
+    """Exporter that appends each trace as a line of OpenTelemetry JSON to a file.
+
+    The file has the format of the OpenTelemetry Collector's file exporter, so it
+    can be read by the Collector's OTLP JSON file receiver.
+    """
+
+    def __init__(self, path: str):
+        """Initialize the exporter.
+
+        Arguments:
+            path: The path of the file to append the traces to.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span], service_name: str):
+        line = json.dumps(to_otlp_json(spans, service_name), separators=(",", ":"))
+        with self._lock, open(self.path, "a", encoding="utf-8") as trace_file:
+            trace_file.write(line + "\n")
+
+
+class MessageTrace:
+    """The spans of handling one MQTT message."""
+
+    def __init__(self, topic: str, received_time: int):
+        self.root = Span(topic, received_time)
+        self.spans: List[Span] = [self.root]
+        self.session_id: Optional[str] = None
+        self.site_id: Optional[str] = None
+
+    def add_span(self, name: str, start_time: int, end_time: int) -> None:
+        """Add a stage of handling the message."""
+        self.spans.append(
+            Span(name, start_time, end_time, parent_span_id=self.root.span_id)
+        )
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time a stage of handling the message."""
+        start_time = time.time_ns()
+        try:
+            yield
+        finally:
+            self.add_span(name, start_time, time.time_ns())
+
+    def set_session(self, session_id: Optional[str], site_id: Optional[str]) -> None:
+        """Set the session and site of the message, as far as they are known."""
+        if session_id:
+            self.session_id = session_id
+            self.root.attributes["hermes.session_id"] = session_id
+
+        if site_id:
+            self.site_id = site_id
+            self.root.attributes["hermes.site_id"] = site_id
+
+
+def span(name: str) -> ContextManager[None]:
+    """Time a stage of handling the current message, if it's traced."""
+    trace = _CURRENT_TRACE.get()
+    if trace is None:
+        # Shared, so untraced messages don't allocate a context manager
+        return _NO_SPAN
+
+    return trace.span(name)
+
+
+def set_session(session_id: Optional[str], site_id: Optional[str]) -> None:
+    """Set the session and site of the current message, if it's traced."""
+    trace = _CURRENT_TRACE.get()
+    if trace is not None:
+        trace.set_session(session_id, site_id)
+
+
+class Tracer:
+    """Collects the message traces of each session and exports them when the session ends.
+
+    Messages that are received on a site before its session has started, such as a
+    detected hotword, are added to the trace of the session that starts next on the
+    site. Messages without a session or site are exported right away.
+    """
+
+    def __init__(
+        self, exporter: SpanExporter, service_name: str, max_sessions: int = 100
+    ):
+        """Initialize the tracer.
+
+        Arguments:
+            exporter: The exporter of finished traces.
+            service_name: The name of the app.
+            max_sessions: The maximum number of sessions with an open trace. If
+                more sessions are open, the trace of the oldest one is exported.
+        """
+        self.exporter = exporter
+        self.service_name = service_name
+        self.max_sessions = max_sessions
+
+        self._sessions: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._sites: "OrderedDict[str, List[Span]]" = OrderedDict()
+
+    def start_message(self, topic: str, received_time: int) -> MessageTrace:
+        """Start the trace of a message and make it the current trace.
+
+        Arguments:
+            topic: The MQTT topic of the message.
+            received_time: The time in nanoseconds since the epoch when the MQTT
+                client received the message.
+        """
+        trace = MessageTrace(topic, received_time)
+        trace.add_span("queue", received_time, time.time_ns())
+        _CURRENT_TRACE.set(trace)
+
+        return trace
+
+    def finish_message(self, trace: MessageTrace) -> None:
+        """Finish the trace of a message and add it to the trace of its session."""
+        trace.root.end_time = time.time_ns()
+
+        if trace.session_id:
+            spans = self._sessions.pop(trace.session_id, [])
+            if trace.site_id:
+                # Messages on the site before the session started
+                spans = self._sites.pop(trace.site_id, []) + spans
+
+            spans.extend(trace.spans)
+            self._sessions[trace.session_id] = spans
+            self._evict(self._sessions)
+        elif trace.site_id:
+            self._sites.setdefault(trace.site_id, []).extend(trace.spans)
+            self._evict(self._sites)
+        else:
+            self._export(trace.spans, _new_id(32))
+
+    def end_session(self, session_id: str) -> None:
+        """Export the trace of a session."""
+        spans = self._sessions.pop(session_id, None)
+        if spans:
+            self._export(
+                spans, hashlib.md5(session_id.encode("utf-8")).hexdigest()  # nosec
+            )
+
+    def _evict(self, traces: "OrderedDict[str, List[Span]]") -> None:
+        while len(traces) > self.max_sessions:
+            _key, spans = traces.popitem(last=False)
+            self._export(spans, _new_id(32))
+
+    def _export(self, spans: List[Span], trace_id: str) -> None:
+        message_spans = [span for span in spans if span.parent_span_id is None]
+        if len(message_spans) > 1:
+            # Group the messages of a session under one span
+            session_span = Span(
+                "session",
+                min(span.start_time for span in message_spans),
+                max(span.end_time for span in message_spans),
+            )
+            for message_span in message_spans:
+                message_span.parent_span_id = session_span.span_id
+            spans = [session_span] + spans
+
+        for trace_span in spans:
+            trace_span.trace_id = trace_id
+
+        self.exporter.export(spans, self.service_name)
@@ -17,6 +17,7 @@ python_files=(
     "${src_dir}/${python_name}"/*.py
     "${src_dir}"/examples/*.py
     "${src_dir}"/tests/*.py
+    "${src_dir}"/benchmarks/*.py
     "${src_dir}/setup.py"
 )
 
@@ -0,0 +1,16 @@
+"""Tests for rhasspyhermes_app."""
+
+
+def async_mock(mocker, **kwargs):
+    """Create a mock of a coroutine function, which also works on Python 3.7.
+
+    Each call returns a coroutine with the result of a :class:`unittest.mock.MagicMock`
+    created with ``kwargs``, such as ``return_value`` or ``side_effect``. The calls are
+    recorded like the calls of a :class:`unittest.mock.MagicMock`.
+    """
+    result = mocker.MagicMock(**kwargs)
+
+    async def call(*args, **call_kwargs):
+        return result(*args, **call_kwargs)
+
+    return mocker.MagicMock(side_effect=call)
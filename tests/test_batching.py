@@ -0,0 +1,106 @@
+"""Tests for rhasspyhermes_app batches of raw MQTT messages."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+
+import pytest
+
+from rhasspyhermes_app import HermesApp, TopicData
+from tests import async_mock
+
+_LOOP = asyncio.get_event_loop()
+
+
+@pytest.mark.asyncio
+async def test_batch_size_and_wait(mocker):
+    """Test whether batches are passed on when they're full or have waited."""
+    app = HermesApp("Test batches", mqtt_client=mocker.MagicMock())
+    handler = async_mock(mocker)
+    sensors = app.on_topic("sensors/{site_id}/temperature", batch=True, max_size=2)(
+        handler
+    )
+
+    app._subscribe_callbacks()
+    for site_id in ("kitchen", "hall", "bedroom"):
+        await app.on_raw_message(f"sensors/{site_id}/temperature", site_id.encode())
+
+    handler.assert_called_once_with(
+        [
+            (
+                TopicData("sensors/kitchen/temperature", {"site_id": "kitchen"}),
+                b"kitchen",
+            ),
+            (TopicData("sensors/hall/temperature", {"site_id": "hall"}), b"hall"),
+        ]
+    )
+
+    # The last message is passed on after waiting.
+    await asyncio.sleep(0.05)
+    assert handler.call_args[0][0] == [
+        (TopicData("sensors/bedroom/temperature", {"site_id": "bedroom"}), b"bedroom")
+    ]
+    topic_batch = sensors.batches["sensors/{site_id}/temperature"]
+    assert (topic_batch.batches, topic_batch.messages) == (2, 3)
+
+
+@pytest.mark.asyncio
+async def test_batch_conflate(mocker):
+    """Test whether a conflated batch keeps the latest message of each topic."""
+    app = HermesApp("Test conflated batches", mqtt_client=mocker.MagicMock())
+    handler = async_mock(mocker)
+    sensors = app.on_topic("sensors/#", batch=True, max_wait=10.0, conflate=True)(
+        handler
+    )
+
+    app._subscribe_callbacks()
+    for topic, payload in (
+        ("sensors/kitchen", b"20"),
+        ("sensors/hall", b"18"),
+        ("sensors/kitchen", b"21"),
+    ):
+        await app.on_raw_message(topic, payload)
+    handler.assert_not_called()
+
+    # Waiting batches are passed on when the app stops.
+    await app._shutdown()
+    handler.assert_called_once_with(
+        [
+            (TopicData("sensors/kitchen", {}), b"21"),
+            (TopicData("sensors/hall", {}), b"18"),
+        ]
+    )
+    assert sensors.batches["sensors/#"].conflated == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_per_pattern(mocker):
+    """Test whether each topic name of a handler has its own batches."""
+    app = HermesApp("Test batches per pattern", mqtt_client=mocker.MagicMock())
+    handler = async_mock(mocker)
+    app.on_topic(
+        "sensors/{site_id}/temperature", "sensors/{site_id}/humidity", batch=True
+    )(handler)
+
+    app._subscribe_callbacks()
+    for topic in ("sensors/kitchen/temperature", "sensors/kitchen/humidity"):
+        await app.on_raw_message(topic, b"20")
+
+    await asyncio.sleep(0.05)
+    assert [
+        [data.topic for data, _payload in call[0][0]] for call in handler.call_args_list
+    ] == [["sensors/kitchen/temperature"], ["sensors/kitchen/humidity"]]
+
+
+@pytest.mark.asyncio
+async def test_batch_handler_error(mocker):
+    """Test whether exceptions of a batch handler are logged."""
+    app = HermesApp("Test batch errors", mqtt_client=mocker.MagicMock())
+    handler = async_mock(mocker, side_effect=RuntimeError("boom"))
+    app.on_topic("sensors/#", batch=True)(handler)
+    log_exception = mocker.patch("rhasspyhermes_app.batching._LOGGER.exception")
+
+    app._subscribe_callbacks()
+    await app.on_raw_message("sensors/kitchen", b"20")
+    await asyncio.sleep(0.05)
+
+    handler.assert_called_once()
+    log_exception.assert_called_once()
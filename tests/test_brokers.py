@@ -0,0 +1,90 @@
+"""Tests for rhasspyhermes_app multiple brokers."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+
+import paho.mqtt.client as mqtt
+import pytest
+from rhasspyhermes.dialogue import (
+    DialogueEndSession,
+    DialogueNotification,
+    DialogueStartSession,
+)
+from rhasspyhermes.intent import Intent
+from rhasspyhermes.nlu import NluIntent
+
+from rhasspyhermes_app import HermesApp
+from tests import async_mock
+
+INTENT_NAME = "GetTime"
+INTENT_TOPIC = f"hermes/intent/{INTENT_NAME}"
+
+_LOOP = asyncio.get_event_loop()
+
+
+@pytest.mark.asyncio
+async def test_brokers(mocker):
+    """Test whether messages of a broker are handled and replies go back to it."""
+    app = HermesApp("Test brokers", mqtt_client=mocker.MagicMock())
+    app.is_connected = True
+    floor2_client = mocker.MagicMock()
+    floor2 = app.add_broker(
+        "floor2", "floor2.local", site_ids=["lab"], client=floor2_client
+    )
+
+    intent_handler = async_mock(mocker)
+    app.on_intent(INTENT_NAME)(intent_handler)
+    app._subscribe_callbacks()
+
+    # The broker subscribes to the app's topics when it connects.
+    floor2._on_connect(floor2_client, None, {}, mqtt.CONNACK_ACCEPTED)
+    floor2_client.subscribe.assert_called_once_with([(INTENT_TOPIC, 0)])
+
+    # Its messages go to the app's queue.
+    nlu_intent = NluIntent(
+        "what time is it",
+        Intent(INTENT_NAME, 1.0),
+        site_id="office",
+        session_id="abc",
+    )
+    message = mqtt.MQTTMessage(topic=INTENT_TOPIC.encode("utf-8"))
+    message.payload = nlu_intent.to_json().encode("utf-8")
+    floor2._on_message(floor2_client, None, message)
+    assert app.pre_queue.get_nowait() is message
+    assert floor2.last_message is not None
+
+    # Replies to the session and messages to its sites go to the broker.
+    app.publish(DialogueEndSession(session_id="abc", text="Now."))
+    app.publish(
+        DialogueStartSession(init=DialogueNotification("Hello"), site_id="office")
+    )
+    app.publish(DialogueStartSession(init=DialogueNotification("Hi"), site_id="lab"))
+    assert floor2_client.publish.call_count == 3
+    app.mqtt_client.publish.assert_not_called()
+
+    # Other messages go to the app's own broker.
+    app.publish(DialogueStartSession(init=DialogueNotification("Hi"), site_id="hall"))
+    app.mqtt_client.publish.assert_called_once()
+
+    # Reconnects are counted.
+    floor2._on_disconnect(floor2_client, None, mqtt.MQTT_ERR_CONN_LOST)
+    assert not floor2.is_connected
+    assert floor2.disconnects == 1
+
+
+def test_routed_messages_not_journaled(mocker, tmp_path):
+    """Test whether messages for another broker aren't replayed to the app's broker."""
+    mqtt_client = mocker.MagicMock()
+    mqtt_client.publish.return_value.rc = mqtt.MQTT_ERR_SUCCESS
+    app = HermesApp("Test routed journal", mqtt_client=mqtt_client)
+    app.enable_journal(str(tmp_path))
+    floor2_client = mocker.MagicMock()
+    app.add_broker("floor2", "floor2.local", site_ids=["lab"], client=floor2_client)
+
+    # The app's own broker is down.
+    app.publish(DialogueStartSession(init=DialogueNotification("Hi"), site_id="lab"))
+    app.publish(DialogueStartSession(init=DialogueNotification("Hi"), site_id="hall"))
+    floor2_client.publish.assert_called_once()
+
+    app.mqtt_on_connect(mqtt_client, None, {}, mqtt.CONNACK_ACCEPTED)
+    mqtt_client.publish.assert_called_once()
+    assert b"hall" in mqtt_client.publish.call_args[0][1]
@@ -0,0 +1,115 @@
+"""Tests for rhasspyhermes_app circuit breakers."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+
+import pytest
+from rhasspyhermes.dialogue import DialogueEndSession
+from rhasspyhermes.intent import Intent
+from rhasspyhermes.nlu import NluIntent
+
+from rhasspyhermes_app import EndSession, HermesApp
+from rhasspyhermes_app.circuit import CircuitBreaker, CircuitOpenError
+from tests import async_mock
+
+INTENT_NAME = "GetAdvice"
+INTENT_TOPIC = f"hermes/intent/{INTENT_NAME}"
+
+_LOOP = asyncio.get_event_loop()
+
+
+def intent_payload(session_id: str) -> bytes:
+    """Create the payload of an intent in a session."""
+    return (
+        NluIntent(
+            "give me advice",
+            Intent(INTENT_NAME, 1.0),
+            site_id="default",
+            session_id=session_id,
+        )
+        .to_json()
+        .encode("utf-8")
+    )
+
+
+def test_circuit_breaker():
+    """Test opening, probing and closing a circuit."""
+    breaker = CircuitBreaker(failure_rate=0.5, window=4, min_calls=2, reset_timeout=10)
+
+    assert breaker.allow(now=0.0)
+    breaker.record(False, now=0.0)
+    assert breaker.state(now=0.0) == "closed"
+
+    # Half of the calls failed.
+    assert breaker.allow(now=1.0)
+    breaker.record(True, now=1.0)
+    assert breaker.state(now=1.0) == "open"
+    assert not breaker.allow(now=5.0)
+
+    # Only one probe goes through while the circuit is half-open.
+    assert breaker.state(now=11.0) == "half_open"
+    assert breaker.allow(now=11.0)
+    assert not breaker.allow(now=11.0)
+    breaker.record(False, now=11.0)
+    assert breaker.state(now=12.0) == "open"
+
+    assert breaker.allow(now=21.0)
+    breaker.record(True, now=21.0)
+    assert breaker.state(now=21.0) == "closed"
+
+    assert (breaker.calls, breaker.failures, breaker.rejected) == (4, 2, 2)
+    assert breaker.opened == 2
+
+
+def test_circuit_breaker_slow_calls():
+    """Test whether slow calls count as failed calls."""
+    breaker = CircuitBreaker(failure_rate=1.0, window=2, min_calls=2, slow_call_time=1)
+
+    for _ in range(2):
+        assert breaker.allow(now=0.0)
+        breaker.record(True, duration=2.0, now=0.0)
+
+    assert breaker.state(now=0.0) == "open"
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_timeout():
+    """Test whether a call that takes too long is cancelled and fails."""
+    breaker = CircuitBreaker(min_calls=1, window=1, timeout=0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await breaker.call(asyncio.sleep, 1.0)
+
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(asyncio.sleep, 0)
+
+
+@pytest.mark.asyncio
+async def test_app_circuit_fallback(mocker):
+    """Test whether an app answers with the fallback while the circuit is open."""
+    app = HermesApp("Test circuit breaker", mqtt_client=mocker.MagicMock())
+    app.publish = mocker.MagicMock()
+    breaker = app.circuit_breaker("advice", min_calls=2, window=2)
+    assert app.circuit_breaker("advice") is breaker
+
+    backend = async_mock(mocker, side_effect=ConnectionError)
+
+    @app.on_intent(
+        INTENT_NAME, circuit="advice", fallback=EndSession("No advice right now.")
+    )
+    async def get_advice(intent: NluIntent):
+        await backend()
+        return EndSession("Take it easy.")
+
+    app._subscribe_callbacks()
+    for session_id in ("1", "2", "3"):
+        await app.on_raw_message(INTENT_TOPIC, intent_payload(session_id))
+
+    # The third intent isn't sent to the backend.
+    assert backend.call_count == 2
+    assert breaker.rejected == 1
+    assert app.publish.call_args_list == [
+        mocker.call(
+            DialogueEndSession(session_id=session_id, text="No advice right now.")
+        )
+        for session_id in ("1", "2", "3")
+    ]
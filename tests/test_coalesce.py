@@ -0,0 +1,54 @@
+"""Tests for rhasspyhermes_app notification coalescing."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+
+import pytest
+from rhasspyhermes.dialogue import DialogueNotification, DialogueStartSession
+
+from rhasspyhermes_app import HermesApp
+from rhasspyhermes_app.coalesce import NotificationCoalescer
+
+_LOOP = asyncio.get_event_loop()
+
+
+def test_notification_coalescer(mocker):
+    """Test whether identical notifications within the window are dropped."""
+    publish = mocker.MagicMock()
+    coalescer = NotificationCoalescer(window=1.0)
+
+    assert coalescer.add("kitchen", "The doorbell rang", publish, now=0.0)
+    assert not coalescer.add("kitchen", "The doorbell rang", publish, now=0.5)
+    assert coalescer.add("hall", "The doorbell rang", publish, now=0.5)
+    assert coalescer.add("kitchen", "The doorbell rang", publish, now=1.5)
+
+    assert publish.call_args_list == [
+        mocker.call("kitchen", "The doorbell rang"),
+        mocker.call("hall", "The doorbell rang"),
+        mocker.call("kitchen", "The doorbell rang"),
+    ]
+    assert (coalescer.sent, coalescer.merged) == (3, 1)
+
+
+@pytest.mark.asyncio
+async def test_app_concatenated_notifications(mocker):
+    """Test whether different texts for a site are said in one session."""
+    app = HermesApp("Test coalescing", mqtt_client=mocker.MagicMock())
+    app.publish = mocker.MagicMock()
+    app.coalesce_notifications(window=0.01, concatenate=True)
+
+    app.notify("The doorbell rang.", "kitchen")
+    app.notify("The doorbell rang.", "kitchen")
+    app.notify("The lights are on.", "kitchen")
+    app.publish.assert_not_called()
+
+    await asyncio.sleep(0.05)
+    app.publish.assert_called_once_with(
+        DialogueStartSession(
+            init=DialogueNotification("The doorbell rang. The lights are on."),
+            site_id="kitchen",
+        )
+    )
+
+    coalescer = app.notification_coalescer
+    assert coalescer is not None
+    assert (coalescer.sent, coalescer.merged, coalescer.concatenated) == (1, 1, 1)
@@ -0,0 +1,48 @@
+"""Tests for rhasspyhermes_app message decoding."""
+import pytest
+from rhasspyhermes.dialogue import DialogueIntentNotRecognized
+from rhasspyhermes.intent import Intent
+from rhasspyhermes.nlu import NluIntent, NluIntentNotRecognized
+from rhasspyhermes.wake import HotwordDetected
+
+from rhasspyhermes_app.decoding import (
+    message_decoder,
+    payload_session_id,
+    payload_site_id,
+)
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        HotwordDetected("porcupine", site_id="kitchen", custom_entities={"a": [1]}),
+        HotwordDetected("snowboy", current_sensitivity=0.5, session_id="abc"),
+        NluIntentNotRecognized("what", site_id="kitchen", id="1"),
+        DialogueIntentNotRecognized("abc", input="what"),
+        NluIntent("what time is it", Intent("GetTime", 1.0), session_id="abc"),
+    ],
+)
+def test_message_decoder(message):
+    """Test whether decoded messages are the same as with from_json."""
+    decode = message_decoder(type(message))
+    payload = message.to_json()
+    assert decode(payload) == type(message).from_json(payload) == message
+    assert decode(payload.encode("utf-8")) == message
+
+
+def test_message_decoder_missing_key():
+    """Test whether a missing required field raises a KeyError."""
+    with pytest.raises(KeyError):
+        message_decoder(HotwordDetected)('{"siteId": "kitchen"}')
+
+
+def test_payload_ids():
+    """Test finding the site and session ID of a payload, also when they're malformed."""
+    payload = HotwordDetected(
+        "porcupine", site_id="kitchen", session_id="abc"
+    ).to_json()
+    assert payload_site_id(payload.encode()) == "kitchen"
+    assert payload_session_id(payload.encode()) == "abc"
+
+    assert payload_site_id(b'{"siteId": "\xffkitchen"}') == "\ufffdkitchen"
+    assert payload_session_id(b'{"siteId": "kitchen"}') is None
@@ -0,0 +1,87 @@
+"""Tests for rhasspyhermes_app duplicate suppression."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+
+import pytest
+from rhasspyhermes.intent import Intent
+from rhasspyhermes.nlu import NluIntent
+from rhasspyhermes.wake import HotwordDetected
+
+from rhasspyhermes_app import HermesApp
+from rhasspyhermes_app.dedup import DEDUPLICATED_TOPICS, DuplicateFilter
+from tests import async_mock
+
+INTENT_NAME = "GetTime"
+INTENT_TOPIC = f"hermes/intent/{INTENT_NAME}"
+NLU_INTENT = NluIntent("what time is it", Intent(INTENT_NAME, 1.0), session_id="abc")
+NLU_INTENT2 = NluIntent("what time is it", Intent(INTENT_NAME, 1.0), session_id="def")
+
+_LOOP = asyncio.get_event_loop()
+
+
+def test_duplicate_filter(mocker):
+    """Test whether duplicates are detected within the window and capacity."""
+    monotonic = mocker.patch("rhasspyhermes_app.dedup.time.monotonic", return_value=0)
+    duplicate_filter = DuplicateFilter(window=2.0, capacity=2)
+
+    assert not duplicate_filter.is_duplicate("a", b"1")
+    assert duplicate_filter.is_duplicate("a", b"1")
+    assert not duplicate_filter.is_duplicate("b", b"1")
+
+    # Messages are forgotten after the window.
+    monotonic.return_value = 3
+    assert not duplicate_filter.is_duplicate("a", b"1")
+
+    # Messages are forgotten when the capacity is reached.
+    assert not duplicate_filter.is_duplicate("c", b"1")
+    assert not duplicate_filter.is_duplicate("d", b"1")
+    assert not duplicate_filter.is_duplicate("a", b"1")
+
+    assert duplicate_filter.hits == 1
+    assert duplicate_filter.misses == 6
+
+
+def test_duplicate_filter_topics():
+    """Test whether only dialogue messages with a session or request ID are checked."""
+    duplicate_filter = DuplicateFilter(topic_filters=DEDUPLICATED_TOPICS)
+
+    payload = NLU_INTENT.to_json()
+    assert not duplicate_filter.is_duplicate(INTENT_TOPIC, payload)
+    assert duplicate_filter.is_duplicate(INTENT_TOPIC, payload)
+
+    # Identical readings of a sensor are legitimate.
+    assert not duplicate_filter.is_duplicate("sensors/kitchen", b'{"id": "t1"}')
+    assert not duplicate_filter.is_duplicate("sensors/kitchen", b'{"id": "t1"}')
+
+    # So are hotwords detected outside a session.
+    hotword = HotwordDetected("porcupine", site_id="kitchen").to_json()
+    for _ in range(2):
+        assert not duplicate_filter.is_duplicate("hermes/hotword/p/detected", hotword)
+
+    assert duplicate_filter.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_deduplication(mocker):
+    """Test whether a redelivered intent is handled once."""
+    mqtt_client = mocker.MagicMock()
+    app = HermesApp("Test deduplication", mqtt_client=mqtt_client)
+    app.enable_deduplication()
+
+    intent_handler = async_mock(mocker)
+    app.on_intent(INTENT_NAME)(intent_handler)
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+    main_loop = asyncio.ensure_future(app.handle_messages_async())
+    await asyncio.sleep(0)
+
+    for nlu_intent in (NLU_INTENT, NLU_INTENT, NLU_INTENT2):
+        message = mocker.MagicMock(topic=INTENT_TOPIC, payload=nlu_intent.to_json())
+        app.mqtt_on_message(mqtt_client, None, message)
+
+    await app.drain(timeout=1.0)
+    assert main_loop.done()
+    assert intent_handler.call_count == 2
+    assert app.duplicate_filter is not None
+    assert app.duplicate_filter.hits == 1
@@ -0,0 +1,113 @@
+"""Tests for rhasspyhermes_app dialogue flows."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+
+import pytest
+from rhasspyhermes.dialogue import (
+    DialogueContinueSession,
+    DialogueEndSession,
+    DialogueIntentNotRecognized,
+    DialogueSessionEnded,
+    DialogueSessionTermination,
+    DialogueSessionTerminationReason,
+)
+from rhasspyhermes.intent import Intent
+from rhasspyhermes.nlu import NluIntent
+
+from rhasspyhermes_app import EndSession, HermesApp
+from rhasspyhermes_app.flow import FlowSession
+
+SESSION_ID = "abc"
+
+_LOOP = asyncio.get_event_loop()
+
+
+def nlu_intent(intent_name: str) -> NluIntent:
+    """Create an intent in the session."""
+    return NluIntent("", Intent(intent_name, 1.0), session_id=SESSION_ID)
+
+
+def create_app(mocker):
+    """Create an app with a flow to book a table."""
+    app = HermesApp("Test dialogue flow", mqtt_client=mocker.MagicMock())
+    app.publish = mocker.MagicMock()
+
+    flow = app.dialogue_flow("start")
+    flow.state("ask_time", prompt="For what time?", reprompt="Please say a time.")
+
+    @flow.on("start", "BookTable", next_state="ask_time")
+    async def book_table(_intent: NluIntent, session: FlowSession):
+        session.data["people"] = 2
+
+    @flow.on("ask_time", "GiveTime")
+    async def give_time(_intent: NluIntent, session: FlowSession):
+        return EndSession(f"Booked a table for {session.data['people']}.")
+
+    @flow.on("ask_time", "Cancel")
+    async def cancel(_intent: NluIntent, _session: FlowSession):
+        return EndSession("Cancelled.")
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+
+    return app, flow
+
+
+@pytest.mark.asyncio
+async def test_flow(mocker):
+    """Test the transitions of a session through a flow."""
+    app, flow = create_app(mocker)
+
+    # An intent that doesn't start the flow is ignored.
+    await app.on_raw_message("hermes/intent/GiveTime", nlu_intent("GiveTime").to_json())
+    app.publish.assert_not_called()
+
+    await app.on_raw_message(
+        "hermes/intent/BookTable", nlu_intent("BookTable").to_json()
+    )
+    app.publish.assert_called_once_with(
+        DialogueContinueSession(
+            session_id=SESSION_ID,
+            text="For what time?",
+            intent_filter=["Cancel", "GiveTime"],
+            send_intent_not_recognized=True,
+        )
+    )
+    assert flow.session(SESSION_ID).state == "ask_time"
+
+    app.publish.reset_mock()
+    await app.on_raw_message(
+        "hermes/dialogueManager/intentNotRecognized",
+        DialogueIntentNotRecognized(session_id=SESSION_ID).to_json(),
+    )
+    assert app.publish.call_args[0][0].text == "Please say a time."
+
+    app.publish.reset_mock()
+    await app.on_raw_message("hermes/intent/GiveTime", nlu_intent("GiveTime").to_json())
+    app.publish.assert_called_once_with(
+        DialogueEndSession(session_id=SESSION_ID, text="Booked a table for 2.")
+    )
+    assert flow.session(SESSION_ID) is None
+
+    assert flow.timings["start"].count == 1
+    assert flow.timings["ask_time"].count == 1
+
+
+@pytest.mark.asyncio
+async def test_flow_session_ended(mocker):
+    """Test whether the state of an ended session is forgotten."""
+    app, flow = create_app(mocker)
+
+    await app.on_raw_message(
+        "hermes/intent/BookTable", nlu_intent("BookTable").to_json()
+    )
+    assert flow.session(SESSION_ID) is not None
+
+    await app.on_raw_message(
+        "hermes/dialogueManager/sessionEnded",
+        DialogueSessionEnded(
+            DialogueSessionTermination(DialogueSessionTerminationReason.TIMEOUT),
+            session_id=SESSION_ID,
+        ).to_json(),
+    )
+    assert flow.session(SESSION_ID) is None
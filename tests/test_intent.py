@@ -3,8 +3,10 @@
 import asyncio
 
 import pytest
+from rhasspyhermes.dialogue import DialogueEndSession
 from rhasspyhermes.intent import Intent
 from rhasspyhermes.nlu import NluIntent
+from rhasspyhermes.tts import TtsSay, TtsSayFinished
 
 from rhasspyhermes_app import HermesApp
 
@@ -62,3 +64,68 @@ async def test_callbacks_intent(mocker):
     await app.on_raw_message(INTENT_TOPIC3, NLU_INTENT3.to_json())
     intent_handler2.assert_called_once_with(NLU_INTENT3)
     intent_handler.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_streaming_intent(mocker):
+    """Test whether the chunks of an async generator are said as soon as they're ready."""
+    app = HermesApp("Test streaming", mqtt_client=mocker.MagicMock())
+    published = []
+    first_said = asyncio.Event()
+
+    def publish(message):
+        published.append(message)
+        if isinstance(message, TtsSay):
+            first_said.set()
+            asyncio.ensure_future(
+                app.on_raw_message(
+                    TtsSayFinished.topic(), TtsSayFinished(id=message.id).to_json()
+                )
+            )
+
+    app.publish = publish
+
+    @app.on_intent(INTENT_NAME)
+    async def get_news(_intent: NluIntent):
+        yield "The first article."
+        # The first chunk is said before the next one is computed.
+        await asyncio.wait_for(first_said.wait(), 1.0)
+        yield "The second article."
+
+    app._subscribe_callbacks()
+    assert TtsSayFinished.topic() in app._topics()
+
+    nlu_intent = NluIntent("what's new", INTENT, site_id="kitchen", session_id="abc")
+    await app.on_raw_message(INTENT_TOPIC, nlu_intent.to_json())
+
+    assert [message.text for message in published[:2]] == [
+        "The first article.",
+        "The second article.",
+    ]
+    assert all(
+        message.session_id == "abc" and message.site_id == "kitchen"
+        for message in published[:2]
+    )
+    assert published[2:] == [DialogueEndSession(session_id="abc")]
+    assert not app._say_waiters
+
+
+@pytest.mark.asyncio
+async def test_streaming_intent_error(mocker):
+    """Test whether a failing async generator ends its session and can be removed."""
+    app = HermesApp("Test streaming errors", mqtt_client=mocker.MagicMock())
+    app.publish = mocker.MagicMock()
+
+    @app.on_intent(INTENT_NAME)
+    async def get_news(_intent: NluIntent):
+        raise RuntimeError("The news service is down")
+        yield "The first article."  # pylint: disable=unreachable
+
+    app._subscribe_callbacks()
+
+    nlu_intent = NluIntent("what's new", INTENT, site_id="kitchen", session_id="abc")
+    await app.on_raw_message(INTENT_TOPIC, nlu_intent.to_json())
+    app.publish.assert_called_once_with(DialogueEndSession(session_id="abc"))
+
+    app.remove_handler(get_news)
+    assert TtsSayFinished.topic() not in app._topics()
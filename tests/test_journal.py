@@ -0,0 +1,70 @@
+"""Tests for rhasspyhermes_app outbound journal."""
+# pylint: disable=protected-access,too-many-function-args
+import paho.mqtt.client as mqtt
+
+from rhasspyhermes_app import HermesApp
+from rhasspyhermes_app.journal import OutboundJournal
+
+
+def test_journal_replay(tmp_path):
+    """Test whether messages are replayed in order and expired messages are dropped."""
+    journal = OutboundJournal(str(tmp_path), segment_size=64)
+    for i in range(5):
+        journal.append("test/topic", f"message {i}", ttl=60)
+    journal.append("test/expired", "expired", ttl=-1)
+    assert journal
+    assert len(list(tmp_path.iterdir())) > 1
+
+    # The journal survives a restart.
+    journal = OutboundJournal(str(tmp_path), segment_size=64)
+
+    published = []
+
+    def publish(topic: str, payload: bytes) -> bool:
+        if len(published) == 3:
+            return False
+        published.append((topic, payload))
+        return True
+
+    # Messages after a failure are kept.
+    assert journal.replay(publish) == 3
+    assert journal
+
+    published.clear()
+    assert journal.replay(
+        lambda topic, payload: bool(published.append(payload)) or True
+    )
+    assert published == [b"message 3", b"message 4"]
+    assert not journal
+    assert not list(tmp_path.iterdir())
+
+
+def test_journal_max_size(tmp_path):
+    """Test whether the oldest segments are dropped when the journal is full."""
+    journal = OutboundJournal(str(tmp_path), segment_size=100, max_size=300)
+    for i in range(100):
+        journal.append("test/topic", f"message {i}", ttl=60)
+
+    assert journal.size <= 300 + 100
+
+
+def test_app_journal(mocker, tmp_path):
+    """Test whether messages published while disconnected are sent on reconnect."""
+    mqtt_client = mocker.MagicMock()
+    mqtt_client.publish.return_value.rc = mqtt.MQTT_ERR_SUCCESS
+    app = HermesApp("Test journal", mqtt_client=mqtt_client)
+    app.enable_journal(str(tmp_path))
+
+    app.notify("The doorbell rang", site_id="kitchen")
+    mqtt_client.publish.assert_not_called()
+
+    app.mqtt_on_connect(mqtt_client, None, {}, mqtt.CONNACK_ACCEPTED)
+    topic, payload = mqtt_client.publish.call_args[0]
+    assert topic == "hermes/dialogueManager/startSession"
+    assert b"The doorbell rang" in payload
+    assert not app.journal
+
+    # Once the journal has been replayed, messages are published directly.
+    mqtt_client.publish.reset_mock()
+    app.notify("Dinner is ready")
+    mqtt_client.publish.assert_called_once()
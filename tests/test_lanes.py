@@ -0,0 +1,84 @@
+"""Tests for rhasspyhermes_app dispatch lanes."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+
+import pytest
+from rhasspyhermes.intent import Intent
+from rhasspyhermes.nlu import NluIntent
+
+from rhasspyhermes_app import EndSession, HermesApp, TopicData
+
+INTENT_NAME = "GetTime"
+INTENT_TOPIC = f"hermes/intent/{INTENT_NAME}"
+NLU_INTENT = NluIntent("what time is it", Intent(INTENT_NAME, 1.0), session_id="abc")
+
+_LOOP = asyncio.get_event_loop()
+
+
+def test_lane_selection(mocker):
+    """Test which lane takes the messages on a topic."""
+    app = HermesApp("Test lane selection", mqtt_client=mocker.MagicMock())
+    assert app._lane("sensors/kitchen") is None
+
+    audio = app.add_lane("audio", "hermes/audioServer/+/audioFrame")
+    bulk = app.add_lane("bulk", concurrency=4)
+
+    assert app._lane("hermes/audioServer/kitchen/audioFrame") is audio
+    assert app._lane("sensors/kitchen") is bulk
+    assert app._lane(INTENT_TOPIC) is None
+    assert app._lane("hermes/hotword/porcupine/detected") is None
+
+    # Lanes with topic filters can take dialogue messages too.
+    intents = app.add_lane("intents", "hermes/intent/#")
+    assert app._lane(INTENT_TOPIC) is intents
+
+    with pytest.raises(ValueError):
+        app.add_lane("stalled", concurrency=0)
+
+
+@pytest.mark.asyncio
+async def test_lane_isolates_intents(mocker):
+    """Test whether intents are handled while a lane works through a burst."""
+    mqtt_client = mocker.MagicMock()
+    app = HermesApp("Test lanes", mqtt_client=mqtt_client)
+    app.is_connected = True
+    handled = []
+
+    @app.on_topic("sensors/{name}")
+    async def sensor(data: TopicData, payload: bytes):
+        await asyncio.sleep(0.01)
+        handled.append(payload)
+
+    @app.on_intent(INTENT_NAME)
+    async def get_time(intent: NluIntent):
+        handled.append(intent.intent.intent_name)
+        return EndSession("It's too late.")
+
+    bulk = app.add_lane("bulk", max_queue=3)
+
+    app._subscribe_callbacks()
+    main_loop = asyncio.ensure_future(app.handle_messages_async())
+    await asyncio.sleep(0)
+
+    for number in range(5):
+        app.mqtt_on_message(
+            mqtt_client,
+            None,
+            mocker.MagicMock(topic="sensors/kitchen", payload=str(number).encode()),
+        )
+    app.mqtt_on_message(
+        mqtt_client,
+        None,
+        mocker.MagicMock(topic=INTENT_TOPIC, payload=NLU_INTENT.to_json()),
+    )
+
+    assert await app.drain(timeout=1.0)
+    assert main_loop.done()
+
+    # The intent doesn't wait for the sensor readings, and the oldest readings that
+    # didn't fit in the queue are dropped.
+    assert handled == [INTENT_NAME, b"2", b"3", b"4"]
+    assert (bulk.handled, bulk.dropped) == (3, 2)
+
+    await app._shutdown()
+    assert not bulk._workers
@@ -0,0 +1,150 @@
+"""Tests for rhasspyhermes_app drain and reload."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+
+import pytest
+from rhasspyhermes.intent import Intent
+from rhasspyhermes.nlu import NluIntent
+
+from rhasspyhermes_app import EndSession, HermesApp
+from tests import async_mock
+
+INTENT_NAME = "GetTime"
+INTENT_TOPIC = f"hermes/intent/{INTENT_NAME}"
+NLU_INTENT = NluIntent("what time is it", Intent(INTENT_NAME, 1.0), session_id="abc")
+
+_LOOP = asyncio.get_event_loop()
+
+
+@pytest.mark.asyncio
+async def test_drain(mocker):
+    """Test whether draining waits for received messages to be handled."""
+    mqtt_client = mocker.MagicMock()
+    app = HermesApp("Test drain", mqtt_client=mqtt_client)
+    app.is_connected = True
+    handled = []
+
+    @app.on_intent(INTENT_NAME)
+    async def get_time(intent: NluIntent):
+        await asyncio.sleep(0.05)
+        handled.append(intent)
+        return EndSession("It's too late.")
+
+    app._subscribe_callbacks()
+    main_loop = asyncio.ensure_future(app.handle_messages_async())
+    await asyncio.sleep(0)
+
+    message = mocker.MagicMock(topic=INTENT_TOPIC, payload=NLU_INTENT.to_json())
+    app.mqtt_on_message(mqtt_client, None, message)
+
+    assert await app.drain(timeout=1.0)
+    assert main_loop.done()
+    assert handled == [NLU_INTENT]
+    mqtt_client.unsubscribe.assert_called_once_with([INTENT_TOPIC])
+    assert mqtt_client.publish.call_args[0][0] == "hermes/dialogueManager/endSession"
+
+
+@pytest.mark.asyncio
+async def test_message_loop_survives_errors(mocker):
+    """Test whether an error while dispatching a message doesn't stop the loop."""
+    mqtt_client = mocker.MagicMock()
+    app = HermesApp("Test message loop errors", mqtt_client=mqtt_client)
+    intent_handler = async_mock(mocker)
+    app.on_intent(INTENT_NAME)(intent_handler)
+    app.duplicate_filter = mocker.MagicMock()
+    app.duplicate_filter.is_duplicate.side_effect = [RuntimeError("boom"), False]
+
+    app._subscribe_callbacks()
+    main_loop = asyncio.ensure_future(app.handle_messages_async())
+    await asyncio.sleep(0)
+
+    for _ in range(2):
+        message = mocker.MagicMock(topic=INTENT_TOPIC, payload=NLU_INTENT.to_json())
+        app.mqtt_on_message(mqtt_client, None, message)
+
+    assert await app.drain(timeout=1.0)
+    assert main_loop.done()
+    intent_handler.assert_called_once_with(NLU_INTENT)
+
+
+def test_reload(mocker):
+    """Test whether reloading swaps handlers and only updates changed topics."""
+    mqtt_client = mocker.MagicMock()
+    app = HermesApp("Test reload", mqtt_client=mqtt_client)
+    app.is_connected = True
+
+    app.on_intent(INTENT_NAME, "GetWeather")(mocker.MagicMock())
+    app._subscribe_callbacks()
+    mqtt_client.subscribe.reset_mock()
+
+    def register(new_app: HermesApp):
+        new_app.on_intent(INTENT_NAME, "GetTemperature")(mocker.MagicMock())
+
+    app.reload(register)
+
+    assert set(app._callbacks_intent) == {INTENT_NAME, "GetTemperature"}
+    mqtt_client.unsubscribe.assert_called_once_with(["hermes/intent/GetWeather"])
+    mqtt_client.subscribe.assert_called_once_with([("hermes/intent/GetTemperature", 0)])
+
+    # A failing registration keeps the old handlers.
+    def broken(new_app: HermesApp):
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        app.reload(broken)
+    assert set(app._callbacks_intent) == {INTENT_NAME, "GetTemperature"}
+
+
+def test_run_loop_factory(mocker):
+    """Test whether the app runs in the event loop of a loop factory."""
+    connect = mocker.patch("rhasspyhermes_app.hermes_cli.connect")
+    app = HermesApp("Test loop factory", mqtt_client=mocker.MagicMock())
+    loops = []
+    executor_shutdowns = []
+
+    def loop_factory() -> asyncio.AbstractEventLoop:
+        loop = asyncio.new_event_loop()
+        loops.append(loop)
+        if hasattr(loop, "shutdown_default_executor"):
+            executor_shutdowns.append(mocker.spy(loop, "shutdown_default_executor"))
+        return loop
+
+    @app.on_startup
+    async def stop():
+        assert asyncio.get_running_loop() is loops[0]
+        assert asyncio.get_running_loop().get_debug()
+        asyncio.ensure_future(app.drain())
+
+    app.run(loop_factory=loop_factory, debug=True, slow_callback_duration=0.5)
+
+    connect.assert_called_once_with(app.mqtt_client, app.args)
+    assert loops[0].is_closed()
+    assert loops[0].slow_callback_duration == 0.5
+    for shutdown in executor_shutdowns:
+        shutdown.assert_called_once()
+
+    # A loop factory can't be combined with uvloop.
+    with pytest.raises(ValueError):
+        app.run(loop_factory=loop_factory, uvloop=True)
+
+
+@pytest.mark.asyncio
+async def test_run_async(mocker):
+    """Test whether the app runs in an event loop that is already running."""
+    mocker.patch("rhasspyhermes_app.hermes_cli.connect")
+    mqtt_client = mocker.MagicMock()
+    app = HermesApp("Test run async", mqtt_client=mqtt_client)
+    intent_handler = async_mock(mocker)
+    app.on_intent(INTENT_NAME)(intent_handler)
+
+    running = asyncio.ensure_future(app.run_async())
+    await asyncio.sleep(0.01)
+
+    message = mocker.MagicMock(topic=INTENT_TOPIC, payload=NLU_INTENT.to_json())
+    app.mqtt_on_message(mqtt_client, None, message)
+    assert await app.drain(timeout=1.0)
+    await running
+
+    intent_handler.assert_called_once_with(NLU_INTENT)
+    mqtt_client.loop_start.assert_called_once()
+    mqtt_client.loop_stop.assert_called_once()
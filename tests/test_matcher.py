@@ -0,0 +1,64 @@
+"""Tests for rhasspyhermes_app fallback matcher."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+
+import pytest
+from rhasspyhermes.nlu import NluIntentNotRecognized
+
+from rhasspyhermes_app import HermesApp
+from rhasspyhermes_app.matcher import PhraseMatcher
+from tests import async_mock
+
+INR_TOPIC = "hermes/nlu/intentNotRecognized"
+
+PHRASES = {
+    "GetTime": ["what time is it", "tell me the time"],
+    "GetWeather": ["how is the weather", "will it rain tomorrow"],
+    "TurnOnLight": ["turn on the light", "switch the lamp on"],
+}
+
+_LOOP = asyncio.get_event_loop()
+
+
+def test_phrase_matcher():
+    """Test whether texts are matched to the intent of the most similar phrase."""
+    matcher = PhraseMatcher(PHRASES)
+    assert len(matcher) == 6
+
+    assert matcher.match("turn on the light") == ("TurnOnLight", pytest.approx(1.0))
+
+    intent_name, score = matcher.match("please switch on the lamp")
+    assert intent_name == "TurnOnLight"
+    assert 0 < score < 1
+
+    assert matcher.match("covfefe") is None
+
+
+@pytest.mark.asyncio
+async def test_fallback_intent(mocker):
+    """Test whether a matched not recognized input is handled as an intent."""
+    app = HermesApp("Test fallback", mqtt_client=mocker.MagicMock())
+    app.set_fallback_phrases(PHRASES, min_score=0.5)
+
+    intent_handler = async_mock(mocker)
+    app.on_intent("GetWeather")(intent_handler)
+    inr_handler = async_mock(mocker)
+    app.on_intent_not_recognized(inr_handler)
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+
+    inr = NluIntentNotRecognized(input="will it rain", site_id="kitchen")
+    await app.on_raw_message(INR_TOPIC, inr.to_json())
+    inr_handler.assert_not_called()
+    nlu_intent = intent_handler.call_args[0][0]
+    assert nlu_intent.intent.intent_name == "GetWeather"
+    assert nlu_intent.input == "will it rain"
+    assert nlu_intent.site_id == "kitchen"
+
+    # Phrases of intents without handler aren't matched.
+    intent_handler.reset_mock()
+    inr = NluIntentNotRecognized(input="what time is it")
+    await app.on_raw_message(INR_TOPIC, inr.to_json())
+    intent_handler.assert_not_called()
+    inr_handler.assert_called_once()
@@ -0,0 +1,126 @@
+"""Tests for rhasspyhermes_app memoized handler results."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+import time
+
+import pytest
+from rhasspyhermes.intent import Intent
+from rhasspyhermes.nlu import NluIntent, Slot
+
+from rhasspyhermes_app import EndSession, HermesApp
+from rhasspyhermes_app.memo import MemoStore
+from tests import async_mock
+
+INTENT_NAME = "GetListings"
+INTENT_TOPIC = f"hermes/intent/{INTENT_NAME}"
+
+_LOOP = asyncio.get_event_loop()
+
+
+def intent_payload(channel: str) -> str:
+    """Create the payload of an intent with a channel slot."""
+    return NluIntent(
+        f"what's on {channel}",
+        Intent(INTENT_NAME, 1.0),
+        session_id="abc",
+        slots=[Slot(entity="channel", slot_name="channel", value={"value": channel})],
+    ).to_json()
+
+
+def test_memo_store(tmp_path):
+    """Test expiry, eviction of the least recently used value and persistence."""
+    path = str(tmp_path / "memo.db")
+    now = time.time()
+    store = MemoStore(path, max_entries=2)
+    store.set("a", {"text": "A"}, ttl=10, now=now)
+    store.set("b", {"text": "B"}, ttl=100, now=now)
+
+    assert store.get("a", now=now + 5) == ({"text": "A"}, now + 10)
+    assert store.get("a", now=now + 10) is None
+    assert "a" not in store
+
+    store.set("c", {"text": "C"}, ttl=100, now=now)
+    store.get("b", now=now + 1)
+    store.set("d", {"text": "D"}, ttl=100, now=now + 2)
+    assert "c" not in store
+    assert store.evictions == 1
+    store.close()
+
+    # The values are loaded again.
+    store = MemoStore(path)
+    assert store.get("b") == ({"text": "B"}, now + 100)
+    assert "d" in store
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_app_memoize(mocker, tmp_path):
+    """Test whether memoized results are reused, also after a restart."""
+    path = str(tmp_path / "memo.db")
+    listings = async_mock(mocker, return_value="The news.")
+
+    def create_app():
+        app = HermesApp("Test memo", mqtt_client=mocker.MagicMock())
+        app.publish = mocker.MagicMock()
+        app.enable_memo(path)
+
+        @app.on_intent(INTENT_NAME)
+        @app.memoize(ttl=3600)
+        async def get_listings(_intent: NluIntent):
+            return EndSession(await listings())
+
+        app._subscribe_callbacks()
+        return app
+
+    app = create_app()
+    await app.on_raw_message(INTENT_TOPIC, intent_payload("BBC"))
+    await app.on_raw_message(INTENT_TOPIC, intent_payload("bbc"))
+    assert listings.call_count == 1
+    await app.on_raw_message(INTENT_TOPIC, intent_payload("CNN"))
+    assert listings.call_count == 2
+    assert app.publish.call_count == 3
+    assert app.memo_store is not None
+    assert (app.memo_store.hits, app.memo_store.misses) == (1, 2)
+
+    # A restarted app answers from the stored results.
+    app = create_app()
+    await app.on_raw_message(INTENT_TOPIC, intent_payload("bbc"))
+    assert listings.call_count == 2
+    assert app.publish.call_args[0][0].text == "The news."
+
+
+@pytest.mark.asyncio
+async def test_app_memoize_refresh_ahead(mocker):
+    """Test whether a result that expires soon is refreshed in the background."""
+    app = HermesApp("Test memo refresh", mqtt_client=mocker.MagicMock())
+    app.publish = mocker.MagicMock()
+    listings = async_mock(mocker, side_effect=["The news.", "The late news."])
+
+    @app.on_intent(INTENT_NAME)
+    @app.memoize(ttl=10, refresh_ahead=60)
+    async def get_listings(_intent: NluIntent):
+        return EndSession(await listings())
+
+    app._subscribe_callbacks()
+    await app.on_raw_message(INTENT_TOPIC, intent_payload("BBC"))
+    await app.on_raw_message(INTENT_TOPIC, intent_payload("BBC"))
+    assert app.publish.call_args[0][0].text == "The news."
+
+    await asyncio.sleep(0.01)
+    assert listings.call_count == 2
+    assert app.memo_store is not None
+    assert app.memo_store.refreshes == 1
+
+    await app.on_raw_message(INTENT_TOPIC, intent_payload("BBC"))
+    assert app.publish.call_args[0][0].text == "The late news."
+
+
+def test_app_memoize_streaming(mocker):
+    """Test whether memoizing a streaming handler is refused."""
+    app = HermesApp("Test memo streaming", mqtt_client=mocker.MagicMock())
+
+    with pytest.raises(TypeError):
+
+        @app.memoize(ttl=10)
+        async def read_news(_intent: NluIntent):
+            yield "The news."
@@ -0,0 +1,105 @@
+"""Tests for rhasspyhermes_app prefetch."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+
+import pytest
+from rhasspyhermes.asr import AsrTextCaptured
+from rhasspyhermes.dialogue import (
+    DialogueSessionEnded,
+    DialogueSessionTermination,
+    DialogueSessionTerminationReason,
+)
+from rhasspyhermes.wake import HotwordDetected
+
+from rhasspyhermes_app import HermesApp
+from tests import async_mock
+
+HOTWORD_TOPIC = "hermes/hotword/test/detected"
+HOTWORD = HotwordDetected("test_model", site_id="kitchen")
+TEXT_CAPTURED = AsrTextCaptured(
+    "what time is it", 1.0, 1.0, site_id="kitchen", session_id="abc"
+)
+SESSION_ENDED = DialogueSessionEnded(
+    DialogueSessionTermination(DialogueSessionTerminationReason.NOMINAL),
+    session_id="abc",
+    site_id="kitchen",
+)
+
+_LOOP = asyncio.get_event_loop()
+
+
+@pytest.mark.asyncio
+async def test_prefetch(mocker):
+    """Test whether a prefetch function runs once per session and is evicted."""
+    app = HermesApp("Test prefetch", mqtt_client=mocker.MagicMock())
+
+    calls = []
+
+    @app.prefetch
+    async def load_profile(site_id: str):
+        calls.append(site_id)
+        return f"profile of {site_id}"
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+
+    # The hotword and the captured text share one prefetch task.
+    await app.on_raw_message(HOTWORD_TOPIC, HOTWORD.to_json())
+    await app.on_raw_message(AsrTextCaptured.topic(), TEXT_CAPTURED.to_json())
+    assert await app.prefetched(load_profile, "kitchen") == "profile of kitchen"
+    assert calls == ["kitchen"]
+
+    # The result is evicted when the session ends.
+    await app.on_raw_message(DialogueSessionEnded.topic(), SESSION_ENDED.to_json())
+    assert not app._prefetch_tasks
+
+    # Without a prefetch, the function is called on demand.
+    assert await app.prefetched(load_profile, "bedroom") == "profile of bedroom"
+    assert calls == ["kitchen", "bedroom"]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_sessions(mocker):
+    """Test whether prefetched results are kept per session and expire."""
+    app = HermesApp("Test prefetch sessions", mqtt_client=mocker.MagicMock())
+    app.prefetch_ttl = 0.01
+    hotword_handler = async_mock(mocker)
+    app.on_hotword(hotword_handler)
+
+    calls = []
+
+    @app.prefetch
+    async def load_profile(site_id: str):
+        calls.append(site_id)
+        if len(calls) > 2:
+            raise RuntimeError("Profile database is down")
+        return len(calls)
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+
+    # The task of the hotword moves to the session of the captured text, and another
+    # session on the same site gets its own task.
+    await app.on_raw_message(HOTWORD_TOPIC, HOTWORD.to_json())
+    await app.on_raw_message(AsrTextCaptured.topic(), TEXT_CAPTURED.to_json())
+    other_session = AsrTextCaptured(
+        "what time is it", 1.0, 1.0, site_id="kitchen", session_id="def"
+    )
+    await app.on_raw_message(AsrTextCaptured.topic(), other_session.to_json())
+    assert await app.prefetched(load_profile, "kitchen", "abc") == 1
+    assert await app.prefetched(load_profile, "kitchen", "def") == 2
+
+    # Results that aren't used in a session expire.
+    await asyncio.sleep(0.05)
+    assert not app._prefetch_tasks
+
+    # A hotword payload that can't be decoded doesn't stop the hotword handlers.
+    await app.on_raw_message(HOTWORD_TOPIC, b'{"siteId": "kitchen"}')
+    hotword_handler.assert_called_once()
+
+    # Failed prefetches are logged, even if their result isn't used.
+    log_error = mocker.patch("rhasspyhermes_app._LOGGER.error")
+    await app.on_raw_message(HOTWORD_TOPIC, HOTWORD.to_json())
+    await asyncio.sleep(0.005)
+    assert log_error.call_args[0][0] == "Prefetch failed"
+    await app._shutdown()
@@ -0,0 +1,82 @@
+"""Tests for rhasspyhermes_app profiling."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+import time
+
+import pytest
+
+from rhasspyhermes_app import HermesApp, TopicData
+from rhasspyhermes_app.profiling import LoopLagMonitor, SamplingProfiler
+
+_LOOP = asyncio.get_event_loop()
+
+
+def busy_wait(duration: float):
+    """Keep the thread busy without sleeping."""
+    end_time = time.monotonic() + duration
+    while time.monotonic() < end_time:
+        pass
+
+
+def test_sampling_profiler(tmp_path):
+    """Test whether the stacks of other threads are sampled in the folded format."""
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    busy_wait(0.1)
+    profiler.stop()
+
+    assert any(
+        stack.startswith("MainThread;") and "busy_wait (test_profiling.py" in stack
+        for stack in profiler.samples
+    )
+
+    path = tmp_path / "stacks.folded"
+    profiler.write(str(path))
+    lines = path.read_text().splitlines()
+    assert len(lines) == len(profiler.samples)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_loop_lag_monitor():
+    """Test whether lags above the threshold are counted."""
+    monitor = LoopLagMonitor(threshold=0.1)
+    monitor.record(0.05)
+    monitor.record(0.5)
+    monitor.record(0.01)
+
+    assert monitor.last_lag == 0.01
+    assert monitor.max_lag == 0.5
+    assert monitor.slow_count == 1
+
+
+@pytest.mark.asyncio
+async def test_app_profiling(mocker, tmp_path):
+    """Test whether an app writes profiles of slow messages and stack samples."""
+    mocker.patch(
+        "sys.argv", ["rhasspy-hermes-app-test", "--profiling-dir", str(tmp_path)]
+    )
+    mqtt_client = mocker.MagicMock()
+    app = HermesApp("Test profiling", mqtt_client=mqtt_client)
+    assert app.profiler is not None
+    app.enable_profiling(str(tmp_path), slow_message_time=0.01)
+
+    @app.on_topic("test/slow")
+    async def slow(_data: TopicData, _payload: bytes):
+        busy_wait(0.02)
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+    await app._startup()
+    main_loop = asyncio.ensure_future(app.handle_messages_async())
+    await asyncio.sleep(0)
+
+    app.mqtt_on_message(
+        mqtt_client, None, mocker.MagicMock(topic="test/slow", payload=b"")
+    )
+
+    await app.drain(timeout=1.0)
+    assert main_loop.done()
+    await app._shutdown()
+
+    assert len(list(tmp_path.glob("*-test_slow-*ms.prof"))) == 1
+    assert len(list(tmp_path.glob("stacks-*.folded"))) == 1
@@ -0,0 +1,175 @@
+"""Tests for rhasspyhermes_app rate limits."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+
+import pytest
+from rhasspyhermes.dialogue import DialogueEndSession
+from rhasspyhermes.intent import Intent
+from rhasspyhermes.nlu import NluIntent
+
+from rhasspyhermes_app import HermesApp
+from rhasspyhermes_app.ratelimit import RateLimit, RateLimiter
+from tests import async_mock
+
+INTENT_NAME = "GetTime"
+INTENT_TOPIC = f"hermes/intent/{INTENT_NAME}"
+
+_LOOP = asyncio.get_event_loop()
+
+
+def intent_payload(site_id: str, session_id: str = "abc") -> bytes:
+    """Create the payload of an intent on a site."""
+    return (
+        NluIntent(
+            "what time is it",
+            Intent(INTENT_NAME, 1.0),
+            site_id=site_id,
+            session_id=session_id,
+        )
+        .to_json()
+        .encode("utf-8")
+    )
+
+
+def test_rate_limiter():
+    """Test token buckets by site, intent and topic."""
+    limiter = RateLimiter()
+    limiter.set_limit("site", "*", RateLimit(rate=1.0, burst=2))
+    limiter.set_limit("topic", "hermes/hotword/+/detected", RateLimit(rate=10.0))
+
+    kitchen = intent_payload("kitchen")
+    assert limiter.check(INTENT_TOPIC, kitchen, now=0.0) is None
+    assert limiter.check(INTENT_TOPIC, kitchen, now=0.0) is None
+    throttle = limiter.check(INTENT_TOPIC, kitchen, now=0.5)
+    assert throttle is not None
+    assert throttle.action == "drop"
+    assert throttle.wait == pytest.approx(0.5)
+
+    # Each site has its own bucket, which fills up over time.
+    assert limiter.check(INTENT_TOPIC, intent_payload("bedroom"), now=0.5) is None
+    assert limiter.check(INTENT_TOPIC, kitchen, now=1.0) is None
+
+    topic = "hermes/hotword/porcupine/detected"
+    assert limiter.check(topic, b"{}", now=1.0) is None
+    assert limiter.check(topic, b"{}", now=1.0) is not None
+
+    assert limiter.throttled == {
+        "site:kitchen": 1,
+        "topic:hermes/hotword/+/detected": 1,
+    }
+
+    # Full buckets are evicted.
+    assert limiter.check(INTENT_TOPIC, kitchen, now=100.0) is None
+    assert len(limiter) == 1
+
+    # Delayed messages take their tokens in advance.
+    limiter.set_limit("intent", INTENT_NAME, RateLimit(rate=1.0, policy="delay"))
+    limiter.set_limit("site", "*", None)
+    assert limiter.check(INTENT_TOPIC, kitchen, now=200.0) is None
+    assert limiter.check(INTENT_TOPIC, kitchen, now=200.0).wait == pytest.approx(1.0)
+    assert limiter.check(INTENT_TOPIC, kitchen, now=200.0).wait == pytest.approx(2.0)
+
+
+@pytest.mark.asyncio
+async def test_app_rate_limit(mocker):
+    """Test whether the app replies to intents over the rate limit."""
+    mqtt_client = mocker.MagicMock()
+    app = HermesApp("Test rate limits", mqtt_client=mqtt_client)
+    app.rate_limit(0.001, site_id="kitchen", policy="reply", reply="Slow down.")
+    app.publish = mocker.MagicMock()
+
+    intent_handler = async_mock(mocker)
+    app.on_intent(INTENT_NAME)(intent_handler)
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+    main_loop = asyncio.ensure_future(app.handle_messages_async())
+    await asyncio.sleep(0)
+
+    for site_id, session_id in (("kitchen", "1"), ("kitchen", "2"), ("bedroom", "3")):
+        message = mocker.MagicMock(
+            topic=INTENT_TOPIC, payload=intent_payload(site_id, session_id)
+        )
+        app.mqtt_on_message(mqtt_client, None, message)
+
+    await app.drain(timeout=1.0)
+    assert main_loop.done()
+    assert intent_handler.call_count == 2
+    app.publish.assert_called_once_with(
+        DialogueEndSession(session_id="2", text="Slow down.")
+    )
+
+
+@pytest.mark.asyncio
+async def test_app_rate_limit_errors(mocker):
+    """Test whether malformed site IDs and errors of the limits don't drop intents."""
+    app = HermesApp("Test rate limit errors", mqtt_client=mocker.MagicMock())
+    app.rate_limit(1.0, site_id="*")
+
+    malformed = intent_payload("kitchen").replace(b'"kitchen"', b'"\xff"')
+    assert app.rate_limiter is not None
+    assert app.rate_limiter.check(INTENT_TOPIC, malformed) is None
+
+    app.rate_limiter = mocker.MagicMock()
+    app.rate_limiter.check.side_effect = RuntimeError("boom")
+    message = mocker.MagicMock(topic=INTENT_TOPIC, payload=intent_payload("kitchen"))
+    assert app._admit(app.rate_limiter, message)
+
+
+def test_site_limit_topics(mocker):
+    """Test whether site limits only apply to intents and on_topic handlers."""
+    app = HermesApp("Test site limit topics", mqtt_client=mocker.MagicMock())
+    app.rate_limit(0.001, site_id="kitchen")
+
+    # A streaming intent handler subscribes to hermes/tts/sayFinished.
+    @app.on_intent(INTENT_NAME)
+    async def get_news(_intent: NluIntent):
+        yield "The first article."
+
+    @app.on_topic("sensors/{name}")
+    async def sensor(_data, _payload):
+        pass
+
+    assert app.rate_limiter is not None
+    check = app.rate_limiter.check
+    say_finished = b'{"id": "1", "siteId": "kitchen", "sessionId": "abc"}'
+    assert check("hermes/tts/sayFinished", say_finished) is None
+    assert check(INTENT_TOPIC, intent_payload("kitchen")) is None
+    assert check(INTENT_TOPIC, intent_payload("kitchen")) is not None
+
+    # Readings without a site ID aren't limited, but readings with one are.
+    assert check("sensors/temperature", b"20") is None
+    assert check("sensors/temperature", b'{"siteId": "kitchen"}') is not None
+
+
+@pytest.mark.asyncio
+async def test_app_rate_limit_delay(mocker):
+    """Test whether delayed messages are dispatched like other messages."""
+    mqtt_client = mocker.MagicMock()
+    app = HermesApp("Test delayed messages", mqtt_client=mqtt_client)
+    app.rate_limit(50.0, intent=INTENT_NAME, policy="delay")
+    lane = app.add_lane("intents", "hermes/intent/#")
+    app.profiler = mocker.MagicMock()
+    app.profiler.profile_message.side_effect = lambda _topic, handling: handling
+
+    intent_handler = async_mock(mocker)
+    app.on_intent(INTENT_NAME)(intent_handler)
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+    main_loop = asyncio.ensure_future(app.handle_messages_async())
+    await asyncio.sleep(0)
+
+    for session_id in ("1", "2"):
+        message = mocker.MagicMock(
+            topic=INTENT_TOPIC, payload=intent_payload("kitchen", session_id)
+        )
+        app.mqtt_on_message(mqtt_client, None, message)
+
+    assert await app.drain(timeout=1.0)
+    assert main_loop.done()
+    assert intent_handler.call_count == 2
+    assert lane.handled == 2
+    assert app.profiler.profile_message.call_count == 2
+
+    await app._shutdown()
@@ -0,0 +1,56 @@
+"""Tests for rhasspyhermes_app resources."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+
+import pytest
+
+from rhasspyhermes_app import HermesApp
+
+_LOOP = asyncio.get_event_loop()
+
+
+@pytest.mark.asyncio
+async def test_resources_lifecycle(mocker):
+    """Test whether resources and hooks follow the app's lifecycle."""
+    app = HermesApp("Test resources", mqtt_client=mocker.MagicMock())
+    events = []
+
+    async def create():
+        events.append("create")
+        return "connection"
+
+    async def close(resource):
+        events.append(f"close {resource}")
+
+    app.add_resource("db", create, close)
+
+    @app.on_startup
+    async def startup():
+        events.append(f"startup {app.resources['db']}")
+
+    @app.on_shutdown
+    async def shutdown():
+        events.append("shutdown")
+
+    await app._startup()
+    assert app.resources["db"] == "connection"
+    await app._shutdown()
+
+    assert events == ["create", "startup connection", "shutdown", "close connection"]
+    assert not app.resources
+
+
+@pytest.mark.asyncio
+async def test_http_session(mocker):
+    """Test whether the shared HTTP session is reused and closed."""
+    aiohttp = pytest.importorskip("aiohttp")
+    app = HermesApp("Test HTTP session", mqtt_client=mocker.MagicMock())
+    app.configure_http(limit_per_host=2)
+
+    session = app.http_session()
+    assert isinstance(session, aiohttp.ClientSession)
+    assert app.http_session() is session
+    assert session.connector.limit_per_host == 2
+
+    await app._shutdown()
+    assert session.closed
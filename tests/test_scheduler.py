@@ -0,0 +1,127 @@
+"""Tests for rhasspyhermes_app scheduler."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+from rhasspyhermes.dialogue import DialogueNotification, DialogueStartSession
+
+from rhasspyhermes_app import HermesApp
+from rhasspyhermes_app.scheduler import CronSchedule, Scheduler
+from tests import async_mock
+
+_LOOP = asyncio.get_event_loop()
+
+
+def test_cron_schedule():
+    """Test the next times of cron expressions."""
+    start = datetime(2021, 1, 1, 12, 0).timestamp()  # A Friday
+
+    schedule = CronSchedule("*/15 12 * * *")
+    assert schedule.next_after(start) == datetime(2021, 1, 1, 12, 15).timestamp()
+
+    schedule = CronSchedule("30 7 * * 1-5")
+    assert schedule.next_after(start) == datetime(2021, 1, 4, 7, 30).timestamp()
+
+    schedule = CronSchedule("0 0 29 2 *")
+    assert schedule.next_after(start) == datetime(2024, 2, 29, 0, 0).timestamp()
+
+    with pytest.raises(ValueError):
+        CronSchedule("60 * * * *")
+
+
+def test_scheduler_order_and_cancel():
+    """Test whether jobs run in order of their time and cancelled jobs don't run."""
+    scheduler = Scheduler()
+    fired = []
+    now = time.time()
+
+    for i in range(100):
+        scheduler.add(at=now + 100 - i, text=str(100 - i), job_id=str(100 - i))
+    for i in range(1, 101, 2):
+        assert scheduler.cancel(str(i))
+    assert not scheduler.cancel("1")
+
+    assert scheduler.run_pending(fired.append, now) == pytest.approx(2)
+    assert not fired
+
+    assert scheduler.run_pending(fired.append, now + 50) == pytest.approx(2)
+    assert [job.text for job in fired] == [str(i) for i in range(2, 51, 2)]
+    assert len(scheduler) == 25
+
+
+def test_scheduler_catch_up(tmp_path):
+    """Test whether stored jobs are loaded and late jobs are caught up."""
+    path = str(tmp_path / "jobs.db")
+    now = time.time()
+
+    scheduler = Scheduler(path)
+    scheduler.add(every=60, text="all", job_id="all", catch_up="all")
+    scheduler.add(every=60, text="once", job_id="once", catch_up="once")
+    scheduler.add(at=now + 1, text="skip", job_id="skip", catch_up="skip")
+    _LOOP.run_until_complete(scheduler.stop())
+
+    # Restart ten minutes later.
+    scheduler = Scheduler(path)
+    assert len(scheduler) == 3
+
+    fired = []
+    scheduler.run_pending(fired.append, now + 630)
+    assert [job.id for job in fired].count("all") == 10
+    assert [job.id for job in fired].count("once") == 1
+    assert "skip" not in [job.id for job in fired]
+    assert len(scheduler) == 2
+    assert scheduler.get("once").due == pytest.approx(now + 660)
+
+
+@pytest.mark.asyncio
+async def test_app_schedule(mocker):
+    """Test scheduled notifications and callbacks of the app."""
+    app = HermesApp("Test scheduler", mqtt_client=mocker.MagicMock())
+    app.publish = mocker.MagicMock()
+    callback = async_mock(mocker)
+    callback.__name__ = "callback"
+
+    await app._startup()
+    job = app.schedule(at=time.time(), site_id="kitchen", text="Time's up!")
+    app.schedule(at=time.time(), callback=callback, data={"n": 1})
+    cancelled = app.schedule(at=time.time() + 0.01, text="Cancelled")
+    assert app.cancel_schedule(cancelled.id)
+
+    await asyncio.sleep(0.05)
+    await app._shutdown()
+
+    app.publish.assert_called_once_with(
+        DialogueStartSession(
+            init=DialogueNotification("Time's up!"), site_id=job.site_id
+        )
+    )
+    callback.assert_called_once()
+    assert callback.call_args[0][0].data == '{"n": 1}'
+
+
+@pytest.mark.asyncio
+async def test_enable_scheduler_keeps_jobs(mocker, tmp_path):
+    """Test whether enabling the scheduler keeps the functions and jobs added before."""
+    app = HermesApp("Test enable scheduler", mqtt_client=mocker.MagicMock())
+
+    @app.on_schedule
+    async def water_plants(_job):
+        pass
+
+    job = app.schedule(cron="0 9 * * 1", callback=water_plants, job_id="plants")
+
+    path = str(tmp_path / "jobs.db")
+    app.enable_scheduler(path)
+    assert app.scheduler.callbacks == {"water_plants": water_plants}
+    assert app.scheduler.get("plants") == job
+
+    # The jobs are stored in the database of the new scheduler.
+    assert Scheduler(path).get("plants") == job
+
+    await app._startup()
+    with pytest.raises(RuntimeError):
+        app.enable_scheduler()
+
+    await app._shutdown()
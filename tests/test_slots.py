@@ -0,0 +1,123 @@
+"""Tests for rhasspyhermes_app typed slots."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Optional
+
+import pytest
+from rhasspyhermes.dialogue import DialogueContinueSession, DialogueEndSession
+from rhasspyhermes.intent import Intent, Slot
+from rhasspyhermes.nlu import NluIntent
+
+from rhasspyhermes_app import ContinueSession, EndSession, HermesApp
+from rhasspyhermes_app.slots import SlotError, SlotExtractor
+
+INTENT_NAME = "SetTimer"
+INTENT_TOPIC = f"hermes/intent/{INTENT_NAME}"
+
+_LOOP = asyncio.get_event_loop()
+
+
+@dataclass
+class TimerSlots:
+    """Slots of the SetTimer intent."""
+
+    duration: timedelta
+    repeat: bool = False
+    label: Optional[str] = field(default=None, metadata={"slot": "name"})
+    count: Optional[int] = None
+
+
+def nlu_intent(*slots: Slot) -> NluIntent:
+    """Create a SetTimer intent with slots."""
+    return NluIntent(
+        "set a timer",
+        Intent(INTENT_NAME, 1.0),
+        slots=list(slots),
+        session_id="abc",
+    )
+
+
+def test_slot_extractor():
+    """Test the conversion of slots to a dataclass."""
+    extract = SlotExtractor(TimerSlots)
+
+    slots = extract(
+        nlu_intent(
+            Slot("duration", {"kind": "Duration", "minutes": 2, "seconds": 30}),
+            Slot("repeat", {"value": "yes"}),
+            Slot("name", {"value": "tea"}),
+            Slot("count", {"value": 3.0}),
+        )
+    )
+    assert slots == TimerSlots(timedelta(seconds=150), True, "tea", 3)
+
+    slots = extract(nlu_intent(Slot("duration", {"value": "90"})))
+    assert slots == TimerSlots(timedelta(seconds=90))
+
+    with pytest.raises(SlotError) as error:
+        extract(nlu_intent())
+    assert error.value.slot_name == "duration"
+
+    with pytest.raises(SlotError) as error:
+        extract(
+            nlu_intent(Slot("duration", {"value": 60}), Slot("count", {"value": 1.5}))
+        )
+    assert error.value.slot_name == "count"
+
+    with pytest.raises(TypeError):
+        SlotExtractor(dict)
+
+
+@pytest.mark.asyncio
+async def test_on_intent_slots(mocker):
+    """Test an intent handler with typed slots."""
+    app = HermesApp("Test typed slots", mqtt_client=mocker.MagicMock())
+    app.publish = mocker.MagicMock()
+
+    @app.on_intent(INTENT_NAME, slots=TimerSlots)
+    async def set_timer(_intent: NluIntent, slots: TimerSlots):
+        return EndSession(f"{slots.duration.seconds} seconds")
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+
+    await app.on_raw_message(
+        INTENT_TOPIC, nlu_intent(Slot("duration", {"value": 10})).to_json()
+    )
+    app.publish.assert_called_once_with(
+        DialogueEndSession(session_id="abc", text="10 seconds")
+    )
+
+    # A missing slot ends the session without calling the handler or saying the error.
+    app.publish.reset_mock()
+    await app.on_raw_message(INTENT_TOPIC, nlu_intent().to_json())
+    app.publish.assert_called_once_with(DialogueEndSession(session_id="abc"))
+
+
+@pytest.mark.asyncio
+async def test_on_intent_slot_error(mocker):
+    """Test a configured response to invalid slots."""
+    app = HermesApp("Test slot errors", mqtt_client=mocker.MagicMock())
+    app.publish = mocker.MagicMock()
+    intent_handler = mocker.MagicMock()
+
+    app.on_intent(
+        INTENT_NAME,
+        slots=TimerSlots,
+        slot_error=ContinueSession(text="For how long?", intent_filter=[INTENT_NAME]),
+    )(intent_handler)
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+
+    await app.on_raw_message(
+        INTENT_TOPIC, nlu_intent(Slot("duration", {"value": "long"})).to_json()
+    )
+    intent_handler.assert_not_called()
+    app.publish.assert_called_once_with(
+        DialogueContinueSession(
+            session_id="abc", text="For how long?", intent_filter=[INTENT_NAME]
+        )
+    )
@@ -0,0 +1,207 @@
+"""Tests for rhasspyhermes_app subscriptions at runtime."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+
+import pytest
+from rhasspyhermes.audioserver import AudioPlayBytes
+from rhasspyhermes.intent import Intent
+from rhasspyhermes.nlu import NluIntent
+
+from rhasspyhermes_app import HermesApp, TopicData
+from tests import async_mock
+
+INTENT_NAME = "GetTime"
+INTENT_TOPIC = f"hermes/intent/{INTENT_NAME}"
+NLU_INTENT = NluIntent("what time is it", Intent(INTENT_NAME, 1.0))
+
+_LOOP = asyncio.get_event_loop()
+
+
+@pytest.mark.asyncio
+async def test_runtime_handlers(mocker):
+    """Test whether handlers added and removed at runtime update the subscriptions."""
+    mqtt_client = mocker.MagicMock()
+    app = HermesApp("Test runtime handlers", mqtt_client=mqtt_client)
+    app.is_connected = True
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+    mqtt_client.subscribe.assert_not_called()
+
+    # Topics of Hermes messages subscribed to with HermesClient stay subscribed.
+    app.subscribe(AudioPlayBytes)
+    mqtt_client.subscribe.reset_mock()
+
+    intent_handler = mocker.MagicMock()
+    handler = app.add_intent_handler(intent_handler, INTENT_NAME)
+    mqtt_client.subscribe.assert_called_once_with([(INTENT_TOPIC, 0)])
+
+    await app.on_raw_message(INTENT_TOPIC, NLU_INTENT.to_json())
+    intent_handler.assert_called_once_with(NLU_INTENT)
+
+    # Topics of devices added at runtime are subscribed in one packet.
+    mqtt_client.subscribe.reset_mock()
+
+    @app.on_topic("sensors/{device}/temperature", "sensors/{device}/humidity")
+    async def sensor(data: TopicData, payload: bytes):
+        pass
+
+    mqtt_client.subscribe.assert_called_once_with(
+        [("sensors/+/humidity", 0), ("sensors/+/temperature", 0)]
+    )
+
+    app.remove_handler(handler)
+    app.remove_handler(sensor)
+    assert not app._callbacks_intent
+    assert not app._callbacks_topic_regex
+    assert not app._additional_topic
+    assert mqtt_client.unsubscribe.call_count == 2
+    assert app.subscribed_topics == {AudioPlayBytes.topic()}
+
+
+def test_minimal_subscriptions(mocker):
+    """Test whether topics covered by a wildcard topic aren't subscribed."""
+    app = HermesApp("Test minimal subscriptions", mqtt_client=mocker.MagicMock())
+
+    app.on_intent(INTENT_NAME, "GetWeather")(mocker.MagicMock())
+    app.on_topic("hermes/tts/+", "hermes/tts/say", "sensors/#")(mocker.MagicMock())
+    app.on_topic("sensors/{device}/temperature", "sensors")(mocker.MagicMock())
+
+    assert app._topics() == {
+        INTENT_TOPIC,
+        "hermes/intent/GetWeather",
+        "hermes/tts/+",
+        "sensors/#",
+    }
+
+    # Collapse the intents into a single subscription.
+    app.intent_wildcard_threshold = 2
+    assert app._topics() == {"hermes/intent/#", "hermes/tts/+", "sensors/#"}
+
+
+@pytest.mark.asyncio
+async def test_dispatch_once(mocker):
+    """Test whether a handler is called once for a topic matching several of its topics."""
+    app = HermesApp("Test dispatch once", mqtt_client=mocker.MagicMock())
+    app.intent_wildcard_threshold = 1
+
+    topic_handler = async_mock(mocker)
+    app.on_topic("hermes/tts/say", "hermes/tts/+", "hermes/#")(topic_handler)
+    wildcard_handler = async_mock(mocker)
+    app.on_topic("hermes/tts/{action}")(wildcard_handler)
+    intent_handler = async_mock(mocker)
+    app.on_intent(INTENT_NAME)(intent_handler)
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+
+    await app.on_raw_message("hermes/tts/say", b"{}")
+    topic_handler.assert_called_once()
+    wildcard_handler.assert_called_once()
+    assert wildcard_handler.call_args[0][0] == TopicData(
+        "hermes/tts/say", {"action": "say"}
+    )
+
+    # Intents without handler are ignored.
+    await app.on_raw_message(INTENT_TOPIC, NLU_INTENT.to_json())
+    await app.on_raw_message(
+        "hermes/intent/GetWeather",
+        NluIntent("how's the weather", Intent("GetWeather", 1.0)).to_json(),
+    )
+    intent_handler.assert_called_once_with(NLU_INTENT)
+
+
+@pytest.mark.asyncio
+async def test_topic_data_per_handler(mocker):
+    """Test whether changes to the topic data of a handler don't leak to the next one."""
+    app = HermesApp("Test topic data", mqtt_client=mocker.MagicMock())
+    received = []
+
+    @app.on_topic("sensors/kitchen")
+    async def first(data: TopicData, payload: bytes):
+        received.append(dict(data.data))
+        data.data["changed"] = "yes"
+
+    @app.on_topic("sensors/kitchen")
+    async def second(data: TopicData, payload: bytes):
+        received.append(dict(data.data))
+
+    await app.on_raw_message("sensors/kitchen", b"21")
+    assert received == [{}, {}]
+
+
+@pytest.mark.asyncio
+async def test_site_filter(mocker):
+    """Test whether messages of other sites are filtered before they're handled."""
+    mqtt_client = mocker.MagicMock()
+    app = HermesApp("Test site filter", mqtt_client=mqtt_client)
+    app.set_site_ids("kitchen", "bedroom")
+
+    frame_handler = async_mock(mocker)
+    app.on_topic("hermes/audioServer/{site_id}/audioFrame")(frame_handler)
+    play_handler = async_mock(mocker)
+    app.on_topic("hermes/audioServer/{site_id}/{action}")(play_handler)
+    intent_handler = async_mock(mocker)
+    app.on_intent(INTENT_NAME)(intent_handler)
+
+    # The broker only sends the audio of the app's sites.
+    assert app._topics() == {
+        INTENT_TOPIC,
+        "hermes/audioServer/kitchen/+",
+        "hermes/audioServer/bedroom/+",
+    }
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+    main_loop = asyncio.ensure_future(app.handle_messages_async())
+    await asyncio.sleep(0)
+
+    for site_id in ("kitchen", "garage"):
+        intent = NluIntent("what time is it", Intent(INTENT_NAME, 1.0), site_id=site_id)
+        app.mqtt_on_message(
+            mqtt_client,
+            None,
+            mocker.MagicMock(topic=INTENT_TOPIC, payload=intent.to_json().encode()),
+        )
+
+    await app.drain(timeout=1.0)
+    assert main_loop.done()
+    intent_handler.assert_called_once()
+    assert intent_handler.call_args[0][0].site_id == "kitchen"
+
+    await app.on_raw_message("hermes/audioServer/garage/audioFrame", b"")
+    frame_handler.assert_not_called()
+    await app.on_raw_message("hermes/audioServer/kitchen/audioFrame", b"")
+    frame_handler.assert_called_once()
+
+    # Without sites, all sites are subscribed to.
+    app.set_site_ids()
+    assert app._topics() == {INTENT_TOPIC, "hermes/audioServer/+/+"}
+
+
+@pytest.mark.asyncio
+async def test_site_filter_malformed_site_id(mocker):
+    """Test whether a site ID that isn't valid UTF-8 doesn't stop the message loop."""
+    mqtt_client = mocker.MagicMock()
+    app = HermesApp("Test malformed site ID", mqtt_client=mqtt_client)
+    app.set_site_ids("kitchen")
+    intent_handler = async_mock(mocker)
+    app.on_intent(INTENT_NAME)(intent_handler)
+
+    app._subscribe_callbacks()
+    main_loop = asyncio.ensure_future(app.handle_messages_async())
+    await asyncio.sleep(0)
+
+    intent = NluIntent("what time is it", Intent(INTENT_NAME, 1.0), site_id="kitchen")
+    malformed = intent.to_json().encode().replace(b'"kitchen"', b'"\xff\xfe"')
+    assert app._is_other_site(INTENT_TOPIC, malformed)
+
+    for payload in (malformed, intent.to_json().encode()):
+        app.mqtt_on_message(
+            mqtt_client, None, mocker.MagicMock(topic=INTENT_TOPIC, payload=payload)
+        )
+
+    await app.drain(timeout=1.0)
+    assert main_loop.done()
+    intent_handler.assert_called_once()
+    assert intent_handler.call_args[0][0].site_id == "kitchen"
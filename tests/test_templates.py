@@ -0,0 +1,78 @@
+"""Tests for rhasspyhermes_app response templates."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+import json
+
+import pytest
+from rhasspyhermes.dialogue import DialogueContinueSession, DialogueEndSession
+from rhasspyhermes.intent import Intent
+from rhasspyhermes.nlu import NluIntent
+
+from rhasspyhermes_app import HermesApp
+from rhasspyhermes_app.templates import ResponseTemplate, text_hash
+
+INTENT_NAME = "LightOn"
+INTENT_TOPIC = f"hermes/intent/{INTENT_NAME}"
+NLU_INTENT = NluIntent("turn on the light", Intent(INTENT_NAME, 1.0), session_id="abc")
+
+_LOOP = asyncio.get_event_loop()
+
+
+def test_response_template():
+    """Test whether rendered responses have the payload of the Hermes message."""
+    template = ResponseTemplate('The {room} light is "{state:>3}" {{}}.')
+    response = template.render(room="kitchen\n", state="on")
+    assert response.text == 'The kitchen\n light is " on" {}.'
+    assert json.loads(response.payload('a"b')) == json.loads(
+        DialogueEndSession(session_id='a"b', text=response.text).to_json()
+    )
+
+    template = ResponseTemplate(
+        "Which room?", continue_session=True, intent_filter=["Room"]
+    )
+    assert template.topic == DialogueContinueSession.topic()
+    assert json.loads(template.render().payload("abc")) == json.loads(
+        DialogueContinueSession(
+            session_id="abc", text="Which room?", intent_filter=["Room"]
+        ).to_json()
+    )
+
+    with pytest.raises(KeyError):
+        ResponseTemplate("{room}").render()
+
+
+def test_tts_cache_hook(mocker):
+    """Test whether likely responses are passed to the TTS cache hook."""
+    hook = mocker.MagicMock()
+    ResponseTemplate("OK.", tts_cache_hook=hook)
+    hook.assert_called_once_with(text_hash("OK."), "OK.")
+
+    hook.reset_mock()
+    template = ResponseTemplate("It's {hour} o'clock.", tts_cache_hook=hook)
+    hook.assert_not_called()
+    template.warm({"hour": hour} for hour in range(24))
+    assert hook.call_count == 24
+    hook.assert_called_with(text_hash("It's 23 o'clock."), "It's 23 o'clock.")
+
+
+@pytest.mark.asyncio
+async def test_template_response(mocker):
+    """Test whether the app publishes a rendered response of an intent handler."""
+    app = HermesApp("Test templates", mqtt_client=mocker.MagicMock())
+    app._publish_payload = mocker.MagicMock()
+    light_on = app.response_template("The {room} light is on.")
+
+    @app.on_intent(INTENT_NAME)
+    async def turn_on(_intent: NluIntent):
+        return light_on.render(room="kitchen")
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+
+    await app.on_raw_message(INTENT_TOPIC, NLU_INTENT.to_json())
+    topic, payload, ttl = app._publish_payload.call_args[0]
+    assert topic == DialogueEndSession.topic()
+    assert ttl == app.journal_session_ttl
+    assert json.loads(payload) == json.loads(
+        DialogueEndSession(session_id="abc", text="The kitchen light is on.").to_json()
+    )
@@ -0,0 +1,94 @@
+"""Tests for rhasspyhermes_app tracing."""
+# pylint: disable=protected-access,too-many-function-args
+import asyncio
+import json
+
+import pytest
+from rhasspyhermes.dialogue import (
+    DialogueSessionEnded,
+    DialogueSessionStarted,
+    DialogueSessionTermination,
+    DialogueSessionTerminationReason,
+)
+from rhasspyhermes.intent import Intent
+from rhasspyhermes.nlu import NluIntent
+
+from rhasspyhermes_app import (
+    EndSession,
+    FileSpanExporter,
+    HermesApp,
+    InMemorySpanExporter,
+)
+
+INTENT_NAME = "GetTime"
+INTENT_TOPIC = f"hermes/intent/{INTENT_NAME}"
+NLU_INTENT = NluIntent(
+    "what time is it",
+    Intent(INTENT_NAME, 1.0),
+    site_id="kitchen",
+    session_id="abc",
+)
+SESSION_STARTED = DialogueSessionStarted(session_id="abc", site_id="kitchen")
+SESSION_ENDED = DialogueSessionEnded(
+    DialogueSessionTermination(DialogueSessionTerminationReason.NOMINAL),
+    session_id="abc",
+    site_id="kitchen",
+)
+
+_LOOP = asyncio.get_event_loop()
+
+
+async def _receive(app: HermesApp, mocker, topic: str, payload: str):
+    """Simulate the MQTT client receiving a message."""
+    assert app.tracer is not None
+    message = mocker.MagicMock(topic=topic, payload=payload.encode(), timestamp=None)
+    await app._handle_traced_message(app.tracer, message)
+
+
+@pytest.mark.asyncio
+async def test_tracing(mocker):
+    """Test whether the messages of a session are exported as one trace."""
+    app = HermesApp("Test tracing", mqtt_client=mocker.MagicMock())
+    exporter = InMemorySpanExporter()
+    app.enable_tracing(exporter)
+
+    @app.on_intent(INTENT_NAME)
+    async def get_time(intent: NluIntent):
+        return EndSession("It's too late.")
+
+    assert DialogueSessionEnded.topic() in app._topics()
+
+    await _receive(
+        app, mocker, DialogueSessionStarted.topic(), SESSION_STARTED.to_json()
+    )
+    await _receive(app, mocker, INTENT_TOPIC, NLU_INTENT.to_json())
+    assert not exporter.spans
+
+    await _receive(app, mocker, DialogueSessionEnded.topic(), SESSION_ENDED.to_json())
+
+    names = [span.name for span in exporter.spans]
+    assert names[0] == "session"
+    assert INTENT_TOPIC in names
+    for stage in ("queue", "decode", "handler", "publish"):
+        assert stage in names
+    assert len({span.trace_id for span in exporter.spans}) == 1
+    assert all(span.end_time >= span.start_time for span in exporter.spans)
+
+
+@pytest.mark.asyncio
+async def test_file_exporter(mocker, tmp_path):
+    """Test whether traces are written as OpenTelemetry JSON."""
+    path = tmp_path / "traces.json"
+    app = HermesApp("Test file exporter", mqtt_client=mocker.MagicMock())
+    app.enable_tracing(FileSpanExporter(str(path)))
+
+    await _receive(app, mocker, "hermes/tts/say", "{}")
+
+    trace = json.loads(path.read_text())
+    resource_spans = trace["resourceSpans"][0]
+    assert resource_spans["resource"]["attributes"][0]["value"] == {
+        "stringValue": "Test file exporter"
+    }
+    spans = resource_spans["scopeSpans"][0]["spans"]
+    assert spans[0]["name"] == "hermes/tts/say"
+    assert len(spans[0]["traceId"]) == 32